@@ -12,6 +12,9 @@ import logging
 import os
 import streamlit as st
 import shutil
+import threading
+import time
+from datetime import datetime
 # Group related imports
 from agenticapp.agents import (
     TestGenerationAgent, 
@@ -22,13 +25,16 @@ from agenticapp.agents import (
 )
 
 from agenticapp.utils import file_utils, mutationutils
-from agenticapp.agents.TestGenerationAgent import process_file
-from agenticapp.agents.TestExecutionAgent import discover_and_run_tests
-from agenticapp.agents.CoverageAgent import measure_coverage, display_coverage_report, generate_and_update_tests, measure_coverage_with_cli
+from agenticapp.agents.TestGenerationAgent import generate_folder_tests
+from agenticapp.agents.TestExecutionAgent import discover_and_run_tests, read_new_test_results
+from agenticapp.agents.CoverageAgent import start_coverage, measure_coverage, display_coverage_report, generate_and_update_tests, measure_coverage_with_cli
 from agenticapp.agents.AutoFixingAgent import fix_failing_tests
 from agenticapp.utils.file_utils import create_output_folder, extract_zip_file, clear_directories,backup_modified_files
 from agenticapp.agents.MutationTestAgent import get_mutation_coverage, run_mutation_tests
 from agenticapp.utils.mutationutils import display_mutation_results
+from agenticapp.utils.llm_cache import configure_reply_cache
+from agenticapp.utils.telemetry import configure_run_metrics, summarize_metrics
+from agenticapp.agents.model_router import tier_success_rates
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -51,8 +57,18 @@ FIXED_COVERAGE_REPORT_PATH = os.path.join(PROJECT_ROOT, "coverage_report2.txt")
 
 # Cache and results paths
 CACHE_PATH = os.path.join(PROJECT_ROOT, ".cache")
-TEST_RESULTS_FILE = os.path.join(PROJECT_ROOT, "results.json")
-IMPROVED_TEST_RESULTS_FILE = os.path.join(PROJECT_ROOT, "improved_testcaseresults.json")
+GENERATION_MANIFEST_PATH = os.path.join(CACHE_PATH, "generation_manifest.json")
+# Per-test coverage of the last test run, used to re-run only the tests a change affects
+IMPACT_PATH = os.path.join(CACHE_PATH, "impact")
+METRICS_PATH = os.path.join(PROJECT_ROOT, "metrics")
+TEST_RESULTS_FILE = os.path.join(PROJECT_ROOT, "results.jsonl")
+IMPROVED_TEST_RESULTS_FILE = os.path.join(PROJECT_ROOT, "improved_testcaseresults.jsonl")
+FIXED_TEST_RESULTS_FILE = os.path.join(PROJECT_ROOT, "fixed_testcaseresults.jsonl")
+# Seconds between refreshes of the live test progress
+TEST_PROGRESS_INTERVAL = 0.5
+
+# Test generation configuration
+GENERATION_MAX_WORKERS = int(os.getenv("GENERATION_MAX_WORKERS", "8"))
 
 # Mutation test configurations
 APP_NAME = "InsuranceApp_Modified"
@@ -95,6 +111,7 @@ def initialize_session_state():
         "mutation_improvement_started": False,
         "final_mutation_coverage":False,
         "files_backed_up": False,
+        "run_id": datetime.now().strftime("%Y%m%d-%H%M%S"),
         "initial_stats": {
             "mutation_score": 0.0,
             "killed": 0,
@@ -118,15 +135,20 @@ def initialize_session_state():
         if key not in st.session_state:
             st.session_state[key] = value
 
-def process_source_files(source_folder, test_folder):
-    """Process each Python file in the source folder and its subfolders."""
+def process_source_files(source_folder, test_folder, max_workers=GENERATION_MAX_WORKERS, incremental=True):
+    """
+    Process each Python file in the source folder and its subfolders.
+
+    With incremental=True, files whose content hash matches the generation
+    manifest are skipped and tests of deleted source files are pruned.
+    """
     try:
-        for root, _, files in os.walk(source_folder):
-            for file in files:
-                if file.endswith(".py") and file != "__init__.py":
-                    file_path = os.path.join(root, file)
-                    logger.info(f"Processing file: {file_path}")
-                    process_file(file_path, output_folder=test_folder, language="python", shot_type="few_shot")
+        file_paths, changed, generated, errors = generate_folder_tests(
+            source_folder, test_folder, GENERATION_MANIFEST_PATH, max_workers=max_workers, incremental=incremental)
+        if len(changed) < len(file_paths):
+            st.info(f"♻️ Reused existing tests for {len(file_paths) - len(changed)} unchanged files")
+        for file_path, error in errors.items():
+            st.warning(f"⚠️ Test generation failed for {os.path.relpath(file_path, source_folder)}: {error}")
     except Exception as e:
         logger.error(f"Error processing source files: {str(e)}")
         st.error(f"❌ Error processing source files: {str(e)}")
@@ -152,12 +174,47 @@ def copy_source_files(source_folder, force=False):
         st.error(f"❌ Error copying source files: {str(e)}")
         return False
 
+def run_tests_with_progress(results_file, html_report):
+    """Run the test suite in the background and show its progress by tailing the results file"""
+    if os.path.exists(results_file):
+        os.remove(results_file)
+    errors = []
+
+    def run():
+        try:
+            discover_and_run_tests(TEST_FOLDER_PATH, results_file, html_report, impact_dir=IMPACT_PATH)
+        except Exception as e:
+            errors.append(e)
+
+    runner = threading.Thread(target=run, name="TestRun", daemon=True)
+    runner.start()
+    progress = st.progress(0.0, text="🧪 Discovering tests...")
+    total, offset, statuses = 0, 0, {}
+    while True:
+        finished = not runner.is_alive()
+        header, records, offset = read_new_test_results(results_file, offset)
+        if header:
+            total = header["tests"]
+        for record in records:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        done = sum(statuses.values())
+        if total:
+            counts = ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+            progress.progress(min(1.0, done / total), text=f"🧪 {done}/{total} tests run" +
+                              (f" ({counts})" if counts else ""))
+        if finished:
+            break
+        time.sleep(TEST_PROGRESS_INTERVAL)
+    if errors:
+        raise errors[0]
+
 def handle_test_generation(test_directory):
     """Handle the test generation process"""
     try:
         create_output_folder(test_directory)
+        start_coverage()
         process_source_files(SOURCE_FOLDER_PATH, TEST_FOLDER_PATH)
-        discover_and_run_tests(TEST_FOLDER_PATH, TEST_RESULTS_FILE, RESULTS_FILE_PATH)
+        run_tests_with_progress(TEST_RESULTS_FILE, RESULTS_FILE_PATH)
         measure_coverage(TEST_FOLDER_PATH, COVERAGE_REPORT_PATH)
         st.session_state.test_generated = True
         logger.info("Test generation completed successfully")
@@ -165,12 +222,25 @@ def handle_test_generation(test_directory):
         logger.error(f"Error in test generation: {str(e)}")
         st.error(f"❌ Error generating tests: {str(e)}")
 
+def show_inserted_test_validation(report):
+    """Show the outcome of running just the newly inserted tests"""
+    if not report:
+        return
+    new_lines = sum(len(lines) for lines in report["new_lines"].values())
+    message = (f"⚡ Inserted tests: {report['passed']} passed, {report['failed']} failed; "
+               f"the passing ones cover {new_lines} new lines in {len(report['new_lines'])} files")
+    if report["failed"]:
+        st.warning(message)
+    else:
+        st.success(message)
+
 def handle_coverage_improvement():
     """Handle the coverage improvement process"""
     try:
-        generate_and_update_tests(COVERAGE_REPORT_PATH, TEST_FOLDER_PATH)
-        discover_and_run_tests(TEST_FOLDER_PATH, IMPROVED_TEST_RESULTS_FILE, IMPROVED_TESTCASERESULTS_PATH)
-        measure_coverage_with_cli(TEST_FOLDER_PATH, IMPROVED_COVERAGE_REPORT_PATH)
+        show_inserted_test_validation(generate_and_update_tests(COVERAGE_REPORT_PATH, TEST_FOLDER_PATH,
+                                                                impact_dir=IMPACT_PATH))
+        run_tests_with_progress(IMPROVED_TEST_RESULTS_FILE, IMPROVED_TESTCASERESULTS_PATH)
+        measure_coverage_with_cli(TEST_FOLDER_PATH, IMPROVED_COVERAGE_REPORT_PATH, impact_dir=IMPACT_PATH)
         st.session_state.coverage_improvement = True
         logger.info("Coverage improvement completed successfully")
     except Exception as e:
@@ -181,8 +251,8 @@ def handle_test_fixing():
     """Handle the test fixing process"""
     try:
         fix_failing_tests(IMPROVED_TEST_RESULTS_FILE)
-        discover_and_run_tests(TEST_FOLDER_PATH, "fixed_testcaseresults.json", FIXED_TESTCASERESULTS_PATH)
-        measure_coverage_with_cli(TEST_FOLDER_PATH, FIXED_COVERAGE_REPORT_PATH)
+        run_tests_with_progress(FIXED_TEST_RESULTS_FILE, FIXED_TESTCASERESULTS_PATH)
+        measure_coverage_with_cli(TEST_FOLDER_PATH, FIXED_COVERAGE_REPORT_PATH, impact_dir=IMPACT_PATH)
         st.session_state.test_fixed = True
         logger.info("Test fixing completed successfully")
     except Exception as e:
@@ -220,6 +290,24 @@ def handle_mutation_testing(stage='before'):
         logger.error(f"Error in mutation testing ({stage}): {str(e)}")
         st.error(f"❌ Error in mutation testing: {str(e)}")
         return None, None
+def display_llm_metrics(metrics_file):
+    """Display per-stage LLM wall time, token and cost totals of the current run"""
+    rows = summarize_metrics(metrics_file)
+    if not rows:
+        return
+    with st.expander("⏱️ LLM Usage per Stage", expanded=False):
+        st.dataframe(rows)
+        prompt_tokens = sum(r['prompt_tokens'] for r in rows)
+        cached_tokens = sum(r['cached_tokens'] for r in rows)
+        st.caption(f"Total: {sum(r['calls'] for r in rows)} calls, "
+                   f"{sum(r['wall_time_s'] for r in rows):.1f}s waiting, "
+                   f"{cached_tokens}/{prompt_tokens} prompt tokens from the provider's prefix cache, "
+                   f"${sum(r['cost_usd'] for r in rows):.4f} — metrics file: {metrics_file}")
+        tier_rows = tier_success_rates()
+        if tier_rows:
+            st.markdown("**Model tier success rates** (all runs)")
+            st.dataframe(tier_rows)
+
 def display_results_link(file_path, title):
     """Display a clickable link to view results"""
     abs_path = os.path.abspath(file_path).replace("\\", "/")
@@ -234,6 +322,11 @@ def main():
     """, unsafe_allow_html=True)
     initialize_session_state()
     ensure_directories()
+    reply_cache = configure_reply_cache(CACHE_PATH)
+    metrics = configure_run_metrics(METRICS_PATH, st.session_state.run_id)
+    if reply_cache:
+        cache_stats = reply_cache.stats()
+        st.sidebar.caption(f"🗄️ LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
     # File upload section
     uploaded_zip = st.file_uploader("Choose a zip file containing the source folder", type=["zip"])
@@ -305,7 +398,9 @@ def main():
             # Show test generation button if improvement not started
             if not st.session_state.mutation_improvement_started:
                 if st.button('🚀 Generate Additional Test Cases'):
-                    run_mutation_tests(MUTATION_TEST_FOLDER_PATH, MUTATION_SOURCE_FOLDER_PATH)
+                    show_inserted_test_validation(run_mutation_tests(MUTATION_TEST_FOLDER_PATH,
+                                                                     MUTATION_SOURCE_FOLDER_PATH,
+                                                                     impact_dir=IMPACT_PATH))
                     st.session_state.tests_generated = True
                     st.session_state.mutation_improvement_started = True
                     st.info("✅ Additional test cases have been generated")
@@ -333,6 +428,8 @@ def main():
                 if st.button("🚀 Deploy", type="primary"):
                     st.success("✅ Deployment initiated successfully!")
                     st.balloons()
+
+    display_llm_metrics(metrics.path)
                 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,50 +1,29 @@
-import json
 import os
 import re
-from autogen import AssistantAgent,config_list_from_json
 from template_prompts import build_fix_prompt
 from agenticapp.agents.CoverageAgent import update_test_files
-from dotenv import load_dotenv
-# Load environment variables
-load_dotenv()
-# Load AI agent configurations
-config_path = r"D:\Sai\EnhanceUnitTesting\src\agenticapp\OAI_CONFIG_LIST.json"
-config_list = config_list_from_json(config_path)
-# Replace the placeholder with the actual API key from .env
-for config in config_list:
-    if "api_key" in config and config["api_key"] == "ENV_OPENAI_API_KEY":
-        config["api_key"] = os.getenv("OPENAI_API_KEY")
+from agenticapp.agents.model_router import TIER_CONFIG_PATHS, initial_tier, routed_reply
+from agenticapp.agents.speculative import speculate_test_methods, speculation_enabled
+from agenticapp.agents.TestExecutionAgent import iter_test_results, run_tests_by_id
+from agenticapp.utils.output_validation import TEST_METHODS
 
-
-
-# Initialize OpenAI Agent
-#llm_config = {
-#    "model": "gpt-4o-mini",  # Ensure this is a valid field
-#    "temperature": 0.7,  # Example of another valid key
-#}
-
-# Initialize AI Agents
-openai_agent = AssistantAgent(
-    name="AutoFixingAgent",
-    llm_config={"config_list": config_list, "temperature": 0},
-)
-
-#openai_agent = AssistantAgent(name="AutoFixingAgent",llm_config=llm_config)
+# AI agent, created on first use by the agent registry
+AUTO_FIXING_AGENT = "AutoFixingAgent"
 
 # Paths for test and source code files
 TEST_FOLDER = "tests"
-TEST_RESULTS_FILE = "results.json"
+SOURCE_FOLDER = "source_files"
+TEST_RESULTS_FILE = "results.jsonl"
 
 
 
-# Load test results
+# Load test results (streamed one record at a time)
 def load_test_results(TEST_RESULTS_FILE):
-    with open(TEST_RESULTS_FILE, "r") as file:
-        return json.load(file)["results"]
+    return iter_test_results(TEST_RESULTS_FILE)
 
 # Identify failed tests
 def extract_failed_tests(test_results):
-    return [{"name": test["test"], "reason": test.get("reason", "Unknown error")} for test in test_results if test["status"] in ["FAIL", "ERROR"]]
+    return [{"name": test["test"], "reason": test.get("reason", "Unknown error")} for test in test_results if test["status"] in ["FAIL", "ERROR", "TIMEOUT"]]
 import re
 
 def locate_test_file(test_name):
@@ -98,24 +77,60 @@ def extract_test_function(test_path, test_name):
         return None, content
 
 
-def fix_test_case(source_code,test_function_code, error_reason):
-    
+def fix_test_case(source_code,test_function_code, error_reason, source_file=None, accept=None,
+                  test_path=None, base_content=None):
+    """
+    Ask for a fixed version of a failing test function. Short fixes of at most
+    one assertion go to the small model first and escalate to the large one
+    when the reply is malformed or accept(fixed_code) rejects it.
+
+    In speculative mode (with test_path and the test file's base_content) several
+    candidates are requested at once and the first whose test passes is used.
+
+    Returns (fixed_code, applied): applied is True when accept already left
+    fixed_code in the test file. With accept given, a fix it rejected on every
+    tier is not returned.
+    """
     messages=build_fix_prompt(source_code, test_function_code, error_reason)
-    response = openai_agent.generate_oai_reply( messages)
-    #response = openai_agent.generate_reply(messages)
-    print("response is ",response)
-    if not response :
+    assertions = len(re.findall(r"\bself\.assert\w*\(", test_function_code or ""))
+    start_tier = initial_tier((test_function_code or "") + error_reason, assertions=assertions)
+    fixed_code = None
+    if speculation_enabled() and test_path:
+        fixed_code, passed = speculate_test_methods(AUTO_FIXING_AGENT, messages, test_path, base_content,
+                                                    config_path=TIER_CONFIG_PATHS[start_tier], test_root=TEST_FOLDER,
+                                                    stage="fixing", source_file=source_file)
+        if not passed:
+            print("[INFO] No speculative candidate passed, asking for a single fix")
+            fixed_code = None
+    applied = False
+    if not fixed_code:
+        accepted = []
+
+        def accept_and_note(candidate):
+            if accept(candidate):
+                accepted.append(candidate)
+                return True
+            return False
+
+        fixed_code, tier = routed_reply(AUTO_FIXING_AGENT, messages, TEST_METHODS, start_tier=start_tier,
+                                        stage="fixing", source_file=source_file,
+                                        accept=accept_and_note if accept else None)
+        print(f"[INFO] Fix for test generated by the {tier} model tier")
+        if accept and not accepted:
+            print("[ERROR] No model tier produced a fix that passes:", test_function_code)
+            return None, False
+        applied = bool(accepted)
+    print("response is ",fixed_code)
+    if not fixed_code :
         print("[ERROR] No response from OpenAI for:", test_function_code)
-        return None
+        return None, False
 
-    #fixed_code = response["content"].strip()
-    fixed_code = response[1].strip() if isinstance(response, tuple) else response.strip()
     if fixed_code == test_function_code:
         print("[WARNING] OpenAI did not modify the test case:", test_function_code)
-        return None
+        return None, False
 
     print("[SUCCESS] Fixed test case generated.")
-    return fixed_code
+    return fixed_code, applied
 
 
 # Apply regex-based fixes for common errors
@@ -172,12 +187,12 @@ def update_test_file(test_path, test_name, error_reason):
 
     # Try regex fix
     fixed_code = apply_regex_fix(test_name, test_function_code, error_reason) if test_function_code else None
+    applied = False
 
     # If regex fix fails, fall back to LLM
     if not fixed_code:
         print(f"[INFO] Using OpenAI to fix or create {test_name}")
-        SOURCE_FOLDER_PATH = r"D:\Sai\EnhanceUnitTesting\source_files"
-        source_path = locate_source_file(test_name, SOURCE_FOLDER_PATH)
+        source_path = locate_source_file(test_name, SOURCE_FOLDER)
 
         if not source_path:
             print(f"[ERROR] Source file not found for {test_name}, skipping OpenAI fix.")
@@ -186,25 +201,48 @@ def update_test_file(test_path, test_name, error_reason):
         with open(source_path, "r", encoding="utf-8") as source_file:
             source_code = source_file.read()
 
-        fixed_code = fix_test_case(source_code, test_function_code, error_reason)
+        base_content = content.replace(test_function_code, "").strip() if test_function_code else content
+        fixed_code, applied = fix_test_case(source_code, test_function_code, error_reason, source_file=source_path,
+                                   accept=lambda candidate: fix_passes(test_path, test_name, test_function_code,
+                                                                       content, candidate),
+                                   test_path=test_path, base_content=base_content)
 
     if not fixed_code:
         print(f"[ERROR] Failed to generate a fix for {test_name}")
         return
 
+    if applied:
+        # The passing fix is already in the test file
+        return
+    apply_test_fix(test_path, test_name, test_function_code, content, fixed_code)
+
+
+def apply_test_fix(test_path, test_name, test_function_code, content, fixed_code):
+    """Replace the failing function (if any) in content with fixed_code and write the test file."""
     if test_function_code:
         # Remove the existing failing function
         content = content.replace(test_function_code, "").strip()
 
-        with open(test_path, "w", encoding="utf-8") as file:
-            file.write(content)
-
+    with open(test_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    if test_function_code:
         print(f"[INFO] Deleted failing function: {test_name} from {test_path}")
 
-    # Append the fixed or new test function using update_test_files
-    update_test_files(test_path, fixed_code)
+    # Append the fixed or new test function using update_test_files; fixes are not newly inserted tests
+    update_test_files(test_path, fixed_code, record=False)
     print(f"[SUCCESS] Appended modified test case: {test_name} into {test_path}")
 
+
+def fix_passes(test_path, test_name, test_function_code, content, fixed_code):
+    """Apply a candidate fix, run the test and restore the original file when it still fails."""
+    apply_test_fix(test_path, test_name, test_function_code, content, fixed_code)
+    if run_tests_by_id([test_name], TEST_FOLDER).get(test_name):
+        return True
+    print(f"[WARNING] {test_name} still fails with the candidate fix")
+    with open(test_path, "w", encoding="utf-8") as file:
+        file.write(content)
+    return False
+
 # Main function
 def fix_failing_tests(TEST_RESULTS_FILE):
     test_results = load_test_results(TEST_RESULTS_FILE)
@@ -220,5 +258,5 @@ def fix_failing_tests(TEST_RESULTS_FILE):
             update_test_file(test_path, test["name"], test["reason"])
 
 if __name__ == "__main__":
-    IMPROVED_TEST_RESULTS_FILE = "improved_testcaseresults.json"
+    IMPROVED_TEST_RESULTS_FILE = "improved_testcaseresults.jsonl"
     fix_failing_tests(IMPROVED_TEST_RESULTS_FILE)
@@ -1,37 +1,30 @@
-import coverage
-import pandas as pd
+import ast
+import json
 import re
 import os
 import sys
 import unittest
 import subprocess
-from dotenv import load_dotenv
-from autogen import AssistantAgent, config_list_from_json
+import tempfile
+import threading
 from agenticapp.utils.file_utils import find_test_file
 from agenticapp.template_prompts import generate_branch_coverage_prompt
 from agenticapp.agents.TestGenerationAgent import clean_generated_code  # External function to clean AI response
-# Import streamlit
-import streamlit as st
+from agenticapp.utils.llm_utils import generate_reply
+from agenticapp.agents.agent_registry import get_agent
+from agenticapp.utils.output_validation import TEST_METHODS
+from agenticapp.utils.coverage_slicing import slice_uncovered_source, summarize_test_signatures
+from agenticapp.utils.test_impact import ImpactMap
 # --------------------------
 # Module-level setup
 # --------------------------
-load_dotenv()
-
-config_path = r"D:\Sai\EnhanceUnitTesting\src\agenticapp\OAI_CONFIG_LIST.json"
-config_list = config_list_from_json(config_path)
-
-for config in config_list:
-    if "api_key" in config and config["api_key"] == "ENV_OPENAI_API_KEY":
-        config["api_key"] = os.getenv("OPENAI_API_KEY")
-
-coverage_agent = AssistantAgent(
-    name="CoverageAgent",
-    llm_config={"config_list": config_list, "temperature": 0},
-)
-test_generation_agent = AssistantAgent(
-    name="TestGenerationAgent",
-    llm_config={"config_list": config_list, "temperature": 0},
-)
+# Agents are created on first use by the agent registry
+TEST_GENERATION_AGENT = "TestGenerationAgent"
+# Tests inserted by update_test_files, so they can be run on their own right after insertion
+INSERTED_TESTS_FILE = os.path.join(".cache", "inserted_tests.json")
+# Set VALIDATE_INSERTED_TESTS=0 to skip running the inserted tests at the end of a stage
+VALIDATE_INSERTED_TESTS = os.getenv("VALIDATE_INSERTED_TESTS", "1").lower() not in ("0", "false", "no")
+_inserted_tests_lock = threading.Lock()
 
 # Update sys.path so that modules under source_files can be imported.
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -50,18 +43,27 @@ add_parent_directories_to_sys_path(source_files_root)
 
 
 
-# Initialize coverage object using Streamlit's cache_resource
-@st.cache_resource
+# The coverage object is created and started on first use and kept for the
+# lifetime of the process, so Streamlit reruns keep measuring into it.
+cov = None
+
 def get_coverage_object():
-    cov = coverage.Coverage(
-        omit=["*/tests/*", "*/__init__.py"],
-        include=["*/source_files/*"],
-        branch=True
-    )
-    cov.start()
+    global cov
+    if cov is None:
+        import coverage
+
+        cov = coverage.Coverage(
+            omit=["*/tests/*", "*/__init__.py"],
+            include=["*/source_files/*"],
+            branch=True
+        )
+        cov.start()
     return cov
 
-cov = get_coverage_object()
+def start_coverage():
+    """Start measuring before the source modules are first imported by a stage."""
+    get_coverage_object()
+
 # --------------------------
 # Helper functions for updating test file
 # --------------------------
@@ -69,7 +71,7 @@ def measure_coverage(test_folder, coverage_report_file="coverage_report.txt",sho
     """
     Runs tests, stops coverage, and writes a report.
     """
-    global cov
+    cov = get_coverage_object()
     if should_restart:
        cov.stop()  # Ensure coverage is stopped before erasing
        cov.erase()
@@ -91,9 +93,29 @@ def measure_coverage(test_folder, coverage_report_file="coverage_report.txt",sho
     print(f"✅ Coverage report saved to {coverage_report_file}")
     print("📊 HTML report generated in 'coverage_html_report/'")
 
-def measure_coverage_with_cli(test_folder, coverage_report_file="coverage_report1.txt"):
+def measure_coverage_with_cli(test_folder, coverage_report_file="coverage_report1.txt", impact_dir=None,
+                              source_folder=None):
+    """
+    Runs the test suite under coverage and writes the text and HTML reports.
+    When impact_dir holds a test impact map recorded on the current files
+    (see TestExecutionAgent.discover_and_run_tests), the merged per-test
+    coverage in it is reported instead of running the suite again.
+    """
     omit_patterns = ["tests/*", "*/__init__.py"]
 
+    if impact_dir:
+        source_folder = source_folder or os.path.join(os.path.dirname(os.path.abspath(test_folder)), "source_files")
+        if ImpactMap(impact_dir, test_folder, source_folder).write_coverage_data(".coverage"):
+            import coverage
+
+            print("📊 Reporting the coverage recorded by the last test run")
+            cov_data = coverage.Coverage(data_file=".coverage", branch=True)
+            cov_data.load()
+            with open(coverage_report_file, "w") as f:
+                cov_data.report(file=f, omit=omit_patterns)
+            cov_data.html_report(directory="coverage_html1_report", omit=omit_patterns)
+            return
+
     # Run unit tests with branch coverage
     subprocess.run([
         "coverage", "run", "--branch", "-m", "unittest", "discover", "-s", test_folder, "-p", "test_*.py"
@@ -116,6 +138,17 @@ def measure_coverage_with_cli(test_folder, coverage_report_file="coverage_report
     ])
 
         
+def read_total_coverage(file_path):
+    """Return the TOTAL coverage percentage of a text coverage report, or None if it has none."""
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            match = re.match(r"TOTAL\s+.*?(\d+(?:\.\d+)?)%", line.replace("\x00", "").strip())
+            if match:
+                return float(match.group(1))
+    return None
+
 def parse_coverage_report(file_path):
     """
     Reads the text coverage report and returns a list of tuples:
@@ -142,6 +175,44 @@ def parse_coverage_report(file_path):
     return low_coverage_files
 
 
+def load_missing_coverage(data_file=".coverage"):
+    """
+    Reads the coverage data file and returns, per measured file, the missing
+    lines and missing branch arcs:
+    {file_name: {"missing_lines": [...], "missing_branches": [[from, to], ...]}}
+    Both the report-relative and the absolute file names are used as keys.
+    """
+    if not os.path.exists(data_file):
+        print(f"⚠️ Coverage data file not found: {data_file}")
+        return {}
+    # Not next to data_file: coverage treats .coverage.* files there as parallel data files to combine
+    fd, json_report_file = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        import coverage
+
+        cov_data = coverage.Coverage(data_file=data_file)
+        cov_data.load()
+        cov_data.json_report(outfile=json_report_file, omit=["*/tests/*", "*/__init__.py"])
+        with open(json_report_file, "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+    except Exception as e:
+        print(f"⚠️ Could not read coverage data {data_file}: {e}")
+        return {}
+    finally:
+        os.remove(json_report_file)
+
+    missing = {}
+    for file_name, file_data in files.items():
+        entry = {
+            "missing_lines": file_data.get("missing_lines", []),
+            "missing_branches": file_data.get("missing_branches", []),
+        }
+        missing[file_name] = entry
+        missing[os.path.abspath(file_name)] = entry
+    return missing
+
+
 import textwrap
 def display_coverage_report(COVERAGE_REPORT_PATH):
     """Read and display coverage report in a tabular format."""
@@ -158,7 +229,8 @@ def display_coverage_report(COVERAGE_REPORT_PATH):
                     data.append(parts)
 
         if data:
-            
+            import pandas as pd
+
             df = pd.DataFrame(data, columns=["File", "Statements", "Missed","Branches", "BrMissed", "Coverage"])
             df["Coverage"] = df["Coverage"].str.replace("%", "").astype(float)  # Convert coverage to numeric
 
@@ -259,11 +331,65 @@ def insert_tests_into_existing_class(existing_lines, new_test_methods):
         new_test_methods += "\n"
     return existing_lines[:insert_index] + [new_test_methods] + existing_lines[insert_index:]
 
-def update_test_files(test_file, generated_code):
+def _read_inserted_tests():
+    try:
+        with open(INSERTED_TESTS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def record_inserted_tests(test_file, class_name, test_names):
+    """Add test_names of class_name in test_file to INSERTED_TESTS_FILE."""
+    with _inserted_tests_lock:
+        entries = _read_inserted_tests()
+        entries.append({"file": os.path.abspath(test_file), "class": class_name, "tests": test_names})
+        os.makedirs(os.path.dirname(INSERTED_TESTS_FILE), exist_ok=True)
+        with open(INSERTED_TESTS_FILE, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+
+def take_inserted_tests(test_root):
+    """
+    Return the ids (relative to test_root, as in the test results) of the
+    tests recorded as inserted under test_root, and forget them.
+    """
+    test_root = os.path.abspath(test_root)
+    with _inserted_tests_lock:
+        entries = _read_inserted_tests()
+        kept, test_ids = [], []
+        for entry in entries:
+            if os.path.commonpath([entry["file"], test_root]) != test_root:
+                kept.append(entry)
+                continue
+            if os.path.exists(entry["file"]):
+                module_name = os.path.splitext(os.path.relpath(entry["file"], test_root))[0].replace(os.sep, ".")
+                test_ids.extend(f"{module_name}.{entry['class']}.{name}" for name in entry["tests"])
+        if kept:
+            with open(INSERTED_TESTS_FILE, "w", encoding="utf-8") as f:
+                json.dump(kept, f, indent=2)
+        elif os.path.exists(INSERTED_TESTS_FILE):
+            os.remove(INSERTED_TESTS_FILE)
+    return list(dict.fromkeys(test_ids))
+
+def validate_stage_tests(test_folder, validate=None, impact_dir=None):
+    """
+    Run the tests inserted under test_folder since they were last taken (see
+    TestExecutionAgent.validate_inserted_tests) and return the report, or None
+    when validation is off or nothing was inserted.
+    """
+    from agenticapp.agents.TestExecutionAgent import validate_inserted_tests
+
+    test_ids = take_inserted_tests(test_folder)
+    if not (VALIDATE_INSERTED_TESTS if validate is None else validate) or not test_ids:
+        return None
+    print(f"⚡ Running the {len(test_ids)} inserted tests")
+    return validate_inserted_tests(test_folder, test_ids, impact_dir=impact_dir)
+
+def update_test_files(test_file, generated_code, record=True):
     """
     Updates an existing test file by inserting the generated test methods into the first unittest.TestCase subclass.
     Assumes that generated_code already contains valid test method definitions.
     It reindents the generated code relative to the class declaration.
+    With record=True the inserted tests are added to INSERTED_TESTS_FILE.
     """
     with open(test_file, "r", encoding="utf-8") as f:
         lines = f.readlines()
@@ -271,10 +397,11 @@ def update_test_files(test_file, generated_code):
     # Find the class indent from the first unittest.TestCase subclass.
     import re
     class_indent = ""
+    class_name = None
     for line in lines:
-        m = re.search(r"^(\s*)class\s+\w+\(unittest\.TestCase\):", line)
+        m = re.search(r"^(\s*)class\s+(\w+)\(unittest\.TestCase\):", line)
         if m:
-            class_indent = m.group(1)
+            class_indent, class_name = m.group(1), m.group(2)
             break
 
     # Reindent generated code with base indent = class_indent + 4 spaces.
@@ -285,18 +412,42 @@ def update_test_files(test_file, generated_code):
     with open(test_file, "w", encoding="utf-8") as f:
         f.writelines(updated_lines)
     print(f"✅ Updated {test_file} with new test methods.")
-
-def generate_and_update_tests(coverage_report_file, test_folder):
+    if record and class_name:
+        try:
+            test_names = [node.name for node in ast.parse(textwrap.dedent(new_methods)).body
+                          if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")]
+        except SyntaxError:
+            test_names = []
+        if test_names:
+            record_inserted_tests(test_file, class_name, test_names)
+
+def generate_and_update_tests(coverage_report_file, test_folder, slice_source=True, coverage_data_file=".coverage",
+                              candidates=None, validate=None, impact_dir=None):
     """
     Identifies files with low branch coverage, generates missing test methods,
     and inserts these methods into the first unittest.TestCase subclass in the appropriate test file.
     The prompt includes the source file content, existing test file content, coverage,
     missing statements, and missing branches information.
+
+    With slice_source=True the prompt only carries the functions that contain
+    missing lines or branches (taken from coverage_data_file) and a signature
+    summary of the existing tests, instead of both files in full.
+
+    With more than one candidate (or SPECULATIVE_CANDIDATES set), several
+    completions are requested per file and the first whose new tests pass is kept.
+
+    Unless validate is False (default: VALIDATE_INSERTED_TESTS), the inserted
+    tests are then run on their own; returns that report (see
+    validate_stage_tests) or None.
     """
+    from agenticapp.agents.speculative import speculate_test_methods, speculation_enabled
+
     low_coverage_files = parse_coverage_report(coverage_report_file)
     if not low_coverage_files:
         print("✅ All files have 100% coverage! No additional tests needed.")
-        return
+        return None
+    take_inserted_tests(test_folder)
+    missing_coverage = load_missing_coverage(coverage_data_file) if slice_source else {}
     source_root = os.path.abspath("source_files")
     for file_name, missing_statements, missing_branches, coverage in low_coverage_files:
         print(f"📌 Low coverage detected in {file_name} ({coverage}%) - Missing statements: {missing_statements}, missing branches: {missing_branches}")
@@ -329,14 +480,30 @@ def generate_and_update_tests(coverage_report_file, test_folder):
         except Exception as e:
             print(f"⚠️ Could not read test file {test_file}: {e}")
             test_file_content = ""
-        prompt=generate_branch_coverage_prompt(coverage, file_name, missing_statements, missing_branches,source_content, test_file_content)
-        response = test_generation_agent.generate_oai_reply(
-            messages=[{"role": "user", "content": prompt}]
-        )
-        raw_test_cases = response[1].strip() if isinstance(response, tuple) else response.strip()
+        file_missing = missing_coverage.get(file_name) or missing_coverage.get(abs_file)
+        sliced = bool(file_missing and source_content)
+        if sliced:
+            full_size = len(source_content) + len(test_file_content)
+            source_content = slice_uncovered_source(source_content, file_missing["missing_lines"], file_missing["missing_branches"])
+            test_file_content = summarize_test_signatures(test_file_content)
+            print(f"✂️ Sliced prompt for {file_name}: {full_size} -> {len(source_content) + len(test_file_content)} characters")
+        prompt=generate_branch_coverage_prompt(coverage, file_name, missing_statements, missing_branches,source_content, test_file_content, sliced=sliced)
+        if speculation_enabled(candidates):
+            with open(test_file, "r", encoding="utf-8") as tf:
+                base_content = tf.read()
+            raw_test_cases, passed = speculate_test_methods(TEST_GENERATION_AGENT, [{"role": "user", "content": prompt}],
+                                                            test_file, base_content, candidates, test_root=test_folder,
+                                                            stage="coverage", source_file=file_name)
+            if raw_test_cases:
+                print(f"🎯 Using {'passing' if passed else 'best'} speculative candidate for {file_name}")
+                update_test_files(test_file, clean_generated_code(raw_test_cases).strip())
+                continue
+        raw_test_cases = generate_reply(get_agent(TEST_GENERATION_AGENT), [{"role": "user", "content": prompt}], output_format=TEST_METHODS,
+                                        stage="coverage", source_file=file_name)
         cleaned_test_cases = clean_generated_code(raw_test_cases).strip()
         print("🚀 Cleaned Test Cases:\n", cleaned_test_cases)
         update_test_files(test_file, cleaned_test_cases)
+    return validate_stage_tests(test_folder, validate, impact_dir)
 
 
 if __name__ == "__main__":
@@ -2,30 +2,18 @@ import os
 import re
 import yaml  # Changed to use pyyaml for YAML support
 import subprocess
-from autogen import AssistantAgent
-from autogen.oai.openai_utils import config_list_from_json
-from dotenv import load_dotenv
 from agenticapp.template_prompts import generate_mutation_prompt
 from agenticapp.utils.mutationutils import apply_mutation
-from agenticapp.agents.CoverageAgent import update_test_files
+from agenticapp.agents.CoverageAgent import take_inserted_tests, update_test_files, validate_stage_tests
+from agenticapp.utils.llm_utils import generate_reply
+from agenticapp.agents.agent_registry import get_agent
+from agenticapp.utils.output_validation import TEST_METHODS
 import sys
 import traceback
-# Load environment variables
-load_dotenv()
-
-# Load config from JSON and replace environment variable placeholder
-config_path = r"D:\\Sai\\EnhanceUnitTesting\\src\\agenticapp\\OAI_CONFIG_LIST.json"
-config_list = config_list_from_json(config_path)
-
-for config in config_list:
-    if "api_key" in config and config["api_key"] == "ENV_OPENAI_API_KEY":
-        config["api_key"] = os.getenv("OPENAI_API_KEY")
-
-# Create the mutation test assistant agent
-mutationtest_agent = AssistantAgent(
-    name="MutationTestAgent",
-    llm_config={"config_list": config_list, "temperature": 0},
-)
+# The mutation test assistant agent is created on first use by the agent registry
+MUTATION_TEST_AGENT = "MutationTestAgent"
+# mut.py script run for mutation coverage; MUTPY_SCRIPT overrides the default install location
+MUTPY_SCRIPT = os.getenv("MUTPY_SCRIPT", "c:/Users/sbask/anaconda3/Scripts/mut.py")
 
 def locate_source_file_from_test(test_file_path, test_base_folder, source_base_folder):
     relative_path = os.path.relpath(test_file_path, test_base_folder)
@@ -97,7 +85,7 @@ def get_mutation_coverage(project_root, target_module, test_module, stage_name='
     try:
         cmd = [
             sys.executable,  # This gets the current Python interpreter path,
-            'c:/Users/sbask/anaconda3/Scripts/mut.py',
+            MUTPY_SCRIPT,
             '--target', target_module,
             '--unit-test', test_module,
             '--report', report_path,
@@ -152,10 +140,9 @@ def generate_mutation_test_for_file(test_file_path, test_base_folder, source_bas
         mutated_source, mutation_diff = apply_mutation(original_source)
         messages = generate_mutation_prompt(original_source, original_test, mutation_diff)
         
-        response = mutationtest_agent.generate_oai_reply(messages)
-        
         # Process generated test code
-        generated_test_code = response[1].strip() if isinstance(response, tuple) else response.strip()
+        generated_test_code = generate_reply(get_agent(MUTATION_TEST_AGENT), messages, output_format=TEST_METHODS,
+                                             stage="mutation", source_file=source_path)
         
         update_test_files(test_file_path, generated_test_code)
         print(f"✅ Mutation test updated for: {test_file_path}")
@@ -163,7 +150,15 @@ def generate_mutation_test_for_file(test_file_path, test_base_folder, source_bas
     except Exception as e:
         print(f"⚠️ Error processing {test_file_path}: {str(e)}")
 
-def run_mutation_tests(test_base_folder, source_base_folder):
+def run_mutation_tests(test_base_folder, source_base_folder, test_root=None, validate=None, impact_dir=None):
+    """
+    Generate mutation-killing tests for every source file with a test file,
+    then run just the inserted tests (relative to test_root, by default the
+    folder above test_base_folder) unless validate is False. Returns that
+    report (see validate_stage_tests) or None.
+    """
+    test_root = test_root or os.path.dirname(os.path.abspath(test_base_folder))
+    take_inserted_tests(test_root)
     for root, _, files in os.walk(source_base_folder):
         for file in files:
             if file.endswith(".py") and file != "__init__.py":
@@ -196,6 +191,7 @@ def run_mutation_tests(test_base_folder, source_base_folder):
                     print(f"⚠️ Test file not found for: {source_file_path}")
     
     print("\n✅ Mutation test generation completed for all source files with tests.")
+    return validate_stage_tests(test_root, validate, impact_dir)
 
 if __name__ == "__main__":
     APP_NAME = "InsuranceApp_Modified"
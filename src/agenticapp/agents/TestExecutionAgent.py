@@ -1,190 +1,705 @@
-import autogen
-from autogen import AssistantAgent, config_list_from_json
 import unittest
+import faulthandler
+import heapq
+import html
+import io
 import json
 import os
-from dotenv import load_dotenv
-from datetime import datetime
-import pandas as pd
-import importlib
 import shutil
-# Load environment variables
-load_dotenv()
-# Load AI agent configurations
-config_path = r"D:\Sai\EnhanceUnitTesting\src\agenticapp\OAI_CONFIG_LIST.json"
-config_list = config_list_from_json(config_path)
-# Replace the placeholder with the actual API key from .env
-for config in config_list:
-    if "api_key" in config and config["api_key"] == "ENV_OPENAI_API_KEY":
-        config["api_key"] = os.getenv("OPENAI_API_KEY")
-
-
-# Initialize AI Agents
-test_execution_agent = AssistantAgent(
-    name="TestExecutionAgent",
-    llm_config={"config_list": config_list, "temperature": 0},
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from agenticapp.utils.test_impact import (
+    ImpactMap, executed_lines, read_test_coverage, save_test_coverage, start_test_coverage
 )
+from agenticapp.utils.worker_pool import get_worker_pool
+
+# Worker processes the test modules are sharded across
+TEST_SHARDS = int(os.getenv("TEST_SHARDS", str(os.cpu_count() or 1)))
+# A worker is killed (and the test recorded as TIMEOUT) when one test or one module runs longer
+TEST_TIMEOUT_SECONDS = float(os.getenv("TEST_TIMEOUT_SECONDS", "60"))
+MODULE_TIMEOUT_SECONDS = float(os.getenv("MODULE_TIMEOUT_SECONDS", "300"))
+TIMEOUT_GRACE_SECONDS = 1.0
+# Tests taking longer than this many seconds are flagged as slow (0 turns the flag off)
+SLOW_TEST_SECONDS = float(os.getenv("SLOW_TEST_SECONDS", "0"))
+# Tests listed in the "slowest tests" section of the HTML report
+SLOWEST_TESTS_SHOWN = 10
+# Passing tests listed per module in the HTML report; every non-passing test is always listed (0 lists all)
+REPORT_PASSING_ROWS_PER_MODULE = int(os.getenv("REPORT_PASSING_ROWS_PER_MODULE", "500"))
 
 
-def discover_and_run_tests(test_folder, output_json="test_results.json", output_html="test_results.html"):
+def discover_and_run_tests(test_folder, output_json="test_results.jsonl", output_html="test_results.html",
+                           shards=None, slow_threshold=None, test_timeout=None, module_timeout=None,
+                           source_folder=None, impact_dir=None):
     """
-    Uses test_execution_agent to discover and run all unit tests in a folder.
-    Stores test results in JSON and HTML reports.
+    Uses the TestExecutionAgent to discover and run all unit tests in a folder.
+    Test modules are sharded across supervised worker processes (shards, by
+    default TEST_SHARDS or the CPU count) and the per-test outcomes merged.
+    The workers are forked from a pre-warmed parent that holds the modules of
+    source_folder (default: the source_files folder next to test_folder),
+    so each run gets clean module state without importing anything here.
+    A test running longer than test_timeout, or a module longer than
+    module_timeout, seconds is recorded as TIMEOUT with its stack and the
+    run continues.
+    Test results, with per-test wall and CPU seconds, are appended to the
+    JSON-lines file output_json as each test completes (see TestResultWriter),
+    followed by a per-module rollup; an HTML report is written at the end.
+    Tests slower than slow_threshold seconds (default SLOW_TEST_SECONDS) are
+    flagged as slow.
+    With impact_dir, each test's coverage is recorded in a test impact map
+    there (see ImpactMap) and later runs only run the tests affected by the
+    source and test files changed since; the others keep their recorded
+    results, marked "reused".
     """
     
-    CACHE_PATH = os.path.join(test_folder, "__pycache__")  # Define cache path dynamically
     print("TestExecutionAgent: Running unit tests...")
-    # Ensure cache is removed before running tests
-    if os.path.exists(CACHE_PATH):
-        shutil.rmtree(CACHE_PATH, ignore_errors=True)
-        print(f"✅ Deleted cache folder: {CACHE_PATH}")  # Debugging
-    # Force reload of test modules to prevent stale imports
-    for root, _, files in os.walk(test_folder):
-        for file in files:
-            if file.startswith("test_") and file.endswith(".py"):
-                module_name = os.path.splitext(file)[0]
-                module_path = os.path.relpath(os.path.join(root, module_name), start=test_folder).replace(os.sep, ".")
-
-                try:
-                    module = importlib.import_module(module_path)
-                    importlib.reload(module)
-                    print(f"🔄 Reloaded module: {module_path}")
-                except ModuleNotFoundError:
-                    print(f"⚠️ Module not found: {module_path}")    
-    test_execution_agent.generate_reply(
-    messages=[{"role": "system", "content": "Execute unit tests automatically without user input."}]
-    )
-   
-    loader = unittest.defaultTestLoader
-    topleveldir="D:\\Sai\\EnhanceUnitTesting\\tests"
-   
-    suite = loader.discover(test_folder, pattern="test_*.py",top_level_dir=test_folder)
-    
-    if suite.countTestCases() == 0:
-        print("No test cases found.")
-        return
 
-    results = {"test_run_date": datetime.now().isoformat(), "results": []}
-    test_runner = unittest.TextTestRunner(verbosity=2)
-    result = test_runner.run(suite)
-    
-    #suite = unittest.TestLoader().discover(test_folder,pattern="test_*.py",top_level_dir=test_folder)
-    suite = unittest.TestLoader().discover(test_folder,pattern="test_*.py",top_level_dir=topleveldir)
-    if suite.countTestCases() == 0:
+    topleveldir = os.path.abspath(test_folder)
+    # Workers are forked from a parent holding the (unchanged) sources, so every run imports fresh test modules
+    source_folder = source_folder or os.path.join(os.path.dirname(topleveldir), "source_files")
+    pool = get_worker_pool(source_folder)
+    all_test_cases = discover_tests(pool, topleveldir, module_timeout or MODULE_TIMEOUT_SECONDS)
+    if not all_test_cases:
         print("No test cases found in the specified folder.")
         return
-    
-    all_test_cases = []
-    _collect_test_cases(suite, all_test_cases)
     print(f"✅ Collected {len(all_test_cases)} test cases after recursion.")
-    
-    for test_case in all_test_cases: # loop over test cases and add results
-        add_test_result(results["results"], test_case, result)
-   
-    with open(output_json, "w") as f:
-        json.dump(results, f, indent=4)
 
-    generate_html_report(results["results"], output_html)
+    slow_threshold = SLOW_TEST_SECONDS if slow_threshold is None else slow_threshold
+    runnable = [(test_id, module_name) for test_id, module_name, record in all_test_cases if not record]
+    impact = ImpactMap(impact_dir, topleveldir, source_folder) if impact_dir else None
+    run_ids, reused = impact.select(runnable) if impact else ({test_id for test_id, _ in runnable}, [])
+    writer = TestResultWriter(output_json, len(all_test_cases), slow_threshold)
+    try:
+        # Modules that failed to import already have their results from discovery
+        for _, _, record in all_test_cases:
+            if record:
+                writer.write(record)
+        if reused:
+            print(f"♻️ Reusing the results of {len(reused)} tests unaffected by the changes; "
+                  f"running {len(run_ids)}")
+        for record in reused:
+            writer.write(record)
+        selected = [(test_id, module_name) for test_id, module_name in runnable if test_id in run_ids]
+        run_test_shards(pool, topleveldir, shard_test_modules(selected, shards or TEST_SHARDS), writer.write,
+                        test_timeout, module_timeout, impact.coverage_target if impact else None)
+        for test_id, _, _ in all_test_cases:
+            if test_id not in writer.written:
+                writer.write({"test": test_id, "status": "ERROR", "reason": "Test was not run by its shard",
+                              "duration": 0.0, "cpu_time": 0.0})
+    finally:
+        writer.close()
+    if impact:
+        impact.update(runnable, run_ids, iter_test_results(output_json), pool)
+
+    generate_html_report(iter_test_results(output_json), output_html, slow_threshold=slow_threshold)
     print(f"Test results stored in {output_json} and {output_html}")
 
-def _collect_test_cases(test_or_suite, all_test_cases):
+def _discover_worker(connection, test_root):
+    """Worker: discover the tests under test_root and send [(test id, module, result or None)]."""
+    suite = unittest.TestLoader().discover(test_root, pattern="test_*.py", top_level_dir=test_root)
+    test_cases = []
+    _collect_test_cases(suite, test_cases, verbose=False)
+    # Modules that failed to import cannot be loaded by name later; their placeholder tests run now
+    import_failures = [t for t in test_cases if isinstance(t, unittest.loader._FailedTest)]
+    records = {}
+    if import_failures:
+        records = unittest.TextTestRunner(stream=io.StringIO(), verbosity=2, resultclass=RecordingTestResult).run(
+            unittest.TestSuite(import_failures)).records
+    connection.send([(test.id(), type(test).__module__, records.get(test.id())) for test in test_cases])
+
+def discover_tests(pool, test_root, timeout):
+    """Discover the tests under test_root in a worker; return [(test id, module, result or None)]."""
+    worker, connection = pool.start_worker(_discover_worker, (test_root,))
+    try:
+        if not connection.poll(timeout):
+            raise TimeoutError(f"Test discovery in {test_root} did not finish within {timeout}s")
+        test_cases = connection.recv()
+    except EOFError:
+        raise RuntimeError(f"Test discovery worker for {test_root} exited unexpectedly")
+    finally:
+        worker.kill()
+        worker.join()
+        connection.close()
+    for test_id, _, _ in test_cases:
+        print(f"✔️ Collected test: {test_id}")
+    return test_cases
+
+def shard_test_modules(test_cases, shards):
+    """
+    Split the modules of test_cases ((test id, module) pairs) into at most
+    shards {module: [test ids]} dicts with about the same number of tests;
+    a module is never split, so its fixtures and test order stay as in a
+    serial run.
+    """
+    module_tests = {}
+    for test_id, module_name in test_cases:
+        module_tests.setdefault(module_name, []).append(test_id)
+    buckets = [[0, {}] for _ in range(max(1, min(shards, len(module_tests))))]
+    for module_name, test_ids in sorted(module_tests.items(), key=lambda item: -len(item[1])):
+        bucket = min(buckets, key=lambda b: b[0])
+        bucket[0] += len(test_ids)
+        bucket[1][module_name] = test_ids
+    return [shard for _, shard in buckets if shard]
+
+class RecordingTestResult(unittest.TextTestResult):
+    """
+    A TextTestResult that records each test's result entry ({"test", "status",
+    "reason", "duration", "cpu_time"}) as the test finishes, so no lookup in
+    the failures and errors lists is needed afterwards.
+
+    Skips, expected failures and unexpected successes count as PASS. A failed
+    subtest fails its test. Errors of class or module fixtures are kept in
+    fixture_errors, as the tests they prevented are never started.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.records = {}
+        self.timings = {}
+        self.fixture_errors = []
+        self._started = {}
+
+    def _record(self, test_id, status, reason=None):
+        record = self.records.get(test_id)
+        # An error outranks a failure of the same test (e.g. in one of its subtests)
+        if record is None or record["status"] != "ERROR":
+            self.records[test_id] = {"test": test_id, "status": status, "reason": reason}
+
+    def startTest(self, test):
+        self._started[test.id()] = (time.perf_counter(), time.process_time())
+        super().startTest(test)
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        test_id = test.id()
+        wall_started, cpu_started = self._started.pop(test_id, (None, None))
+        record = self.records.setdefault(test_id, {"test": test_id, "status": "PASS", "reason": None})
+        # Tests share the worker process, so its CPU time between start and stop is the test's
+        record["duration"] = round(time.perf_counter() - wall_started, 6) if wall_started is not None else 0.0
+        record["cpu_time"] = round(time.process_time() - cpu_started, 6) if cpu_started is not None else 0.0
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test.id(), "FAIL", self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        if isinstance(test, unittest.suite._ErrorHolder):
+            self.fixture_errors.append(f"{test.description}: {self.errors[-1][1]}")
+        else:
+            self._record(test.id(), "ERROR", self.errors[-1][1])
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            failed = issubclass(err[0], test.failureException)
+            self._record(test.id(), "FAIL" if failed else "ERROR", (self.failures if failed else self.errors)[-1][1])
+
+class _SupervisedTestResult(RecordingTestResult):
+    """RecordingTestResult of a worker process: reports each test to the supervisor and arms the stack dump."""
+
+    connection = None
+    stack_file = None
+    test_timeout = None
+    module_deadline = None
+    coverage = None
+
+    @classmethod
+    def arm_stack_dump(cls):
+        """Dump every thread's stack to stack_file if the worker is still busy when the next timeout hits."""
+        cls.stack_file.seek(0)
+        cls.stack_file.truncate()
+        timeout = min(cls.test_timeout, cls.module_deadline - time.monotonic())
+        faulthandler.dump_traceback_later(max(0.01, timeout), file=cls.stack_file)
+
+    def startTest(self, test):
+        self.connection.send(("start", test.id()))
+        self.arm_stack_dump()
+        if self.coverage:
+            self.coverage.switch_context(test.id())
+        super().startTest(test)
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        self.connection.send(("result", self.records[test.id()]))
+        self.arm_stack_dump()
+
+def _only_tests(suite, test_ids):
+    """Return a copy of suite with only the tests in test_ids, keeping its nesting (and so its fixtures)."""
+    kept = type(suite)()
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            kept.addTest(_only_tests(test, test_ids))
+        elif test.id() in test_ids:
+            kept.addTest(test)
+    return kept
+
+def _test_worker(connection, test_root, module_tests, skip_ids, test_timeout, module_timeout, stack_path,
+                 coverage_target=None):
+    """
+    Worker process: run the tests of module_tests module by module, reporting
+    over connection, and record each test's coverage when coverage_target is set.
+    """
+    if test_root not in sys.path:
+        sys.path.insert(0, test_root)
+    stream = io.StringIO()
+    with open(stack_path, "w") as stack_file:
+        _SupervisedTestResult.connection = connection
+        _SupervisedTestResult.stack_file = stack_file
+        _SupervisedTestResult.test_timeout = test_timeout
+        _SupervisedTestResult.coverage = start_test_coverage(coverage_target) if coverage_target else None
+        for module_name, test_ids in module_tests.items():
+            connection.send(("module", module_name))
+            _SupervisedTestResult.module_deadline = time.monotonic() + module_timeout
+            _SupervisedTestResult.arm_stack_dump()
+            try:
+                suite = _only_tests(unittest.TestLoader().loadTestsFromName(module_name),
+                                    set(test_ids) - skip_ids)
+                result = unittest.TextTestRunner(stream=stream, verbosity=2,
+                                                 resultclass=_SupervisedTestResult).run(suite)
+                reason = "Test did not run: " + ("\n".join(result.fixture_errors) or "no result recorded")
+                recorded = result.records
+            except Exception:
+                reason, recorded = f"Test did not run: could not load {module_name}:\n{traceback.format_exc()}", {}
+            if _SupervisedTestResult.coverage:
+                save_test_coverage(_SupervisedTestResult.coverage, recorded)
+            connection.send(("not_run", [(test_id, reason) for test_id in test_ids
+                                         if test_id not in skip_ids and test_id not in recorded]))
+        faulthandler.cancel_dump_traceback_later()
+        if _SupervisedTestResult.coverage:
+            _SupervisedTestResult.coverage.stop()
+    connection.send(("output", stream.getvalue()))
+    connection.send(("done", None))
+
+def _read_stack(stack_path):
+    try:
+        with open(stack_path, "r", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def _supervise_shard(pool, test_root, module_tests, emit, test_timeout, module_timeout, coverage_target=None):
+    """
+    Run a shard ({module: [test ids]}) in a worker process, killing it when a
+    test exceeds test_timeout or a module module_timeout seconds. The test
+    that hung is recorded as TIMEOUT with the worker's stack, and a new
+    worker resumes with the tests after it. Each result is passed to emit as
+    soon as it is known. Returns the runner output.
+    With coverage_target ((data file prefix, source folder)) the workers
+    record each test's coverage in a coverage context named by its id.
+    """
+    done, outputs = set(), []
+
+    def mark(test_ids, status, reason, duration=0.0):
+        for test_id in test_ids:
+            if test_id not in done:
+                done.add(test_id)
+                emit({"test": test_id, "status": status, "reason": reason, "duration": round(duration, 6),
+                      "cpu_time": 0.0})
+
+    stack_fd, stack_path = tempfile.mkstemp(prefix="test_stack_", suffix=".txt")
+    os.close(stack_fd)
+    try:
+        while True:
+            pending = {m: ids for m, ids in module_tests.items() if any(i not in done for i in ids)}
+            if not pending:
+                break
+            recorded_before = len(done)
+            try:
+                worker, receiver = pool.start_worker(_test_worker, (
+                    test_root, pending, set(done), test_timeout, module_timeout, stack_path, coverage_target))
+            except RuntimeError as e:
+                for test_ids in pending.values():
+                    mark(test_ids, "ERROR", f"Test did not run: {e}")
+                break
+            module = current = module_started = current_started = None
+            last_event = time.monotonic()
+            finished = timed_out = False
+            while not finished:
+                deadline = last_event + test_timeout
+                if module_started is not None:
+                    deadline = min(deadline, module_started + module_timeout)
+                # The grace lets the worker's own stack dump fire first
+                if not receiver.poll(max(0.0, deadline + TIMEOUT_GRACE_SECONDS - time.monotonic())):
+                    timed_out = True
+                    break
+                try:
+                    kind, value = receiver.recv()
+                except EOFError:
+                    break
+                last_event = time.monotonic()
+                if kind == "module":
+                    module, module_started, current = value, last_event, None
+                elif kind == "start":
+                    current, current_started = value, last_event
+                elif kind == "result":
+                    done.add(value["test"])
+                    emit(value)
+                    current = None
+                elif kind == "not_run":
+                    for test_id, reason in value:
+                        mark([test_id], "ERROR", reason)
+                elif kind == "output":
+                    outputs.append(value)
+                elif kind == "done":
+                    finished = True
+            if finished:
+                worker.join()
+                receiver.close()
+                continue
+
+            worker.kill()
+            worker.join()
+            receiver.close()
+            if timed_out:
+                stack = _read_stack(stack_path)
+                module_expired = module_started is not None and time.monotonic() >= module_started + module_timeout
+                limit = f"the {module_timeout}s timeout of module {module}" if module_expired \
+                    else f"the {test_timeout}s per-test timeout"
+                print(f"⏱️ Killed test worker after {limit} ({current or module})")
+                if current:
+                    mark([current], "TIMEOUT", f"Test exceeded {limit}\n{stack}", time.monotonic() - current_started)
+                elif module and not module_expired:
+                    # A fixture hung between tests; the class of the next test in run order cannot run
+                    next_test = next((i for i in module_tests[module] if i not in done), None)
+                    if next_test:
+                        test_class = next_test.rsplit(".", 1)[0]
+                        mark([i for i in module_tests[module] if i.rsplit(".", 1)[0] == test_class], "TIMEOUT",
+                             f"Test did not run: a fixture of {test_class} exceeded {limit}\n{stack}")
+                if module and module_expired:
+                    mark(module_tests[module], "TIMEOUT", f"Test did not run: exceeded {limit}\n{stack}")
+            else:
+                reason = "Test worker exited unexpectedly" if worker.exitcode is None \
+                    else f"Test worker exited with code {worker.exitcode}"
+                print(f"❌ {reason} ({current or module})")
+                if current:
+                    mark([current], "ERROR", f"{reason} while running this test")
+                elif module:
+                    mark(module_tests[module], "ERROR", f"Test did not run: {reason} in module {module}")
+            if len(done) == recorded_before:
+                # Nothing to blame the failure on; give up on the shard rather than loop
+                for test_ids in pending.values():
+                    mark(test_ids, "ERROR", "Test did not run: the test worker failed repeatedly")
+    finally:
+        os.remove(stack_path)
+    return "".join(outputs)
+
+def run_test_shards(pool, test_root, shards, emit, test_timeout=None, module_timeout=None, coverage_target=None):
+    """
+    Run each shard ({module: [test ids]}) in its own supervised worker
+    process, passing every test result to emit (from several threads).
+    """
+    test_timeout = test_timeout or TEST_TIMEOUT_SECONDS
+    module_timeout = module_timeout or MODULE_TIMEOUT_SECONDS
+    print(f"🧩 Running {sum(len(m) for m in shards)} test modules in {len(shards)} shards")
+    with ThreadPoolExecutor(max_workers=max(1, len(shards))) as executor:
+        futures = [executor.submit(_supervise_shard, pool, test_root, module_tests, emit, test_timeout,
+                                   module_timeout, coverage_target)
+                   for module_tests in shards]
+        for future in as_completed(futures):
+            print(future.result())
+
+def start_test_process(test_ids, test_root="tests"):
+    """Start a fresh interpreter running the given unittest ids (relative to test_root) and return it."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (os.getcwd(), env.get("PYTHONPATH")) if p)
+    return subprocess.Popen([sys.executable, "-m", "unittest", "-q", *test_ids], cwd=test_root, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+def run_tests_by_id(test_ids, test_root="tests", timeout=120):
+    """
+    Run each unittest id (relative to test_root, as in the results file) in a
+    fresh interpreter and return {test_id: passed}.
+    """
+    outcomes = {}
+    for test_id in test_ids:
+        process = start_test_process([test_id], test_root)
+        try:
+            process.communicate(timeout=timeout)
+            outcomes[test_id] = process.returncode == 0
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            print(f"⚠️ Test timed out after {timeout}s: {test_id}")
+            outcomes[test_id] = False
+    return outcomes
+
+def _baseline_lines(test_root, source_folder, exclude, impact_dir, baseline_data_file):
+    """Return {path: lines} the suite already covered, from the test impact map or else a coverage data file."""
+    impact = ImpactMap(impact_dir, test_root, source_folder) if impact_dir else None
+    if impact and impact.tests:
+        return impact.covered_lines(exclude)
+    if baseline_data_file and os.path.exists(baseline_data_file):
+        from coverage import CoverageData
+
+        data = CoverageData(basename=baseline_data_file)
+        data.read()
+        return {os.path.abspath(path): set(data.lines(path) or []) for path in data.measured_files()}
+    return {}
+
+def validate_inserted_tests(test_folder, test_ids, shards=None, test_timeout=None, source_folder=None,
+                            impact_dir=None, baseline_data_file=".coverage"):
+    """
+    Run only test_ids (e.g. the tests update_test_files just inserted) in
+    parallel workers, recording each test's coverage, and report which pass
+    and which source lines they cover that the rest of the suite did not (per
+    the test impact map in impact_dir, or else baseline_data_file).
+
+    Returns {"results": {test id: record with "new_lines"}, "passed", "failed",
+    "new_lines": {source path: lines newly covered by the passing tests}}.
+    """
+    topleveldir = os.path.abspath(test_folder)
+    source_folder = os.path.abspath(source_folder or os.path.join(os.path.dirname(topleveldir), "source_files"))
+    report = {"results": {}, "passed": 0, "failed": 0, "new_lines": {}}
+    if not test_ids:
+        return report
+    pool = get_worker_pool(source_folder)
+    run_folder = tempfile.mkdtemp(prefix="inserted_tests_")
+    try:
+        test_cases = [(test_id, test_module_of(test_id)) for test_id in dict.fromkeys(test_ids)]
+        run_test_shards(pool, topleveldir, shard_test_modules(test_cases, shards or TEST_SHARDS),
+                        lambda record: report["results"].__setitem__(record["test"], record), test_timeout,
+                        coverage_target=(os.path.join(run_folder, "tests"), source_folder))
+        measured = read_test_coverage(run_folder)
+    finally:
+        shutil.rmtree(run_folder, ignore_errors=True)
+
+    baseline = _baseline_lines(topleveldir, source_folder, set(test_ids), impact_dir, baseline_data_file)
+    for test_id, record in report["results"].items():
+        new_lines = {}
+        for path, arcs in measured.get(test_id, {}).items():
+            lines = executed_lines(arcs) - baseline.get(path, set())
+            if lines:
+                new_lines[path] = lines
+        record["new_lines"] = sum(len(lines) for lines in new_lines.values())
+        passed = record["status"] == "PASS"
+        report["passed" if passed else "failed"] += 1
+        print(f"{'✅' if passed else '❌'} {test_id}: {record['status']}, {record['new_lines']} new lines covered")
+        if passed:
+            for path, lines in new_lines.items():
+                report["new_lines"].setdefault(path, set()).update(lines)
+    report["new_lines"] = {path: sorted(lines) for path, lines in report["new_lines"].items()}
+    print(f"🧪 Inserted tests: {report['passed']} passed, {report['failed']} failed; the passing ones cover "
+          f"{sum(len(lines) for lines in report['new_lines'].values())} new lines in {len(report['new_lines'])} files")
+    return report
+
+def _collect_test_cases(test_or_suite, all_test_cases, verbose=True):
     """ Recursively collects test cases from a suite or individual test case. """
     if isinstance(test_or_suite, unittest.TestSuite):
         for test in test_or_suite:
-            _collect_test_cases(test, all_test_cases)  # Recursively process nested suites
+            _collect_test_cases(test, all_test_cases, verbose)  # Recursively process nested suites
     elif isinstance(test_or_suite, unittest.TestCase):
-        print(f"✔️ Collected test: {test_or_suite.id()}")  # Debugging statement
+        if verbose:
+            print(f"✔️ Collected test: {test_or_suite.id()}")  # Debugging statement
         all_test_cases.append(test_or_suite)  # Store test cases
 
-def add_test_result(results_list, test, result):
-    """ Helper function to format test results. """
-    test_id = test.id()
-    status = "PASS"
-    reason = None
+class TestResultWriter:
+    """
+    Appends test results to a JSON-lines file as they complete: a header line
+    ({"test_run_date", "tests", "slow_threshold"}), one line per test
+    ({"test", "status", "reason", "duration", "cpu_time", "slow"}) and a
+    closing {"summary": {"tests", "statuses", "modules"}} line. Each line is
+    flushed, so a crash keeps the results so far and readers can tail the file.
+    """
 
-    for failed_test, failure_reason in result.failures:
-        if failed_test.id() == test_id:
-            status = "FAIL"
-            reason = str(failure_reason)
-            break
+    def __init__(self, path, expected_tests, slow_threshold=None):
+        self.slow_threshold = slow_threshold or None
+        self.written = set()
+        self.statuses = {}
+        self.modules = {}
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+        self._write_line({"test_run_date": datetime.now().isoformat(), "tests": expected_tests,
+                          "slow_threshold": self.slow_threshold})
 
-    for error_test, error_reason in result.errors:
-        if error_test.id() == test_id:
-            status = "ERROR"
-            reason = str(error_reason)
-            break
+    def _write_line(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
 
-    results_list.append({"test": test_id, "status": status, "reason": reason})
+    def write(self, record):
+        record["slow"] = bool(self.slow_threshold) and record.get("duration", 0.0) > self.slow_threshold
+        with self._lock:
+            self.written.add(record["test"])
+            self.statuses[record["status"]] = self.statuses.get(record["status"], 0) + 1
+            _add_to_module_rollup(self.modules, record)
+            self._write_line(record)
 
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write_line({"summary": {"tests": len(self.written), "statuses": self.statuses,
+                                          "modules": sorted(self.modules.values(), key=lambda row: -row["duration"])}})
+            self._file.close()
 
-def generate_html_report(test_results, output_file):
+def iter_test_results(path):
     """
-    Generate a beautified HTML report with test results in a tabular format.
-    
-    :param test_results: List of test results.
+    Yield the test result records of a results file one at a time: the
+    JSON-lines files of TestResultWriter (also while they are being written)
+    and the older {"results": [...]} JSON files.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or "results" in header:
+            f.seek(0)
+            yield from json.load(f)["results"]
+            return
+        for line in f:
+            if not line.endswith("\n"):
+                return  # A line still being written
+            entry = json.loads(line)
+            if "test" in entry:
+                yield entry
+
+def read_new_test_results(path, offset=0):
+    """
+    Return (header, records, offset) for the complete lines of a JSON-lines
+    results file after offset, so a caller can tail the file while tests run.
+    header is only found when reading from the start.
+    """
+    header, records = None, []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            f.seek(offset)
+            for line in iter(f.readline, ""):
+                if not line.endswith("\n"):
+                    break
+                offset = f.tell()
+                entry = json.loads(line)
+                if "test" in entry:
+                    records.append(entry)
+                elif "test_run_date" in entry:
+                    header = entry
+    except OSError:
+        pass
+    return header, records, offset
+
+def test_module_of(test_id):
+    """Return the module of a test id (the failed module for import errors)."""
+    if test_id.startswith("unittest.loader._FailedTest."):
+        return test_id[len("unittest.loader._FailedTest."):]
+    return test_id.rsplit(".", 2)[0]
+
+def _add_to_module_rollup(modules, record):
+    module_name = test_module_of(record["test"])
+    row = modules.setdefault(module_name, {"module": module_name, "tests": 0, "failed": 0, "slow": 0,
+                                           "duration": 0.0, "cpu_time": 0.0})
+    row["tests"] += 1
+    row["failed"] += 1 if record["status"] != "PASS" else 0
+    row["slow"] += 1 if record.get("slow") else 0
+    row["duration"] = round(row["duration"] + record.get("duration", 0.0), 6)
+    row["cpu_time"] = round(row["cpu_time"] + record.get("cpu_time", 0.0), 6)
+
+def summarize_test_modules(test_results):
+    """Roll the test results up into one row per module, slowest module first."""
+    modules = {}
+    for record in test_results:
+        _add_to_module_rollup(modules, record)
+    return sorted(modules.values(), key=lambda row: -row["duration"])
+
+def _result_row(record):
+    """Render one test result as an HTML table row, its failure reason collapsed."""
+    reason = record.get("reason") or ""
+    if reason:
+        summary = html.escape(reason.strip().splitlines()[-1][:200]) if reason.strip() else ""
+        reason = f'<details><summary>{summary}</summary><pre class="reason">{html.escape(reason)}</pre></details>'
+    return (f'<tr class="{html.escape(record["status"].lower())}"><td>{html.escape(record["test"])}</td>'
+            f'<td>{html.escape(record["status"])}</td><td>{reason}</td>'
+            f'<td>{record.get("duration", 0.0):.3f}</td><td>{record.get("cpu_time", 0.0):.3f}</td>'
+            f'<td>{"yes" if record.get("slow") else ""}</td></tr>\n')
+
+def generate_html_report(test_results, output_file, slowest=SLOWEST_TESTS_SHOWN, slow_threshold=None,
+                         passing_rows=REPORT_PASSING_ROWS_PER_MODULE):
+    """
+    Generate an HTML report of the test results in one pass, grouped into a
+    collapsible section per module (modules with failures open), followed by
+    the slowest tests and the per-module timings.
+
+    Rows are written as plain HTML, so huge result sets render fast; memory
+    stays bounded because every non-passing test is listed but at most
+    passing_rows passing tests per module (0 lists them all).
+
+    :param test_results: Iterable of test results, e.g. iter_test_results(path).
     :param output_file: The file to store the HTML report.
+    :param slowest: Number of tests listed as the slowest.
+    :param slow_threshold: Seconds over which a test is flagged as slow, shown in the report.
+    :param passing_rows: Passing tests listed per module.
     """
-    # Create a DataFrame for easy HTML generation
-    df = pd.DataFrame(test_results)
-
-    # Add custom styles for pass/fail/error rows
-    def apply_status_color(row):
-        if row['status'] == 'PASS':
-            return ['background-color: #d4edda;' for _ in row]  # Green background for PASS
-        elif row['status'] == 'FAIL':
-            return ['background-color: #f8d7da;' for _ in row]  # Red background for FAIL
-        elif row['status'] == 'ERROR':
-            return ['background-color: #fff3cd;' for _ in row]  # Yellow background for ERROR
-        return []
-
-    # Applying custom colors
-    df_style = df.style.apply(apply_status_color, axis=1)
-
-    # Generate HTML content for the report using to_html() instead of render()
-    html_content = df_style.to_html()
-
-    # Add CSS to style the HTML report
-    html_template = f"""
-    <html>
-    <head>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 20px;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 20px;
-                text-align: left;
-            }}
-            th, td {{
-                padding: 12px;
-                border: 1px solid #ddd;
-            }}
-            th {{
-                background-color: #f4f4f4;
-            }}
-            tr:nth-child(even) {{
-                background-color: #f9f9f9;
-            }}
-            .reason {{
-                white-space: pre-wrap;
-                word-wrap: break-word;
-            }}
-        </style>
-    </head>
-    <body>
-        <h2>Unit Test Results</h2>
-        <p>Test run date: {datetime.now().isoformat()}</p>
-        {html_content}
-    </body>
-    </html>
-    """
-
-    # Save the HTML content to the output file
-    with open(output_file, "w") as f:
-        f.write(html_template)
+    modules = {}
+    rows = {}
+    statuses = {}
+    slowest_tests = []
+    for index, record in enumerate(test_results):
+        _add_to_module_rollup(modules, record)
+        module_rows = rows.setdefault(test_module_of(record["test"]), {"failed": [], "passed": []})
+        if record["status"] != "PASS":
+            module_rows["failed"].append((record["test"], _result_row(record)))
+        elif not passing_rows or len(module_rows["passed"]) < passing_rows:
+            module_rows["passed"].append((record["test"], _result_row(record)))
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        entry = (record.get("duration", 0.0), index, record)
+        if len(slowest_tests) < slowest:
+            heapq.heappush(slowest_tests, entry)
+        elif slowest_tests and entry[0] > slowest_tests[0][0]:
+            heapq.heapreplace(slowest_tests, entry)
+
+    header_row = ("<tr><th>Test</th><th>Status</th><th>Reason</th><th>Duration (s)</th>"
+                  "<th>CPU (s)</th><th>Slow</th></tr>\n")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(f"""<html>
+<head>
+<style>
+    body {{ font-family: Arial, sans-serif; margin: 20px; }}
+    table {{ width: 100%; border-collapse: collapse; margin-top: 10px; text-align: left; }}
+    th, td {{ padding: 8px; border: 1px solid #ddd; vertical-align: top; }}
+    th {{ background-color: #f4f4f4; }}
+    tr.pass {{ background-color: #d4edda; }}
+    tr.fail {{ background-color: #f8d7da; }}
+    tr.error {{ background-color: #fff3cd; }}
+    tr.timeout {{ background-color: #e2d9f3; }}
+    details.module {{ margin-top: 10px; }}
+    details.module > summary {{ font-weight: bold; cursor: pointer; }}
+    .reason {{ white-space: pre-wrap; word-wrap: break-word; }}
+</style>
+</head>
+<body>
+<h2>Unit Test Results</h2>
+<p>Test run date: {datetime.now().isoformat()}</p>
+<p>{html.escape(", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))}</p>
+""")
+        for module_name in sorted(rows):
+            module_rows, module = rows[module_name], modules[module_name]
+            hidden = module["tests"] - len(module_rows["failed"]) - len(module_rows["passed"])
+            f.write(f'<details class="module"{" open" if module["failed"] else ""}><summary>'
+                    f'{html.escape(module_name)}: {module["tests"]} tests, {module["failed"]} not passing, '
+                    f'{module["duration"]:.3f}s</summary>\n<table>\n{header_row}')
+            for _, row in sorted(module_rows["failed"]) + sorted(module_rows["passed"]):
+                f.write(row)
+            f.write("</table>\n")
+            if hidden:
+                f.write(f"<p>{hidden} more passing tests not listed.</p>\n")
+            f.write("</details>\n")
+
+        f.write(f"<h2>Slowest {slowest} Tests</h2>\n")
+        if slow_threshold:
+            f.write(f"<p>Tests over {slow_threshold}s are flagged as slow.</p>\n")
+        f.write(f"<table>\n{header_row}")
+        for _, _, record in sorted(slowest_tests, key=lambda entry: (-entry[0], entry[1])):
+            f.write(_result_row(record))
+        f.write("</table>\n<h2>Time per Module</h2>\n<table>\n<tr><th>Module</th><th>Tests</th><th>Failed</th>"
+                "<th>Slow</th><th>Duration (s)</th><th>CPU (s)</th></tr>\n")
+        for module in sorted(modules.values(), key=lambda row: -row["duration"]):
+            f.write(f'<tr><td>{html.escape(module["module"])}</td><td>{module["tests"]}</td><td>{module["failed"]}</td>'
+                    f'<td>{module["slow"]}</td><td>{module["duration"]:.3f}</td><td>{module["cpu_time"]:.3f}</td></tr>\n')
+        f.write("</table>\n</body>\n</html>\n")
 
     print(f"Test results stored in {output_file}")
 
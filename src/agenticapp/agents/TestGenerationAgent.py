@@ -1,15 +1,14 @@
-import autogen
 import os
 import logging
 import re
-from dotenv import load_dotenv
-from utils.chunking_utils import chunk_code
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.chunking_utils import chunk_code_ast, count_tokens, DEFAULT_CHUNK_TOKENS
 from agenticapp.utils.file_utils import list_files, read_file, write_file, create_init_files
-from template_prompts import get_prompt
+from agenticapp.utils import generation_manifest
+from agenticapp.agents.model_router import initial_tier, routed_reply
+from agenticapp.utils.output_validation import TEST_MODULE, TEST_BATCH, strip_code_fences
+from template_prompts import get_prompt, get_batch_prompt, BATCH_BEGIN_MARKER, BATCH_END_MARKER
 
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,55 +18,238 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Define AI Agent Configuration
-config_path = r"D:\Sai\EnhanceUnitTesting\src\agenticapp\OAI_CONFIG_LIST.json"
-config_list = autogen.config_list_from_json(config_path)
+# Number of source files whose tests are generated in parallel
+DEFAULT_MAX_WORKERS = 8
+# Files up to SMALL_FILE_TOKENS are batched into one request of at most BATCH_TOKEN_BUDGET tokens
+SMALL_FILE_TOKENS = 400
+BATCH_TOKEN_BUDGET = 3000
+BATCH_MAX_FILES = 6
 
-# Replace the placeholder with the actual API key from .env
-for config in config_list:
-    if "api_key" in config: 
-        config["api_key"] = api_key
-
-# Define Agents
-generation_agent = autogen.AssistantAgent(
-    name="TestGenerationAgent",
-    llm_config={"config_list": config_list, "temperature": 0},
-)
+# Agents are created on first use by the agent registry, one per model tier
+GENERATION_AGENT = "TestGenerationAgent"
 
 
 def clean_generated_code(test_code):
     patterns_to_remove = [r"TERMINATE"]
     for pattern in patterns_to_remove:
         test_code = re.sub(pattern, '', test_code, flags=re.MULTILINE)
-    return test_code.strip()
+    return strip_code_fences(test_code)
 
-def generate_tests(code_chunk, file_name,language="python",prompt_type="functionality", shot_type="few_shot"):
+def generate_tests(code_chunk, file_name,language="python",prompt_type="functionality", shot_type="few_shot", source_file=None):
     try:
         module_name = os.path.splitext(file_name)[0]
         prompt = get_prompt(code_chunk, module_name,language, "functionality", shot_type)
-        response = generation_agent.generate_oai_reply(messages=[{"role": "user", "content": prompt}])
-        response_content = response[1].strip() if isinstance(response, tuple) else response.strip()
+        # Small chunks go to the small model first and escalate when the reply is not a valid test module
+        response_content, _ = routed_reply(GENERATION_AGENT, [{"role": "user", "content": prompt}], TEST_MODULE,
+                                           start_tier=initial_tier(code_chunk), stage="generation",
+                                           source_file=source_file or file_name)
         return clean_generated_code(response_content)
     except Exception as e:
         logger.error(f"Error generating tests: {e}")
         return ""
 
 
+def get_test_subfolder(file_path, output_folder):
+    """Create and return the test folder mirroring the source file's location."""
+    source_folder = "source_files"
+    relative_path = os.path.relpath(file_path, source_folder)
+    test_subfolder = os.path.join(output_folder, os.path.dirname(relative_path))
+    os.makedirs(test_subfolder, exist_ok=True)
+    create_init_files(test_subfolder)
+    return test_subfolder
+
+
 def process_file(file_path, output_folder="tests", language="python", shot_type="few_shot"):
+    """Generate test modules for every chunk of a source file and return the written paths."""
     try:
         code = read_file(file_path)
-        code_chunks = chunk_code(code, max_chunk_size=512)
-        source_folder = "source_files"
-        relative_path = os.path.relpath(file_path, source_folder)
+        code_chunks = chunk_code_ast(code, max_tokens=DEFAULT_CHUNK_TOKENS)
         base_name = os.path.splitext(os.path.basename(file_path))[0]
-        test_subfolder = os.path.join(output_folder, os.path.dirname(relative_path))
-        os.makedirs(test_subfolder, exist_ok=True)
-        create_init_files(test_subfolder)
-        
+        test_subfolder = get_test_subfolder(file_path, output_folder)
+
+        generated_files = []
+        failed_chunks = []
         for i, chunk in enumerate(code_chunks):
             output_file = os.path.join(test_subfolder, f"test_{base_name}_{i}.py")
-            test_code = generate_tests(chunk, f"{base_name}.py",language, shot_type)
+            test_code = generate_tests(chunk, f"{base_name}.py",language, shot_type, source_file=file_path)
+            if not test_code:
+                failed_chunks.append(i)
+                continue
             write_file(output_file, test_code)
-            
+            generated_files.append(output_file)
+
+        if failed_chunks:
+            raise RuntimeError(f"No tests generated for chunk(s) {failed_chunks} of {len(code_chunks)}")
+        return generated_files
+
     except Exception as e:
         logger.error(f"Error processing file {file_path}: {e}")
+        raise
+
+
+def split_batch_response(response, module_names):
+    """Split a batched generation response into {module_name: test_code}."""
+    test_files = {}
+    for module_name in module_names:
+        pattern = (
+            re.escape(BATCH_BEGIN_MARKER.format(module_name=module_name))
+            + r"\s*\n(.*?)\n\s*"
+            + re.escape(BATCH_END_MARKER.format(module_name=module_name))
+        )
+        match = re.search(pattern, response, re.DOTALL)
+        if match and match.group(1).strip():
+            test_files[module_name] = clean_generated_code(match.group(1))
+    return test_files
+
+
+def process_batch(file_paths, output_folder="tests", language="python", shot_type="few_shot"):
+    """
+    Generate tests for several small source files with a single request.
+
+    Each file gets its usual test_<base>_0.py. Files missing from the response
+    are retried individually with process_file.
+
+    Returns a tuple (generated, errors) like process_files.
+    """
+    modules = [(os.path.splitext(os.path.basename(p))[0], read_file(p)) for p in file_paths]
+    try:
+        prompt = get_batch_prompt(modules, language, shot_type)
+        response, _ = routed_reply(GENERATION_AGENT, [{"role": "user", "content": prompt}], TEST_BATCH,
+                                   start_tier=initial_tier("".join(code for _, code in modules)),
+                                   stage="generation", source_file=", ".join(file_paths))
+        test_files = split_batch_response(response, [module_name for module_name, _ in modules])
+    except Exception as e:
+        logger.error(f"Error generating batched tests for {file_paths}: {e}")
+        test_files = {}
+
+    generated, errors = {}, {}
+    for file_path, (module_name, _) in zip(file_paths, modules):
+        try:
+            if module_name in test_files:
+                output_file = os.path.join(get_test_subfolder(file_path, output_folder), f"test_{module_name}_0.py")
+                write_file(output_file, test_files[module_name])
+                generated[file_path] = [output_file]
+            else:
+                logger.warning(f"Batched response had no tests for {file_path}, generating it alone")
+                generated[file_path] = process_file(file_path, output_folder, language, shot_type)
+        except Exception as e:
+            errors[file_path] = str(e)
+    return generated, errors
+
+
+def plan_batches(file_paths, max_file_tokens=SMALL_FILE_TOKENS, max_batch_tokens=BATCH_TOKEN_BUDGET,
+                 max_files=BATCH_MAX_FILES):
+    """
+    Split file_paths into batches of small files and files processed alone.
+
+    Returns (batches, single_files). A batch never holds two modules with the
+    same base name, since the response is split by module name.
+    """
+    batches, single_files = [], []
+    current, current_names, current_tokens = [], set(), 0
+    for file_path in file_paths:
+        module_name = os.path.splitext(os.path.basename(file_path))[0]
+        tokens = count_tokens(read_file(file_path))
+        if tokens == 0 or tokens > max_file_tokens:  # Empty files need no request at all
+            single_files.append(file_path)
+            continue
+        if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_files
+                        or module_name in current_names):
+            batches.append(current)
+            current, current_names, current_tokens = [], set(), 0
+        current.append(file_path)
+        current_names.add(module_name)
+        current_tokens += tokens
+    if len(current) > 1:
+        batches.append(current)
+    else:
+        single_files.extend(current)
+    return batches, single_files
+
+
+def process_files(file_paths, output_folder="tests", language="python", shot_type="few_shot",
+                  max_workers=DEFAULT_MAX_WORKERS, batch_small_files=True):
+    """
+    Generate tests for several source files concurrently.
+
+    Each file is handled by process_file on a bounded thread pool, so the
+    network wait of one LLM call overlaps with the others. With
+    batch_small_files=True, small files are grouped and sent with one request
+    per group through process_batch.
+
+    Returns a tuple (generated, errors): generated maps each successful file to
+    the test files written for it, errors maps each failed file to its error.
+    """
+    generated, errors = {}, {}
+    if not file_paths:
+        return generated, errors
+
+    batches, single_files = plan_batches(file_paths) if batch_small_files else ([], list(file_paths))
+    tasks = len(batches) + len(single_files)
+    workers = max(1, min(max_workers, tasks))
+    logger.info(f"Generating tests for {len(file_paths)} files in {tasks} requests "
+                f"({len(batches)} batches) with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="TestGeneration") as executor:
+        futures = {
+            executor.submit(process_file, file_path, output_folder, language, shot_type): [file_path]
+            for file_path in single_files
+        }
+        futures.update({
+            executor.submit(process_batch, batch, output_folder, language, shot_type): batch
+            for batch in batches
+        })
+        for future in as_completed(futures):
+            paths = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                errors[paths[0]] = str(e)
+                continue
+            if isinstance(result, tuple):
+                generated.update(result[0])
+                errors.update(result[1])
+            else:
+                generated[paths[0]] = result
+
+    return generated, errors
+
+
+def list_source_files(source_folder):
+    """Return the Python source files under source_folder, without package __init__ files."""
+    file_paths = []
+    for root, _, files in os.walk(source_folder):
+        for file in files:
+            if file.endswith(".py") and file != "__init__.py":
+                file_paths.append(os.path.join(root, file))
+    return file_paths
+
+
+def generate_folder_tests(source_folder, test_folder, manifest_path, language="python", shot_type="few_shot",
+                          max_workers=DEFAULT_MAX_WORKERS, incremental=True):
+    """
+    Generate tests for every source file in source_folder.
+
+    With incremental=True, files whose content hash matches the generation
+    manifest are skipped. Tests of deleted source files are pruned either way.
+    Returns (file_paths, changed, generated, errors).
+    """
+    file_paths = list_source_files(source_folder)
+    settings = {"language": language, "shot_type": shot_type}
+    manifest = generation_manifest.load_manifest(manifest_path, settings)
+    changed, hashes, deleted = generation_manifest.plan_generation(manifest, source_folder, file_paths, test_folder,
+                                                                   incremental=incremental)
+    generation_manifest.prune_tests(manifest, deleted, test_folder)
+    for key in deleted:
+        del manifest["files"][key]
+    logger.info(f"{len(changed)} of {len(file_paths)} source files changed, {len(deleted)} deleted")
+    for file_path in changed:
+        logger.info(f"Processing file: {file_path}")
+
+    generated, errors = process_files(changed, output_folder=test_folder, language=language,
+                                      shot_type=shot_type, max_workers=max_workers)
+    for file_path, test_files in generated.items():
+        generation_manifest.record_generated(manifest, file_path, source_folder, hashes[file_path],
+                                             test_files, test_folder)
+    generation_manifest.save_manifest(manifest_path, manifest)
+    logger.info(f"Generated tests for {len(generated)} of {len(changed)} changed files")
+    return file_paths, changed, generated, errors
@@ -0,0 +1,64 @@
+import copy
+import os
+import threading
+from functools import lru_cache
+
+from agenticapp.utils.llm_utils import apply_endpoint_override
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Model configurations shipped with the app; OAI_CONFIG_PATH overrides the default one
+DEFAULT_CONFIG_PATH = os.getenv("OAI_CONFIG_PATH", os.path.join(PACKAGE_DIR, "OAI_CONFIG_LIST.json"))
+API_KEY_PLACEHOLDER = "ENV_OPENAI_API_KEY"
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_config_list(config_path):
+    from autogen import config_list_from_json
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"LLM config file not found: {config_path} (set OAI_CONFIG_PATH)")
+    config_list = config_list_from_json(config_path)
+    # Replace the placeholder with the actual API key from .env
+    for config in config_list:
+        if config.get("api_key") == API_KEY_PLACEHOLDER:
+            config["api_key"] = os.getenv("OPENAI_API_KEY")
+        # 429s and transient errors are retried by the shared rate limiter, not by each client
+        config.setdefault("max_retries", 0)
+    return apply_endpoint_override(config_list)
+
+
+def get_config_list(config_path=None):
+    """Return the model config list, parsed once per file and copied for the caller."""
+    return copy.deepcopy(_load_config_list(os.path.abspath(config_path or DEFAULT_CONFIG_PATH)))
+
+
+def get_agent(name, config_path=None, temperature=0):
+    """
+    Return the AssistantAgent called name, creating it on first use.
+
+    Agents are shared by every caller in the process; nothing is parsed or
+    constructed until an agent is first needed. Agents sampling at a non-zero
+    temperature skip autogen's response cache so repeated requests differ.
+    """
+    key = (name, os.path.abspath(config_path or DEFAULT_CONFIG_PATH), temperature)
+    with _agents_lock:
+        if key not in _agents:
+            from autogen import AssistantAgent
+
+            llm_config = {"config_list": get_config_list(config_path), "temperature": temperature}
+            if temperature:
+                llm_config["cache_seed"] = None
+            _agents[key] = AssistantAgent(name=name, llm_config=llm_config)
+        return _agents[key]
+
+
+def reset_registry():
+    """Forget the loaded configs and agents, e.g. after the config file changed."""
+    with _agents_lock:
+        _agents.clear()
+        _load_config_list.cache_clear()
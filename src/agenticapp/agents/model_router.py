@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import threading
+
+from agenticapp.agents.agent_registry import PACKAGE_DIR, get_agent
+from agenticapp.utils.chunking_utils import count_tokens
+from agenticapp.utils.llm_utils import generate_reply
+from agenticapp.utils.output_validation import FORMAT_VALIDATORS, strip_code_fences
+
+logger = logging.getLogger(__name__)
+
+# Model tiers, cheapest first. The shipped OAI_CONFIG_LIST.json holds gpt-4o-mini
+# and COVERAGE_CONFIG_LIST.json gpt-4o; MODEL_SMALL_CONFIG_PATH/MODEL_LARGE_CONFIG_PATH override them.
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+TIERS = [SMALL_TIER, LARGE_TIER]
+TIER_CONFIG_PATHS = {
+    SMALL_TIER: os.getenv("MODEL_SMALL_CONFIG_PATH", os.path.join(PACKAGE_DIR, "OAI_CONFIG_LIST.json")),
+    LARGE_TIER: os.getenv("MODEL_LARGE_CONFIG_PATH", os.path.join(PACKAGE_DIR, "COVERAGE_CONFIG_LIST.json")),
+}
+# Set MODEL_ROUTING=0 to send everything to the large tier
+ROUTING_ENABLED = os.getenv("MODEL_ROUTING", "1").lower() not in ("0", "false", "no")
+
+# Work up to these sizes starts on the small tier; tune them with the recorded success rates
+SMALL_TIER_MAX_TOKENS = int(os.getenv("SMALL_TIER_MAX_TOKENS", "800"))
+SMALL_TIER_MAX_ASSERTIONS = 1
+
+DEFAULT_TIER_STATS_PATH = os.getenv("MODEL_TIER_STATS_PATH", os.path.join(".cache", "model_tier_stats.json"))
+
+_stats_lock = threading.Lock()
+
+
+def configure_routing(enabled=None, small_max_tokens=None):
+    """Turn tiered routing on or off and adjust the small tier size threshold."""
+    global ROUTING_ENABLED, SMALL_TIER_MAX_TOKENS
+    if enabled is not None:
+        ROUTING_ENABLED = enabled
+    if small_max_tokens is not None:
+        SMALL_TIER_MAX_TOKENS = small_max_tokens
+
+
+def initial_tier(text, assertions=None):
+    """
+    Pick the tier to try first: the small tier for work of at most
+    SMALL_TIER_MAX_TOKENS tokens (and, for test fixes, at most one assertion).
+    """
+    if not ROUTING_ENABLED:
+        return LARGE_TIER
+    if count_tokens(text) > SMALL_TIER_MAX_TOKENS:
+        return LARGE_TIER
+    if assertions is not None and assertions > SMALL_TIER_MAX_ASSERTIONS:
+        return LARGE_TIER
+    return SMALL_TIER
+
+
+def tiers_from(tier):
+    """Return tier and the tiers it can escalate to."""
+    return TIERS[TIERS.index(tier):]
+
+
+def get_tier_agent(agent_name, tier):
+    """Return agent_name configured with the model of tier."""
+    return get_agent(agent_name, TIER_CONFIG_PATHS[tier])
+
+
+def record_tier_result(stage, tier, success, stats_path=None):
+    """Count one attempt (and whether it succeeded) of a tier for a stage."""
+    stats_path = stats_path or DEFAULT_TIER_STATS_PATH
+    with _stats_lock:
+        stats = load_tier_stats(stats_path)
+        entry = stats.setdefault(stage, {}).setdefault(tier, {"attempts": 0, "successes": 0})
+        entry["attempts"] += 1
+        entry["successes"] += 1 if success else 0
+        try:
+            os.makedirs(os.path.dirname(stats_path) or ".", exist_ok=True)
+            tmp_path = f"{stats_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stats, f, indent=2)
+            os.replace(tmp_path, stats_path)
+        except OSError as e:
+            logger.warning(f"Could not write model tier stats to {stats_path}: {e}")
+
+
+def load_tier_stats(stats_path=None):
+    """Return {stage: {tier: {"attempts", "successes"}}} from the stats file."""
+    stats_path = stats_path or DEFAULT_TIER_STATS_PATH
+    try:
+        with open(stats_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def tier_success_rates(stats_path=None):
+    """Return one row per stage and tier with its attempts and success rate."""
+    rows = []
+    for stage, tiers in load_tier_stats(stats_path).items():
+        for tier, entry in tiers.items():
+            attempts = entry.get("attempts", 0)
+            rows.append({"stage": stage, "tier": tier, "attempts": attempts,
+                         "success_rate": round(entry.get("successes", 0) / attempts, 3) if attempts else 0.0})
+    return rows
+
+
+def routed_reply(agent_name, messages, output_format, start_tier=SMALL_TIER, stage=None, source_file=None,
+                 accept=None):
+    """
+    Ask agent_name for a reply, starting on start_tier and escalating to the
+    next tier while the reply fails validation against output_format (or
+    accept(reply) returns False). Markdown fences are stripped first, as the
+    insertion path would strip them anyway.
+
+    Returns (reply, tier); the last tier's reply is returned even if it failed.
+    """
+    validator = FORMAT_VALIDATORS.get(output_format)
+    reply, tier = "", start_tier
+    for tier in tiers_from(start_tier):
+        reply = strip_code_fences(generate_reply(get_tier_agent(agent_name, tier), messages,
+                                                 output_format=output_format, stage=stage, source_file=source_file))
+        reason = validator(reply, final=True) if validator else None
+        if reason is None and accept is not None and not accept(reply):
+            reason = "reply rejected by the caller"
+        record_tier_result(stage or agent_name, tier, reason is None)
+        if reason is None:
+            return reply, tier
+        if tier != LARGE_TIER:
+            logger.info(f"{agent_name}: escalating from the {tier} tier ({reason})")
+    return reply, tier
@@ -0,0 +1,144 @@
+import ast
+import logging
+import os
+import re
+import subprocess
+import textwrap
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agenticapp.agents.agent_registry import get_agent
+from agenticapp.agents.CoverageAgent import update_test_files
+from agenticapp.agents.TestExecutionAgent import start_test_process
+from agenticapp.utils.llm_utils import generate_reply
+from agenticapp.utils.output_validation import TEST_METHODS, validate_test_methods
+
+logger = logging.getLogger(__name__)
+
+# Candidates requested per prompt in speculative mode; 0 or 1 keeps the single-reply path
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "0"))
+# Sampling temperature that makes the candidates differ
+SPECULATIVE_TEMPERATURE = 0.7
+CANDIDATE_TEST_TIMEOUT = 120
+
+TEST_CASE_CLASS = re.compile(r"^\s*class\s+(\w+)\(unittest\.TestCase\):", re.MULTILINE)
+
+
+def configure_speculation(candidates):
+    """Set how many candidates speculative mode requests (0 turns it off)."""
+    global SPECULATIVE_CANDIDATES
+    SPECULATIVE_CANDIDATES = candidates
+
+
+def speculation_enabled(candidates=None):
+    return (SPECULATIVE_CANDIDATES if candidates is None else candidates) > 1
+
+
+def candidate_test_names(code):
+    """Return the names of the test methods defined in candidate code."""
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        return []
+    return [node.name for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")]
+
+
+def module_id(path, test_root):
+    """Return the dotted module name of a test file relative to test_root."""
+    return os.path.splitext(os.path.relpath(path, test_root))[0].replace(os.sep, ".")
+
+
+class _Speculation:
+    """Shared state of one speculative run: the stop flag and the test processes to kill."""
+
+    def __init__(self):
+        self.stop = threading.Event()
+        self.processes = []
+        self.lock = threading.Lock()
+
+    def register(self, process):
+        with self.lock:
+            if self.stop.is_set():
+                process.kill()
+            self.processes.append(process)
+
+    def cancel(self):
+        with self.lock:
+            self.stop.set()
+            for process in self.processes:
+                if process.poll() is None:
+                    process.kill()
+
+
+def _try_candidate(index, speculation, agent, messages, test_file, base_content, test_root, stage, source_file):
+    """Request one candidate, parse it and run its tests in a sibling copy of the test file."""
+    code = generate_reply(agent, messages, output_format=TEST_METHODS, stage=stage, source_file=source_file)
+    if speculation.stop.is_set():
+        return index, code, False
+    reason = validate_test_methods(code, final=True)
+    names = candidate_test_names(code)
+    class_match = TEST_CASE_CLASS.search(base_content)
+    if reason or not names or not class_match:
+        logger.info(f"Candidate {index} rejected: {reason or 'no test methods or test class'}")
+        return index, code, False
+
+    # Not matching test_*.py keeps the candidate out of concurrent test discovery
+    directory, file_name = os.path.split(test_file)
+    candidate_file = os.path.join(directory, f"_candidate{index}_{os.getpid()}_{file_name}")
+    try:
+        with open(candidate_file, "w", encoding="utf-8") as f:
+            f.write(base_content)
+        update_test_files(candidate_file, code, record=False)
+        test_ids = [f"{module_id(candidate_file, test_root)}.{class_match.group(1)}.{name}" for name in names]
+        process = start_test_process(test_ids, test_root)
+        speculation.register(process)
+        try:
+            process.communicate(timeout=CANDIDATE_TEST_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+        return index, code, process.returncode == 0 and not speculation.stop.is_set()
+    finally:
+        if os.path.exists(candidate_file):
+            os.remove(candidate_file)
+
+
+def speculate_test_methods(agent_name, messages, test_file, base_content, candidates=None, config_path=None,
+                           test_root="tests", stage=None, source_file=None):
+    """
+    Request several candidate test methods for one prompt concurrently and
+    run each candidate's tests, inserted into a copy of base_content next to
+    test_file, as soon as it arrives.
+
+    The first candidate whose tests pass wins and the remaining requests and
+    test runs are cancelled. Returns (code, passed); when no candidate passes,
+    the first well-formed one is returned with passed=False.
+    """
+    candidates = candidates or SPECULATIVE_CANDIDATES
+    agent = get_agent(agent_name, config_path, temperature=SPECULATIVE_TEMPERATURE)
+    speculation = _Speculation()
+    fallback = None
+    executor = ThreadPoolExecutor(max_workers=candidates)
+    try:
+        futures = [
+            executor.submit(_try_candidate, index, speculation, agent, messages, test_file, base_content,
+                            test_root, stage, source_file)
+            for index in range(candidates)
+        ]
+        for future in as_completed(futures):
+            try:
+                index, code, passed = future.result()
+            except Exception as e:
+                logger.warning(f"Speculative candidate failed: {e}")
+                continue
+            if passed:
+                logger.info(f"Candidate {index} of {candidates} passed; cancelling the others")
+                return code, True
+            if fallback is None and candidate_test_names(code):
+                fallback = code
+        return fallback, False
+    finally:
+        speculation.cancel()
+        # Requests already sent finish in the background; their replies are discarded
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,267 @@
+"""
+Headless pipeline runner: generate -> execute -> coverage -> improve -> fix -> mutation.
+
+Runs the same stages as the Streamlit app against a source tree, without a UI,
+so the pipeline can run unattended on build agents. The output directory gets
+the app's project layout (source_files/<app>, tests/<app>, reports, .cache,
+metrics), so several repositories can be processed in parallel with one
+output directory each.
+
+Example:
+    python src/agenticapp/cli.py path/to/SampleApp --output-dir out/SampleApp \
+        --stages generate,execute,coverage,improve,fix --workers 8 --min-coverage 80
+
+Exit codes: 0 success, 1 a stage failed, 3 coverage below --min-coverage,
+4 mutation score below --min-mutation-score.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# The agents import both `agenticapp.*` and modules relative to the package directory
+PACKAGE_DIR = str(Path(__file__).resolve().parent)
+SRC_DIR = str(Path(PACKAGE_DIR).parent)
+for path in (PACKAGE_DIR, SRC_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+logger = logging.getLogger("agenticapp.cli")
+
+STAGES = ["generate", "execute", "coverage", "improve", "fix", "mutation"]
+
+EXIT_OK = 0
+EXIT_STAGE_FAILED = 1
+EXIT_COVERAGE_BELOW_THRESHOLD = 3
+EXIT_MUTATION_BELOW_THRESHOLD = 4
+
+# File names inside the output directory, matching the Streamlit app
+SOURCE_FOLDER = "source_files"
+TEST_FOLDER = "tests"
+CACHE_FOLDER = ".cache"
+METRICS_FOLDER = "metrics"
+IMPACT_FOLDER = os.path.join(CACHE_FOLDER, "impact")
+RESULTS_JSON, RESULTS_HTML = "results.jsonl", "results.html"
+IMPROVED_RESULTS_JSON, IMPROVED_RESULTS_HTML = "improved_testcaseresults.jsonl", "improved_testcaseresults.html"
+FIXED_RESULTS_JSON, FIXED_RESULTS_HTML = "fixed_testcaseresults.jsonl", "fixed_testcaseresults.html"
+COVERAGE_REPORT = "coverage_report.txt"
+IMPROVED_COVERAGE_REPORT = "coverage_report1.txt"
+FIXED_COVERAGE_REPORT = "coverage_report2.txt"
+SUMMARY_FILE = "pipeline_summary.json"
+
+
+def parse_stages(value):
+    """Parse a comma separated stage list ("all" for every stage) into pipeline order."""
+    if value == "all":
+        return list(STAGES)
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stage(s) {', '.join(unknown)}; choose from {', '.join(STAGES)}")
+    return [stage for stage in STAGES if stage in stages]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the unit test enhancement pipeline without the Streamlit UI")
+    parser.add_argument("source", help="Folder with the Python sources to generate tests for")
+    parser.add_argument("--output-dir", default="autef_output",
+                        help="Project folder for sources, tests, reports and caches (default: %(default)s)")
+    parser.add_argument("--app-name", help="Package name of the sources in the output folder "
+                                           "(default: the source folder name)")
+    parser.add_argument("--stages", type=parse_stages, default=list(STAGES),
+                        help=f"Comma separated stages to run, or 'all' (default): {','.join(STAGES)}")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("GENERATION_MAX_WORKERS", "8")),
+                        help="Source files whose tests are generated in parallel (default: %(default)s)")
+    parser.add_argument("--shards", type=int,
+                        help="Processes the test modules are sharded across when running tests "
+                             "(default: TEST_SHARDS or the CPU count)")
+    parser.add_argument("--slow-test-seconds", type=float,
+                        help="Flag tests running longer than this in the results (default: SLOW_TEST_SECONDS)")
+    parser.add_argument("--test-timeout", type=float,
+                        help="Seconds after which a hanging test is killed and recorded as TIMEOUT "
+                             "(default: TEST_TIMEOUT_SECONDS)")
+    parser.add_argument("--module-timeout", type=float,
+                        help="Seconds after which the rest of a test module is recorded as TIMEOUT "
+                             "(default: MODULE_TIMEOUT_SECONDS)")
+    parser.add_argument("--full", action="store_true",
+                        help="Regenerate tests for every file and run every test, instead of only "
+                             "the changed files and the tests they affect")
+    parser.add_argument("--min-coverage", type=float,
+                        help="Exit with code 3 when the final total coverage is below this percentage")
+    parser.add_argument("--min-mutation-score", type=float,
+                        help="Exit with code 4 when the final mutation score is below this percentage")
+    parser.add_argument("--candidates", type=int, default=0,
+                        help="Speculative candidates requested per fix or coverage gap; the first passing one wins")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Do not serve replies from the LLM reply cache")
+    parser.add_argument("--run-id", help="Run id of the LLM metrics (default: a timestamp)")
+    return parser
+
+
+def summarize_validation(report):
+    """Condense a report of the inserted tests' run into the pipeline summary."""
+    if not report:
+        return None
+    return {"passed": report["passed"], "failed": report["failed"],
+            "failed_tests": [test_id for test_id, record in report["results"].items() if record["status"] != "PASS"],
+            "new_lines": sum(len(lines) for lines in report["new_lines"].values())}
+
+
+def copy_sources(source, target):
+    """Replace target with a copy of source so deleted files are noticed by incremental generation."""
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.copytree(source, target, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+
+
+def run_pipeline(args):
+    """Run the selected stages inside args.output_dir and return (exit code, summary)."""
+    from agenticapp.agents.TestGenerationAgent import generate_folder_tests
+    from agenticapp.agents.TestExecutionAgent import discover_and_run_tests
+    from agenticapp.agents.CoverageAgent import (
+        start_coverage, measure_coverage, measure_coverage_with_cli, generate_and_update_tests, read_total_coverage
+    )
+    from agenticapp.agents.AutoFixingAgent import fix_failing_tests
+    from agenticapp.agents.MutationTestAgent import get_mutation_coverage, run_mutation_tests
+    from agenticapp.utils.llm_cache import configure_reply_cache
+    from agenticapp.utils.telemetry import configure_run_metrics, summarize_metrics
+    from agenticapp.agents.model_router import tier_success_rates
+    from agenticapp.utils.rate_limiter import rate_limit_stats
+    from agenticapp.agents.speculative import configure_speculation
+
+    source = os.path.abspath(args.source)
+    app_name = args.app_name or os.path.basename(os.path.normpath(source))
+    project_root = os.path.abspath(args.output_dir)
+    os.makedirs(project_root, exist_ok=True)
+    # The agents resolve "tests", "source_files" and ".coverage" against the working directory
+    os.chdir(project_root)
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+    source_folder = os.path.join(project_root, SOURCE_FOLDER)
+    test_folder = os.path.join(project_root, TEST_FOLDER)
+    app_source_folder = os.path.join(source_folder, app_name)
+    app_test_folder = os.path.join(test_folder, app_name)
+    for directory in (source_folder, app_test_folder, CACHE_FOLDER):
+        os.makedirs(directory, exist_ok=True)
+    copy_sources(source, app_source_folder)
+
+    if args.full:
+        shutil.rmtree(IMPACT_FOLDER, ignore_errors=True)
+    configure_reply_cache(os.path.join(project_root, CACHE_FOLDER), enabled=not args.no_llm_cache)
+    metrics = configure_run_metrics(os.path.join(project_root, METRICS_FOLDER), args.run_id)
+    start_coverage()
+    if args.candidates:
+        configure_speculation(args.candidates)
+
+    run_options = {"shards": args.shards, "slow_threshold": args.slow_test_seconds,
+                   "test_timeout": args.test_timeout, "module_timeout": args.module_timeout,
+                   "impact_dir": IMPACT_FOLDER}
+    target_module = f"{SOURCE_FOLDER}.{app_name}"
+    test_module = f"{TEST_FOLDER}.{app_name}"
+    coverage_report = None
+    summary = {"source": source, "output_dir": project_root, "app_name": app_name,
+               "run_id": metrics.run_id, "stages": {}}
+
+    def generate():
+        file_paths, changed, generated, errors = generate_folder_tests(
+            source_folder, test_folder, os.path.join(CACHE_FOLDER, "generation_manifest.json"),
+            max_workers=args.workers, incremental=not args.full)
+        for file_path, error in errors.items():
+            logger.warning(f"Test generation failed for {os.path.relpath(file_path, source_folder)}: {error}")
+        return {"source_files": len(file_paths), "changed": len(changed), "generated": len(generated),
+                "errors": {os.path.relpath(path, source_folder): error for path, error in errors.items()}}
+
+    def execute():
+        discover_and_run_tests(test_folder, RESULTS_JSON, RESULTS_HTML, **run_options)
+        return {"results": RESULTS_JSON}
+
+    def measure():
+        measure_coverage(test_folder, COVERAGE_REPORT)
+        return {"report": COVERAGE_REPORT, "total_coverage": read_total_coverage(COVERAGE_REPORT)}
+
+    def improve():
+        validation = generate_and_update_tests(COVERAGE_REPORT, test_folder, impact_dir=IMPACT_FOLDER)
+        discover_and_run_tests(test_folder, IMPROVED_RESULTS_JSON, IMPROVED_RESULTS_HTML, **run_options)
+        measure_coverage_with_cli(test_folder, IMPROVED_COVERAGE_REPORT, impact_dir=IMPACT_FOLDER)
+        return {"report": IMPROVED_COVERAGE_REPORT, "total_coverage": read_total_coverage(IMPROVED_COVERAGE_REPORT),
+                "inserted_tests": summarize_validation(validation)}
+
+    def fix():
+        fix_failing_tests(IMPROVED_RESULTS_JSON if os.path.exists(IMPROVED_RESULTS_JSON) else RESULTS_JSON)
+        discover_and_run_tests(test_folder, FIXED_RESULTS_JSON, FIXED_RESULTS_HTML, **run_options)
+        measure_coverage_with_cli(test_folder, FIXED_COVERAGE_REPORT, impact_dir=IMPACT_FOLDER)
+        return {"report": FIXED_COVERAGE_REPORT, "total_coverage": read_total_coverage(FIXED_COVERAGE_REPORT)}
+
+    def mutation():
+        score_before, stats_before = get_mutation_coverage(project_root, target_module, test_module, "before")
+        validation = run_mutation_tests(app_test_folder, app_source_folder, test_folder, impact_dir=IMPACT_FOLDER)
+        score_after, stats_after = get_mutation_coverage(project_root, target_module, test_module, "after")
+        return {"score_before": score_before, "score_after": score_after,
+                "stats_before": stats_before, "stats_after": stats_after,
+                "inserted_tests": summarize_validation(validation)}
+
+    stage_functions = {"generate": generate, "execute": execute, "coverage": measure,
+                       "improve": improve, "fix": fix, "mutation": mutation}
+    exit_code = EXIT_OK
+    for stage in args.stages:
+        print(f"▶️ Stage {stage}")
+        started = time.perf_counter()
+        try:
+            result = stage_functions[stage]()
+        except Exception as e:
+            logger.exception(f"Stage {stage} failed")
+            summary["stages"][stage] = {"error": str(e), "seconds": round(time.perf_counter() - started, 2)}
+            exit_code = EXIT_STAGE_FAILED
+            break
+        result["seconds"] = round(time.perf_counter() - started, 2)
+        summary["stages"][stage] = result
+        if result.get("report"):
+            coverage_report = result["report"]
+        print(f"✅ Stage {stage} finished in {result['seconds']}s")
+
+    # Thresholds apply to the latest coverage report of this or an earlier run
+    for report in (FIXED_COVERAGE_REPORT, IMPROVED_COVERAGE_REPORT, COVERAGE_REPORT):
+        if coverage_report is None and os.path.exists(report):
+            coverage_report = report
+    total_coverage = read_total_coverage(coverage_report) if coverage_report else None
+    mutation_score = summary["stages"].get("mutation", {}).get("score_after")
+    summary["total_coverage"] = total_coverage
+    summary["mutation_score"] = mutation_score
+    summary["llm_usage"] = summarize_metrics(metrics.path)
+    summary["model_tiers"] = tier_success_rates()
+    summary["rate_limits"] = rate_limit_stats()
+
+    if exit_code == EXIT_OK and args.min_coverage is not None:
+        if total_coverage is None or total_coverage < args.min_coverage:
+            print(f"❌ Total coverage {total_coverage}% is below the required {args.min_coverage}%")
+            exit_code = EXIT_COVERAGE_BELOW_THRESHOLD
+    if exit_code == EXIT_OK and args.min_mutation_score is not None:
+        if mutation_score is None or mutation_score < args.min_mutation_score:
+            print(f"❌ Mutation score {mutation_score}% is below the required {args.min_mutation_score}%")
+            exit_code = EXIT_MUTATION_BELOW_THRESHOLD
+    summary["exit_code"] = exit_code
+    return exit_code, summary
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if not os.path.isdir(args.source):
+        print(f"❌ Source folder not found: {args.source}")
+        return EXIT_STAGE_FAILED
+
+    exit_code, summary = run_pipeline(args)
+    with open(SUMMARY_FILE, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=str)
+    print(f"📋 Pipeline summary written to {os.path.abspath(SUMMARY_FILE)}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
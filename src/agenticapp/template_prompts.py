@@ -1,4 +1,15 @@
+from functools import lru_cache
+
 # Function to generate prompt for creating unit tests
+# Prompts put their static instructions first and the variable input after
+# PAYLOAD_MARKER, so requests share a long identical prefix for provider-side caching.
+PAYLOAD_MARKER = "### Input"
+
+def compose_prompt(instructions, sections):
+    """Return the static instructions followed by the titled (title, text) input sections."""
+    payload = "\n\n".join(f"--- {title} ---\n{text}" for title, text in sections)
+    return f"{instructions.rstrip()}\n\n{PAYLOAD_MARKER}\n{payload}\n"
+
 # Define language test frameworks
 LANGUAGE_TEST_FRAMEWORKS = {
     "python": "unittest",
@@ -8,10 +19,14 @@ LANGUAGE_TEST_FRAMEWORKS = {
     "ruby": "RSpec"
 }
 
-def get_prompt(code_chunk, file_name, language="python", prompt_type="functionality", shot_type="zero_shot"):
-    module_name = file_name.replace(".py", "")  # Extract module name from file name
-    
-    """Generate a prompt for the specified code chunk and language."""
+@lru_cache(maxsize=None)
+def generation_instructions(language="python"):
+    """
+    Return the static instructions and example of the test generation prompt.
+
+    They do not depend on the code under test, so every generation request
+    starts with the same prefix and the provider can serve it from its cache.
+    """
     few_shot_examples = {
         "python": """
         import unittest
@@ -43,8 +58,7 @@ def get_prompt(code_chunk, file_name, language="python", prompt_type="functional
     examples = few_shot_examples.get(language, "")
 
     return f"""
-    Create a comprehensive, edge-case-focused unit test suite for the following {language} class or functions:
-    {code_chunk}
+    Create a comprehensive, edge-case-focused unit test suite for the {language} class or functions given in the input at the end.
 
     **Requirements:**
     
@@ -73,8 +87,9 @@ def get_prompt(code_chunk, file_name, language="python", prompt_type="functional
 
     
     3.**Import the module dynamically based on the file name**  
+       - Use the module name given in the input at the end:
        ```python
-       from {module_name} import *
+       from <module_name> import *
        ```
     
     4. **Implement a test class using `{test_framework}`**  
@@ -166,49 +181,108 @@ def get_prompt(code_chunk, file_name, language="python", prompt_type="functional
     {examples}
     """
 
-def generate_branch_coverage_prompt(coverage, file_name, missing_statements, missing_branches,source_content, test_file_content):
-    prompt = (
-        f"Generate missing test cases for the file {file_name}.\n"
-        f"Current test coverage is {coverage}%. The following branches are missing coverage:\n"
-        f"- Missing Statements: {missing_statements}\n"
-        f"- Missing Branches: {missing_branches}\n\n"
-    
-        f"--- Source Code ---\n{source_content}\n\n"
-        f"--- Existing Test Cases ---\n{test_file_content}\n\n"
-
-        f"### Objective: Maximize Branch Coverage\n"
-        f"- Identify **only uncovered execution paths** in all control structures (`if`, `elif`, `else`, `for`, `while`, `try-except`).\n"
-        f"- **Do NOT generate test cases that already exist in `test_file_content`.**\n"
-        f"- **Focus ONLY on the missing branches listed above.**\n"
-        f"- **Each test function must target a specific missing condition.**\n\n"
-
-        f"### Constraints:\n"
-        f"- **No Duplication:** Ensure new test cases do not repeat existing ones.\n"
-        f"- **Do NOT generate class headers (`class TestXYZ`) or import statements.**\n"
-        f"- **Do NOT include `if __name__ == \"__main__\": unittest.main()`**\n"
-        f"- **Valid Python Tests Only:**\n"
-        f"  - Each function must start with `def test_...`.\n"
-        f"  - Each function must include `self` as the first parameter.\n"
-        f"  - Each function must be properly formatted.\n"
-        f"- **Do NOT include any markdown formatting such as ``` or ```python **\n"
-        f"- **Each test function should have a descriptive name based on the missing branch.**\n"
-        f"- **Assume existing setup: Do not redefine class instances if already initialized in `test_file_content`.**\n\n"
-
-        f"### Test Coverage Strategy:\n"
-        f"For each missing branch, generate test cases that cover all logical scenarios:\n"
-        f"- If `if A and B:`, ensure tests for:\n"
-        f"  - (A=True, B=True), (A=True, B=False), (A=False, B=True), (A=False, B=False)\n"
-        f"- If `if A or B:`, ensure tests for:\n"
-        f"  - (A=True, B=True), (A=True, B=False), (A=False, B=True), (A=False, B=False)\n"
-        f"- Ensure **boundary cases**, **edge cases**, and **invalid inputs** are covered where relevant.\n"
-    
-        f"### Expected Output Format:\n"
-        f"- **Only the missing test functions** without any extra text, instructions, or explanations.\n"
-        f"- Do not include any markdown formatting such as ``` or ```python \n"
-        f" -**Each test must be a properly formatted Python function starting with `def test_...`\n "
-        f"- **Each test method should have a descriptive name and include the 'self' parameter. (e.g. 'def test_example(self):')**\n"
-        )
-    return prompt
+
+def get_prompt(code_chunk, file_name, language="python", prompt_type="functionality", shot_type="zero_shot"):
+    """Generate a prompt for the specified code chunk and language."""
+    module_name = file_name.replace(".py", "")  # Extract module name from file name
+    return compose_prompt(generation_instructions(language), [
+        ("Module", f"`{module_name}` (import it with `from {module_name} import *`)"),
+        ("Code", code_chunk),
+    ])
+
+
+# Delimiters of the per-module test files in a batched generation response
+BATCH_BEGIN_MARKER = "# ===== BEGIN TEST FILE FOR MODULE: {module_name} ====="
+BATCH_END_MARKER = "# ===== END TEST FILE FOR MODULE: {module_name} ====="
+
+@lru_cache(maxsize=None)
+def batch_instructions(language="python"):
+    """Return the static instructions of a batched generation prompt."""
+    return generation_instructions(language) + f"""
+    **Multiple Modules:**
+    The input at the end contains several separate modules, each under a `--- Module `<module_name>` ---` header.
+    Write one complete, independent test file for EACH module, importing only that module
+    (replace `<module_name>` in requirement 3 with the module name).
+    Wrap every test file exactly like this, with nothing outside the markers:
+    {BATCH_BEGIN_MARKER.format(module_name="<module_name>")}
+    <complete test file>
+    {BATCH_END_MARKER.format(module_name="<module_name>")}
+    """
+
+def get_batch_prompt(modules, language="python", shot_type="few_shot"):
+    """
+    Generate one prompt asking for a separate test file for each of several small modules.
+
+    modules is a list of (module_name, code) tuples; each test file in the response
+    is wrapped in BATCH_BEGIN_MARKER / BATCH_END_MARKER lines.
+    """
+    module_names = ", ".join(f"`{module_name}`" for module_name, _ in modules)
+    return compose_prompt(batch_instructions(language), [
+        ("Modules", f"{len(modules)} modules: {module_names}"),
+    ] + [(f"Module `{module_name}`", code) for module_name, code in modules])
+
+COVERAGE_INSTRUCTIONS = (
+    "Generate missing test cases for the file named in the input at the end, "
+    "which also lists its current coverage, missing statements and missing branches.\n\n"
+
+    "### Objective: Maximize Branch Coverage\n"
+    "- Identify **only uncovered execution paths** in all control structures (`if`, `elif`, `else`, `for`, `while`, `try-except`).\n"
+    "- **Do NOT generate test cases that already exist in the Existing Test Cases.**\n"
+    "- **Focus ONLY on the missing branches listed in the input.**\n"
+    "- **Each test function must target a specific missing condition.**\n\n"
+
+    "### Constraints:\n"
+    "- **No Duplication:** Ensure new test cases do not repeat existing ones.\n"
+    "- **Do NOT generate class headers (`class TestXYZ`) or import statements.**\n"
+    "- **Do NOT include `if __name__ == \"__main__\": unittest.main()`**\n"
+    "- **Valid Python Tests Only:**\n"
+    "  - Each function must start with `def test_...`.\n"
+    "  - Each function must include `self` as the first parameter.\n"
+    "  - Each function must be properly formatted.\n"
+    "- **Do NOT include any markdown formatting such as ``` or ```python **\n"
+    "- **Each test function should have a descriptive name based on the missing branch.**\n"
+    "- **Assume existing setup: Do not redefine class instances if already initialized in the Existing Test Cases.**\n\n"
+
+    "### Test Coverage Strategy:\n"
+    "For each missing branch, generate test cases that cover all logical scenarios:\n"
+    "- If `if A and B:`, ensure tests for:\n"
+    "  - (A=True, B=True), (A=True, B=False), (A=False, B=True), (A=False, B=False)\n"
+    "- If `if A or B:`, ensure tests for:\n"
+    "  - (A=True, B=True), (A=True, B=False), (A=False, B=True), (A=False, B=False)\n"
+    "- Ensure **boundary cases**, **edge cases**, and **invalid inputs** are covered where relevant.\n"
+
+    "### Expected Output Format:\n"
+    "- **Only the missing test functions** without any extra text, instructions, or explanations.\n"
+    "- Do not include any markdown formatting such as ``` or ```python \n"
+    " -**Each test must be a properly formatted Python function starting with `def test_...`\n "
+    "- **Each test method should have a descriptive name and include the 'self' parameter. (e.g. 'def test_example(self):')**\n"
+)
+
+# Legend of the sliced source, kept static so sliced prompts share their prefix too
+SLICED_COVERAGE_INSTRUCTIONS = COVERAGE_INSTRUCTIONS + (
+    "\n### Sliced Input:\n"
+    "- The Source Code holds only the functions with uncovered code; uncovered lines are marked with "
+    "`# <- not covered`, partially covered branches with `# <- branch not fully covered`.\n"
+    "- The Existing Test Cases hold only the signatures and fixtures of the existing tests.\n"
+)
+
+def generate_branch_coverage_prompt(coverage, file_name, missing_statements, missing_branches,source_content, test_file_content, sliced=False):
+    return compose_prompt(SLICED_COVERAGE_INSTRUCTIONS if sliced else COVERAGE_INSTRUCTIONS, [
+        ("File", file_name),
+        ("Current Coverage", f"{coverage}%"),
+        ("Missing Statements", missing_statements),
+        ("Missing Branches", missing_branches),
+        ("Source Code", source_content),
+        ("Existing Test Cases", test_file_content),
+    ])
+
+FIX_OUTPUT_FORMAT = """### Expected Output Format:
+ -Only the updated functions** without any extra text, instructions, or explanations.
+ -Do not include any markdown formatting such as ``` or ```python
+ -Do NOT generate class headers (`class TestXYZ`) or import statements.
+ -Each test must be a properly formatted Python function starting with `def test_...`
+ -Each test method should have a descriptive name and include the 'self' parameter. (e.g. 'def test_example(self):')
+"""
 
 def build_fix_prompt(source_code, test_function_code, error_reason):
     prompt = [
@@ -221,16 +295,11 @@ def build_fix_prompt(source_code, test_function_code, error_reason):
                 },
                 {
                     "role": "user",
-                    "content": f""" Source Code:{source_code}
-                                    Broken Test Function:{test_function_code}
-                                    Error Message:{error_reason}
-                                    ### Expected Output Format:
-                                     -Only the updated functions** without any extra text, instructions, or explanations.
-                                     -Do not include any markdown formatting such as ``` or ```python
-                                     -Do NOT generate class headers (`class TestXYZ`) or import statements.
-                                     -Each test must be a properly formatted Python function starting with `def test_...`
-                                     -Each test method should have a descriptive name and include the 'self' parameter. (e.g. 'def test_example(self):')
-                                """
+                    "content": compose_prompt(FIX_OUTPUT_FORMAT, [
+                        ("Source Code", source_code),
+                        ("Broken Test Function", test_function_code),
+                        ("Error Message", error_reason),
+                    ])
                  }
              ]
     return prompt
@@ -269,19 +338,20 @@ def generate_mutation_prompt(source_code: str, original_test_code: str, mutation
         },
         {
             "role": "user",
-            "content": (
-                f"Source Code:\n{source_code}\n\n"
-                f"Test Code:\n{original_test_code}\n\n"
-                f"Mutation Diff:\n{mutation_diff}\n\n"
+            "content": compose_prompt(
                 "### Expected Output Format:\n"
                 "- Only the updated functions, without any extra text, instructions, or explanations.\n"
                 "- Do not include any markdown formatting such as ``` or ```python.\n"
                 "- Do NOT generate class headers (e.g., `class TestXYZ`) or import statements.\n"
                 "- Each test must be a properly formatted Python function starting with `def test_...`\n"
                 "- Each test method should have a descriptive name and include the 'self' parameter. (e.g., `def test_example(self):`)\n"
-                f"- Focus on {strategy} mutations and their edge cases.\n"
-            )
+                f"- Focus on {strategy} mutations and their edge cases.\n",
+                [
+                    ("Source Code", source_code),
+                    ("Test Code", original_test_code),
+                    ("Mutation Diff", mutation_diff),
+                ])
         }
     ]
 
-    return prompt
\ No newline at end of file
+    return prompt
@@ -0,0 +1,136 @@
+import threading
+import time
+import unittest
+
+from agenticapp.utils.rate_limiter import RateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    """Stands in for an openai APIStatusError: a status code and the response headers."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+def failing_request(failures, result="ok"):
+    """Return a request that raises the errors in failures (shared by all callers) before succeeding."""
+    lock = threading.Lock()
+    pending = list(failures)
+
+    def request():
+        with lock:
+            error = pending.pop(0) if pending else None
+        if error is not None:
+            raise error
+        return result
+
+    return request
+
+
+def make_limiter(**kwargs):
+    settings = dict(rpm=1000, tpm=1000000, base_backoff=0.01, max_backoff=0.05,
+                    breaker_threshold=100, breaker_cooldown=0.2)
+    settings.update(kwargs)
+    return RateLimiter(**settings)
+
+
+class TestRateLimiterRetries(unittest.TestCase):
+
+    def test_retries_429_and_5xx_until_success(self):
+        limiter = make_limiter()
+        retries = []
+        request = failing_request([FakeAPIError(429, {"retry-after": "0.01"}), FakeAPIError(500),
+                                   FakeAPIError(503)])
+        self.assertEqual(limiter.call(request, 100, on_retry=lambda: retries.append(1)), "ok")
+        self.assertEqual(len(retries), 3)
+        self.assertEqual(limiter.stats["retries"], 3)
+        self.assertEqual(limiter.stats["rate_limited"], 1)
+        self.assertEqual(limiter.stats["errors"], 2)
+        self.assertEqual(limiter.consecutive_failures, 0)
+
+    def test_concurrent_calls_survive_injected_errors(self):
+        limiter = make_limiter()
+        request = failing_request([FakeAPIError(429, {"retry-after": "0.01"})] * 7 + [FakeAPIError(500)] * 2)
+        results = []
+
+        def worker():
+            results.append(limiter.call(request, 100))
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(results, ["ok"] * 16)
+        self.assertEqual(limiter.stats["retries"], 9)
+        self.assertEqual(limiter.stats["rate_limited"], 7)
+        self.assertEqual(limiter.stats["errors"], 2)
+
+    def test_gives_up_after_max_retries(self):
+        limiter = make_limiter(max_retries=2)
+        request = failing_request([FakeAPIError(500)] * 5)
+        with self.assertRaises(FakeAPIError):
+            limiter.call(request, 100)
+        self.assertEqual(limiter.stats["retries"], 2)
+        self.assertEqual(limiter.stats["errors"], 3)
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        limiter = make_limiter()
+        request = failing_request([FakeAPIError(400)])
+        with self.assertRaises(FakeAPIError):
+            limiter.call(request, 100)
+        self.assertEqual(limiter.stats["retries"], 0)
+        self.assertEqual(limiter.consecutive_failures, 0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_breaker_opens_after_consecutive_failures_and_closes_on_success(self):
+        limiter = make_limiter(max_retries=2, breaker_threshold=3, breaker_cooldown=0.3)
+        with self.assertRaises(FakeAPIError):
+            limiter.call(failing_request([FakeAPIError(503)] * 3), 100)
+        self.assertEqual(limiter.stats["breaker_opened"], 1)
+        self.assertGreater(limiter.open_until, time.monotonic())
+
+        # The next request is held back until the cooldown ends, then closes the breaker
+        started = time.monotonic()
+        self.assertEqual(limiter.call(failing_request([]), 100), "ok")
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(limiter.open_until, 0.0)
+        self.assertEqual(limiter.consecutive_failures, 0)
+
+    def test_failed_probe_reopens_the_breaker(self):
+        limiter = make_limiter(max_retries=0, breaker_threshold=2, breaker_cooldown=0.1)
+        for _ in range(2):
+            with self.assertRaises(FakeAPIError):
+                limiter.call(failing_request([FakeAPIError(502)]), 100)
+        self.assertEqual(limiter.stats["breaker_opened"], 1)
+        time.sleep(0.15)
+        with self.assertRaises(FakeAPIError):
+            limiter.call(failing_request([FakeAPIError(502)]), 100)
+        self.assertGreater(limiter.open_until, time.monotonic())
+        self.assertFalse(limiter.probe_in_flight)
+
+
+class TestRateLimitHeaders(unittest.TestCase):
+
+    def test_budgets_follow_response_headers(self):
+        limiter = make_limiter()
+        limiter.update_from_headers({"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0",
+                                     "x-ratelimit-limit-tokens": "5000", "x-ratelimit-remaining-tokens": "4000"})
+        self.assertEqual(limiter.requests.capacity, 60)
+        self.assertLessEqual(limiter.requests.level, 0.1)
+        self.assertEqual(limiter.tokens.capacity, 5000)
+        self.assertLessEqual(limiter.tokens.level, 4000.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from agenticapp.agents.TestExecutionAgent import discover_and_run_tests, iter_test_results
+from agenticapp.utils.worker_pool import shutdown_worker_pool
+
+TEST_HANG = '''\
+import time
+import unittest
+
+
+class TestHang(unittest.TestCase):
+
+    def test_hangs(self):
+        time.sleep(60)
+
+    def test_runs_after_hang(self):
+        self.assertTrue(True)
+'''
+
+TEST_CRASH = '''\
+import os
+import unittest
+
+
+class TestCrash(unittest.TestCase):
+
+    def test_exits(self):
+        os._exit(3)
+
+    def test_runs_after_crash(self):
+        self.assertTrue(True)
+'''
+
+TEST_FIXTURE = '''\
+import unittest
+
+
+class TestBrokenFixture(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        raise RuntimeError("database unavailable")
+
+    def test_first(self):
+        self.assertTrue(True)
+
+    def test_second(self):
+        self.assertTrue(True)
+
+
+class TestHealthy(unittest.TestCase):
+
+    def test_passes(self):
+        self.assertTrue(True)
+'''
+
+
+class TestSupervisedRun(unittest.TestCase):
+    """Runs hanging, crashing and broken-fixture tests through discover_and_run_tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.project = tempfile.mkdtemp()
+        test_folder = os.path.join(cls.project, "tests")
+        os.makedirs(os.path.join(cls.project, "source_files"))
+        os.makedirs(test_folder)
+        for name, text in (("__init__.py", ""), ("test_hang.py", TEST_HANG), ("test_crash.py", TEST_CRASH),
+                           ("test_fixture.py", TEST_FIXTURE)):
+            with open(os.path.join(test_folder, name), "w", encoding="utf-8") as f:
+                f.write(text)
+        output_json = os.path.join(cls.project, "results.jsonl")
+        started = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            discover_and_run_tests(test_folder, output_json=output_json,
+                                   output_html=os.path.join(cls.project, "results.html"),
+                                   shards=2, test_timeout=1, module_timeout=30)
+        cls.duration = time.monotonic() - started
+        cls.results = {record["test"]: record for record in iter_test_results(output_json)}
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_worker_pool()
+        shutil.rmtree(cls.project, ignore_errors=True)
+
+    def result(self, test_id):
+        return self.results[test_id]
+
+    def test_hung_test_times_out_and_the_rest_runs(self):
+        hung = self.result("test_hang.TestHang.test_hangs")
+        self.assertEqual(hung["status"], "TIMEOUT")
+        self.assertIn("per-test timeout", hung["reason"])
+        self.assertIn("test_hangs", hung["reason"])  # The worker's stack
+        self.assertEqual(self.result("test_hang.TestHang.test_runs_after_hang")["status"], "PASS")
+        self.assertLess(self.duration, 30)
+
+    def test_crashing_test_is_an_error_and_the_rest_runs(self):
+        crashed = self.result("test_crash.TestCrash.test_exits")
+        self.assertEqual(crashed["status"], "ERROR")
+        self.assertIn("exited with code 3", crashed["reason"])
+        self.assertEqual(self.result("test_crash.TestCrash.test_runs_after_crash")["status"], "PASS")
+
+    def test_setupclass_error_marks_the_class_as_not_run(self):
+        for name in ("test_first", "test_second"):
+            record = self.result(f"test_fixture.TestBrokenFixture.{name}")
+            self.assertEqual(record["status"], "ERROR")
+            self.assertTrue(record["reason"].startswith("Test did not run"))
+            self.assertIn("database unavailable", record["reason"])
+        self.assertEqual(self.result("test_fixture.TestHealthy.test_passes")["status"], "PASS")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from agenticapp.agents.TestExecutionAgent import discover_and_run_tests, iter_test_results
+from agenticapp.utils.test_impact import ImpactMap, changed_scopes, line_mapping, remap_arcs
+from agenticapp.utils.worker_pool import shutdown_worker_pool
+
+CALC = '''\
+SCALE = 2
+
+
+def add(a, b):
+    return a + b
+
+
+def double(x):
+    if x < 0:
+        return 0
+    return x * SCALE
+
+
+def unused(x):
+    return x
+'''
+
+TEXT = '''\
+def shout(text):
+    return text.upper() + "!"
+'''
+
+TEST_PREAMBLE = '''\
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "source_files"))
+'''
+
+TEST_CALC = TEST_PREAMBLE + '''
+import calc
+
+
+class TestCalc(unittest.TestCase):
+
+    def test_add(self):
+        self.assertEqual(calc.add(1, 2), 3)
+
+    def test_double(self):
+        self.assertEqual(calc.double(3), 6)
+'''
+
+TEST_TEXT = TEST_PREAMBLE + '''
+import text
+
+
+class TestText(unittest.TestCase):
+
+    def test_shout(self):
+        self.assertEqual(text.shout("hi"), "HI!")
+'''
+
+
+class TestChangedScopes(unittest.TestCase):
+
+    def test_body_change_names_the_function(self):
+        scopes = changed_scopes(CALC, CALC.replace("return a + b", "return b + a"))
+        self.assertEqual([scope[4] for scope in scopes], ["add"])
+
+    def test_inserted_body_line_belongs_to_its_function(self):
+        scopes = changed_scopes(CALC, CALC.replace("        return 0\n", "        return 0\n    x += 0\n"))
+        self.assertEqual([scope[4] for scope in scopes], ["double"])
+
+    def test_module_level_change_affects_everything(self):
+        self.assertIsNone(changed_scopes(CALC, CALC.replace("SCALE = 2", "SCALE = 3")))
+        self.assertIsNone(changed_scopes(CALC, CALC.replace("def add(a, b):", "def add(a, b=0):")))
+
+    def test_comment_and_blank_lines_are_ignored(self):
+        self.assertEqual(changed_scopes(CALC, "# Arithmetic\n\n" + CALC.replace("    return a + b",
+                                                                             "    # Sum\n    return a + b")), set())
+
+    def test_unparsable_source_affects_everything(self):
+        self.assertIsNone(changed_scopes("def broken(:\n", CALC))
+
+
+class TestLineMapping(unittest.TestCase):
+
+    def test_arcs_follow_moved_lines_and_drop_changed_ones(self):
+        new_text = "# Header\n" + CALC.replace("return x * SCALE", "return SCALE * x")
+        mapping = line_mapping(CALC, new_text)
+        self.assertEqual(mapping[4], 5)
+        self.assertNotIn(11, mapping)
+        self.assertEqual(remap_arcs([[-4, 5], [5, -4], [10, 11]], mapping), [[-5, 6], [6, -5]])
+
+
+class TestImpactMapRuns(unittest.TestCase):
+    """Runs the suite of a small project through discover_and_run_tests with a test impact map."""
+
+    def setUp(self):
+        self.project = tempfile.mkdtemp()
+        self.source_folder = os.path.join(self.project, "source_files")
+        self.test_folder = os.path.join(self.project, "tests")
+        self.impact_dir = os.path.join(self.project, ".cache", "impact")
+        self.results = os.path.join(self.project, "results.jsonl")
+        self.write("source_files/calc.py", CALC)
+        self.write("source_files/text.py", TEXT)
+        self.write("tests/__init__.py", "")
+        self.write("tests/test_calc.py", TEST_CALC)
+        self.write("tests/test_text.py", TEST_TEXT)
+
+    def tearDown(self):
+        shutdown_worker_pool()
+        shutil.rmtree(self.project, ignore_errors=True)
+
+    def write(self, relative_path, text):
+        path = os.path.join(self.project, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def run_tests(self):
+        """Run the suite and return the names of the tests that ran (not reused) and the status of each test."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            discover_and_run_tests(self.test_folder, output_json=self.results,
+                                   output_html=os.path.join(self.project, "results.html"),
+                                   shards=1, source_folder=self.source_folder, impact_dir=self.impact_dir)
+        records = list(iter_test_results(self.results))
+        ran = {record["test"].rsplit(".", 1)[1] for record in records if not record.get("reused")}
+        return ran, {record["test"].rsplit(".", 1)[1]: record["status"] for record in records}
+
+    def test_selects_the_tests_a_change_affects(self):
+        ran, statuses = self.run_tests()
+        self.assertEqual(ran, {"test_add", "test_double", "test_shout"})
+        self.assertEqual(set(statuses.values()), {"PASS"})
+
+        ran, statuses = self.run_tests()
+        self.assertEqual(ran, set())
+        self.assertEqual(set(statuses), {"test_add", "test_double", "test_shout"})
+
+        self.write("source_files/calc.py", CALC.replace("return a + b", "return a - b"))
+        ran, statuses = self.run_tests()
+        self.assertEqual(ran, {"test_add"})
+        self.assertEqual(statuses["test_add"], "FAIL")
+
+        self.write("source_files/calc.py", "# Arithmetic\n" + CALC.replace("return a + b", "return a - b"))
+        self.assertEqual(self.run_tests()[0], set())
+
+        self.write("source_files/calc.py", CALC.replace("SCALE = 2", "SCALE = 2.0"))
+        self.assertEqual(self.run_tests()[0], {"test_add", "test_double"})
+
+        self.write("tests/test_text.py", TEST_TEXT.replace('"HI!"', "'HI!'"))
+        self.assertEqual(self.run_tests()[0], {"test_shout"})
+
+    def test_merged_coverage_matches_a_plain_coverage_run(self):
+        import coverage
+
+        self.run_tests()
+        self.write("source_files/calc.py", "# Arithmetic\n" + CALC.replace("return x * SCALE", "return SCALE * x"))
+        self.run_tests()
+        impact = ImpactMap(self.impact_dir, self.test_folder, self.source_folder)
+        self.assertTrue(impact.is_current())
+        recorded_file = os.path.join(self.project, ".coverage.recorded")
+        self.assertTrue(impact.write_coverage_data(recorded_file))
+
+        plain_file = os.path.join(self.project, ".coverage.plain")
+        subprocess.run([sys.executable, "-m", "coverage", "run", "--branch", f"--data-file={plain_file}",
+                        "-m", "unittest", "discover", "-s", "tests", "-p", "test_*.py"],
+                       cwd=self.project, capture_output=True, check=True)
+
+        recorded, plain = coverage.CoverageData(recorded_file), coverage.CoverageData(plain_file)
+        recorded.read()
+        plain.read()
+        for name in ("calc.py", "text.py"):
+            path = os.path.join(os.path.realpath(self.source_folder), name)
+            recorded_path = next(p for p in recorded.measured_files() if os.path.realpath(p) == path)
+            plain_path = next(p for p in plain.measured_files() if os.path.realpath(p) == path)
+            self.assertEqual(sorted(recorded.lines(recorded_path)), sorted(plain.lines(plain_path)), name)
+            self.assertEqual(sorted(recorded.arcs(recorded_path)), sorted(plain.arcs(plain_path)), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import signal
+import time
+import unittest
+
+from agenticapp.utils import worker_pool
+from agenticapp.utils.worker_pool import ForkedWorker, WorkerPool
+
+
+def _exit_worker(connection, code):
+    connection.send("started")
+    os._exit(code)
+
+
+def _sleeping_worker(connection):
+    connection.send("started")
+    time.sleep(60)
+
+
+class TestWorkerExitCodes(unittest.TestCase):
+
+    def start_exiting_worker(self, pool, code):
+        worker, connection = pool.start_worker(_exit_worker, (code,))
+        self.assertEqual(connection.recv(), "started")
+        worker.join()
+        connection.close()
+        return worker
+
+    @unittest.skipUnless(worker_pool.FORK_ENABLED, "workers are not forked on this platform")
+    def test_forked_worker_reports_its_exit_code(self):
+        pool = WorkerPool()
+        try:
+            worker = self.start_exiting_worker(pool, 3)
+            self.assertIsInstance(worker, ForkedWorker)
+            self.assertEqual(worker.exitcode, 3)
+            self.assertEqual(self.start_exiting_worker(pool, 0).exitcode, 0)
+        finally:
+            pool.close()
+
+    def test_killed_worker_reports_the_signal(self):
+        pool = WorkerPool()
+        try:
+            worker, connection = pool.start_worker(_sleeping_worker)
+            self.assertEqual(connection.recv(), "started")
+            self.assertIsNone(worker.exitcode)
+            worker.kill()
+            worker.join()
+            connection.close()
+            self.assertEqual(worker.exitcode, -signal.SIGKILL)
+        finally:
+            pool.close()
+
+    def test_spawned_worker_reports_its_exit_code(self):
+        fork_enabled = worker_pool.FORK_ENABLED
+        worker_pool.FORK_ENABLED = False
+        try:
+            pool = WorkerPool()
+        finally:
+            worker_pool.FORK_ENABLED = fork_enabled
+        self.assertEqual(self.start_exiting_worker(pool, 3).exitcode, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
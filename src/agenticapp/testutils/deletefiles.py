@@ -7,9 +7,9 @@ def delete_files_and_folders():
     files_to_delete = [
         "test_results.html", "test_results.json",
         "coverage_report.txt", "coverage_report1.txt", "coverage_report2.txt",
-        "fixed_testcaseresults.html", "fixed_testcaseresults.json",
-        "results.html", "results.json",
-        "improved_testcaseresults.html", "improved_testcaseresults.json",
+        "fixed_testcaseresults.html", "fixed_testcaseresults.json", "fixed_testcaseresults.jsonl",
+        "results.html", "results.json", "results.jsonl",
+        "improved_testcaseresults.html", "improved_testcaseresults.json", "improved_testcaseresults.jsonl",
         "mutation_report_before.yaml", "mutation_report_after.yaml",
         ".coverage"  # Add coverage database file
     ]
@@ -0,0 +1,93 @@
+"""
+Import-time benchmark for the agent and utility modules.
+
+Imports each module in a fresh interpreter with `python -X importtime` and
+reports its cumulative import time. Fails (exit code 1) when a module pulls in
+one of the heavy UI/reporting dependencies at import time or exceeds the
+time budget, so headless runs and worker processes stay cheap to start.
+
+Run it with:
+    python src/agenticapp/testutils/import_benchmark.py --budget-ms 300
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PACKAGE_DIR = os.path.join(SRC_DIR, "agenticapp")
+
+MODULES = [
+    "agenticapp.agents.agent_registry",
+    "agenticapp.agents.TestGenerationAgent",
+    "agenticapp.agents.TestExecutionAgent",
+    "agenticapp.agents.CoverageAgent",
+    "agenticapp.agents.AutoFixingAgent",
+    "agenticapp.agents.MutationTestAgent",
+    "agenticapp.utils.llm_utils",
+    "agenticapp.utils.chunking_utils",
+    "agenticapp.utils.coverage_slicing",
+    "agenticapp.utils.mutationutils",
+]
+# Loaded only inside the functions that need them
+HEAVY_MODULES = ("pandas", "streamlit", "coverage", "autogen", "openai", "tiktoken", "numpy")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module):
+    """Import module in a fresh interpreter and return (cumulative_us, imported top-level names)."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (SRC_DIR, PACKAGE_DIR, env.get("PYTHONPATH")) if p)
+    # Importing the agents configures file logging in the working directory
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env, cwd=cwd,
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.add(name.split(".")[0])
+        if name == module:
+            cumulative_us = int(match.group(2))
+    return cumulative_us, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the agent and utility modules")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="Modules to import (default: all agents/utils)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail when a module takes longer to import")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':45} {'import ms':>10}  heavy dependencies")
+    for module in args.modules:
+        try:
+            cumulative_us, imported = measure_import(module)
+        except RuntimeError as e:
+            failures.append(str(e))
+            continue
+        heavy = sorted(name for name in HEAVY_MODULES if name in imported)
+        print(f"{module:45} {cumulative_us / 1000:10.1f}  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at module load")
+        if args.budget_ms is not None and cumulative_us / 1000 > args.budget_ms:
+            failures.append(f"{module} took {cumulative_us / 1000:.1f} ms to import (budget {args.budget_ms} ms)")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
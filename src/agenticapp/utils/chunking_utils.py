@@ -1,5 +1,16 @@
 # chunking_utils.py
+import ast
+import logging
 import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the source code sent with one test generation request
+DEFAULT_CHUNK_TOKENS = 2000
+DEFAULT_MODEL = "gpt-4o"
+MAIN_GUARD = re.compile(r"""^if\s+__name__\s*==\s*['"]__main__['"]\s*:""")
+
 
 def chunk_code(code, max_chunk_size=512):
     """Split code into chunks of specified maximum size."""
@@ -11,8 +22,146 @@ def chunk_code(code, max_chunk_size=512):
             chunks.append("\n".join(current_chunk))
             current_chunk = []
         current_chunk.append(line)
-    
+
     if current_chunk:
         chunks.append("\n".join(current_chunk))
 
     return chunks
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    try:
+        import tiktoken
+    except ImportError:  # Fall back to a character based estimate
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+            return None
+
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    """Count the tokens of text for model, estimating ~4 characters per token without tiktoken."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def source_segment(lines, start, end):
+    """Return source lines start..end (1-based, inclusive) as text."""
+    return "\n".join(lines[start - 1:end])
+
+
+def node_start(node, lines):
+    """First line of a node, including its decorators and the comments directly above it."""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    while start > 1 and lines[start - 2].lstrip().startswith("#"):
+        start -= 1
+    return start
+
+
+def module_header(tree, lines):
+    """Return the module-level code other than classes, functions and the main guard."""
+    header_parts = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        segment = source_segment(lines, node_start(node, lines), node.end_lineno)
+        if not MAIN_GUARD.match(segment.lstrip()):
+            header_parts.append(segment)
+    return "\n".join(header_parts)
+
+
+def class_methods(node):
+    """Return the methods defined directly in a class body."""
+    return [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+
+def class_skeleton(node, lines):
+    """Return a class without its methods: header, docstring and class attributes."""
+    method_ranges = [(node_start(m, lines), m.end_lineno) for m in class_methods(node)]
+    class_start = node_start(node, lines)
+    skeleton_lines = [
+        line for number, line in enumerate(lines[class_start - 1:node.end_lineno], class_start)
+        if not any(start <= number <= end for start, end in method_ranges)
+    ]
+    return "\n".join(line for line in skeleton_lines if line.strip())
+
+
+def _class_units(node, lines, max_tokens, model):
+    """
+    Split an oversized class into method groups that each repeat the class
+    skeleton (header, docstring and class attributes) for context.
+    """
+    method_ranges = [(node_start(m, lines), m.end_lineno) for m in class_methods(node)]
+    skeleton = class_skeleton(node, lines)
+    budget = max_tokens - count_tokens(skeleton, model)
+
+    units, current, current_tokens = [], [], 0
+    for start, end in method_ranges:
+        method = source_segment(lines, start, end)
+        method_tokens = count_tokens(method, model)
+        if current and current_tokens + method_tokens > budget:
+            units.append(skeleton + "\n\n" + "\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(method)
+        current_tokens += method_tokens
+    if current:
+        units.append(skeleton + "\n\n" + "\n\n".join(current))
+    return units
+
+
+def chunk_code_ast(code, max_tokens=DEFAULT_CHUNK_TOKENS, model=DEFAULT_MODEL):
+    """
+    Split Python code on top-level class and function boundaries and pack the
+    pieces into chunks of at most max_tokens tokens.
+
+    Every chunk starts with the module header (imports and top-level
+    assignments) so it can be tested on its own. Classes larger than the budget
+    are split between methods; a single function larger than the budget becomes
+    its own chunk. Code that does not parse falls back to chunk_code.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        logger.warning(f"Could not parse code for AST chunking, using line chunks: {e}")
+        return chunk_code(code, max_chunk_size=512)
+
+    lines = code.splitlines()
+    units = [
+        (node, source_segment(lines, node_start(node, lines), node.end_lineno))
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    ]
+    if not units:
+        return [code] if code.strip() else []
+
+    header = module_header(tree, lines)
+    budget = max(1, max_tokens - count_tokens(header, model))
+
+    pieces = []
+    for node, segment in units:
+        if isinstance(node, ast.ClassDef) and count_tokens(segment, model) > budget:
+            pieces.extend(_class_units(node, lines, budget, model))
+        else:
+            pieces.append(segment)
+
+    chunks, current, current_tokens = [], [], 0
+    for piece in pieces:
+        piece_tokens = count_tokens(piece, model)
+        if current and current_tokens + piece_tokens > budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        chunks.append(current)
+
+    prefix = header + "\n\n\n" if header else ""
+    return [prefix + "\n\n\n".join(chunk) for chunk in chunks]
@@ -0,0 +1,104 @@
+import ast
+import logging
+
+from agenticapp.utils.chunking_utils import (
+    class_methods,
+    class_skeleton,
+    module_header,
+    node_start,
+    source_segment,
+)
+
+logger = logging.getLogger(__name__)
+
+UNCOVERED_MARKER = "  # <- not covered"
+PARTIAL_BRANCH_MARKER = "  # <- branch not fully covered"
+
+
+def _mark_lines(lines, missing_lines, partial_branch_lines):
+    """Annotate uncovered lines and partially covered branch lines for the model."""
+    marked = list(lines)
+    for number in range(1, len(lines) + 1):
+        if not lines[number - 1].strip():
+            continue
+        if number in missing_lines:
+            marked[number - 1] += UNCOVERED_MARKER
+        elif number in partial_branch_lines:
+            marked[number - 1] += PARTIAL_BRANCH_MARKER
+    return marked
+
+
+def slice_uncovered_source(source, missing_lines, missing_branches=()):
+    """
+    Reduce a source file to the functions that contain uncovered code.
+
+    Keeps the module header, the skeleton of every class with an uncovered
+    method, and each top-level function or method containing a missing line or
+    the source line of a missing branch arc. Those lines are marked with a
+    trailing comment. Returns the full source if it cannot be parsed.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        logger.warning(f"Could not parse source for coverage slicing: {e}")
+        return source
+
+    missing_lines = set(missing_lines)
+    partial_branch_lines = {arc[0] for arc in missing_branches}
+    targets = missing_lines | partial_branch_lines
+    lines = _mark_lines(source.splitlines(), missing_lines, partial_branch_lines)
+
+    def contains_target(node):
+        return any(node_start(node, lines) <= line <= node.end_lineno for line in targets)
+
+    parts = []
+    header = module_header(tree, lines)
+    if header:
+        parts.append(header)
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and contains_target(node):
+            parts.append(source_segment(lines, node_start(node, lines), node.end_lineno))
+        elif isinstance(node, ast.ClassDef) and contains_target(node):
+            methods = [
+                source_segment(lines, node_start(m, lines), m.end_lineno)
+                for m in class_methods(node) if contains_target(m)
+            ]
+            parts.append("\n\n".join([class_skeleton(node, lines)] + methods))
+    return "\n\n\n".join(parts)
+
+
+def summarize_test_signatures(test_source):
+    """
+    Summarise an existing test module for the model: imports, class headers and
+    fixture methods are kept in full, test methods are reduced to their
+    signature and the first line of their docstring.
+    """
+    try:
+        tree = ast.parse(test_source)
+    except SyntaxError as e:
+        logger.warning(f"Could not parse test file for summarising: {e}")
+        return test_source
+
+    lines = test_source.splitlines()
+    parts = []
+    header = module_header(tree, lines)
+    if header:
+        parts.append(header)
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        members = [class_skeleton(node, lines)]
+        for method in class_methods(node):
+            if not method.name.startswith("test"):
+                members.append(source_segment(lines, node_start(method, lines), method.end_lineno))
+                continue
+            if method.body[0].lineno == method.lineno:  # One-line test, keep as is
+                members.append(source_segment(lines, node_start(method, lines), method.end_lineno))
+                continue
+            signature = source_segment(lines, node_start(method, lines), method.body[0].lineno - 1).rstrip()
+            indent = " " * (method.col_offset + 4)
+            docstring = ast.get_docstring(method)
+            summary = f'{indent}"""{docstring.splitlines()[0]}"""\n' if docstring else ""
+            members.append(f"{signature}\n{summary}{indent}...")
+        parts.append("\n".join(members))
+    return "\n\n".join(parts)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def hash_file(file_path):
+    """Return the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path, settings=None):
+    """
+    Load the generation manifest, mapping source files to their content hash and
+    the test files generated from them.
+
+    A missing or unreadable manifest, or one written with different generation
+    settings, yields an empty manifest so every file is regenerated.
+    """
+    empty = {"version": MANIFEST_VERSION, "settings": settings or {}, "files": {}}
+    if not os.path.exists(manifest_path):
+        return empty
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable generation manifest {manifest_path}: {e}")
+        return empty
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("settings", {}) != (settings or {}):
+        logger.info("Generation settings changed, regenerating all tests")
+        return empty
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    """Atomically write the generation manifest."""
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def plan_generation(manifest, source_folder, file_paths, test_folder, incremental=True):
+    """
+    Compare the current source files against the manifest.
+
+    Returns (changed, hashes, deleted): the files whose tests must be generated,
+    the content hash of every current file, and the manifest keys of source
+    files that no longer exist. A file is unchanged only when its hash matches
+    and all of its recorded test files (possibly none) are still on disk; with
+    incremental=False every file is changed.
+    """
+    hashes = {}
+    changed = []
+    current_keys = set()
+    for file_path in file_paths:
+        key = manifest_key(file_path, source_folder)
+        current_keys.add(key)
+        hashes[file_path] = hash_file(file_path)
+        entry = manifest["files"].get(key)
+        up_to_date = (
+            incremental
+            and entry is not None
+            and entry["hash"] == hashes[file_path]
+            and all(os.path.exists(os.path.join(test_folder, test)) for test in entry.get("tests", []))
+        )
+        if not up_to_date:
+            changed.append(file_path)
+
+    deleted = [key for key in manifest["files"] if key not in current_keys]
+    return changed, hashes, deleted
+
+
+def prune_tests(manifest, keys, test_folder, keep=()):
+    """Delete the generated test files recorded for keys, except those in keep."""
+    removed = []
+    for key in keys:
+        entry = manifest["files"].get(key) or {}
+        for test in entry.get("tests", []):
+            if test in keep:
+                continue
+            test_path = os.path.join(test_folder, test)
+            if os.path.exists(test_path):
+                os.remove(test_path)
+                removed.append(test_path)
+                logger.info(f"Pruned stale test file: {test_path}")
+    return removed
+
+
+def record_generated(manifest, file_path, source_folder, file_hash, test_files, test_folder):
+    """Record the test files generated for a source file, pruning ones it no longer produces."""
+    key = manifest_key(file_path, source_folder)
+    tests = [manifest_key(test_file, test_folder) for test_file in test_files]
+    prune_tests(manifest, [key], test_folder, keep=set(tests))
+    manifest["files"][key] = {"hash": file_hash, "tests": tests}
+
+
+def manifest_key(file_path, base_folder):
+    """Return the portable, base-relative key used for a file in the manifest."""
+    return os.path.relpath(os.path.abspath(file_path), os.path.abspath(base_folder)).replace(os.sep, "/")
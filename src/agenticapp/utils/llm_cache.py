@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache")
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+# Run a full eviction pass after this many writes
+EVICTION_INTERVAL = 50
+
+
+class ReplyCache:
+    """
+    Content-addressed, disk-backed cache of LLM replies.
+
+    Entries are JSON files named after the SHA-256 of the agent, model and prompt
+    messages. The file mtime is refreshed on every hit, so eviction drops expired
+    entries first and then the least recently used ones until the cache is back
+    under its entry and size limits.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.directory = os.path.join(cache_dir, "llm_replies")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(agent_name, model, messages, **params):
+        """Return the cache key for a prompt sent by an agent to a model."""
+        payload = json.dumps(
+            {"agent": agent_name, "model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached reply for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+
+        if time.time() - entry.get("created", 0) > self.max_age_seconds:
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        try:
+            os.utime(path)  # Mark as recently used for LRU eviction
+        except OSError:
+            pass
+        self._count(hit=True)
+        return entry.get("content")
+
+    def set(self, key, content, **metadata):
+        """Store a reply under key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"created": time.time(), "content": content, **metadata}
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write LLM cache entry {key}: {e}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % EVICTION_INTERVAL == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the limits."""
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if not file.endswith(".json"):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age_seconds:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        removed = 0
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} LLM cache entries")
+
+    def stats(self):
+        """Return the hit/miss counters of this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_reply_cache = None
+_reply_cache_lock = threading.Lock()
+_cache_enabled = os.getenv("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def configure_reply_cache(cache_dir=DEFAULT_CACHE_DIR, enabled=None, **limits):
+    """
+    Point the process-wide reply cache at cache_dir.
+
+    Calling it again with the same directory keeps the existing cache and its
+    counters. Pass enabled=False to turn caching off.
+    """
+    global _reply_cache, _cache_enabled
+    with _reply_cache_lock:
+        if enabled is not None:
+            _cache_enabled = enabled
+        if not _cache_enabled:
+            _reply_cache = None
+            return None
+        directory = os.path.join(cache_dir, "llm_replies")
+        if _reply_cache is None or _reply_cache.directory != directory or limits:
+            _reply_cache = ReplyCache(cache_dir, **limits)
+        return _reply_cache
+
+
+def get_reply_cache():
+    """Return the process-wide reply cache, creating it on first use."""
+    global _reply_cache
+    if not _cache_enabled:
+        return None
+    with _reply_cache_lock:
+        if _reply_cache is None:
+            _reply_cache = ReplyCache()
+        return _reply_cache
@@ -0,0 +1,272 @@
+import logging
+import os
+import threading
+
+from agenticapp.utils.llm_cache import get_reply_cache
+from agenticapp.utils.output_validation import FORMAT_REMINDERS, FORMAT_VALIDATORS
+from agenticapp.utils.rate_limiter import DEFAULT_COMPLETION_TOKENS, get_rate_limiter
+from agenticapp.utils.telemetry import CallTimer
+
+logger = logging.getLogger(__name__)
+
+# Stream replies and validate them while they arrive (set LLM_STREAMING=1)
+STREAMING_ENABLED = os.getenv("LLM_STREAMING", "").lower() in ("1", "true", "yes")
+# Extra attempts after a streamed reply was aborted for violating its format
+STREAM_MAX_RETRIES = 2
+
+# Config entries with only these keys are called through a raw OpenAI client, which exposes the
+# rate limit headers; any other entry (Azure, api_version, extra client settings) goes through autogen
+PLAIN_OPENAI_KEYS = {"model", "api_key", "base_url", "api_type", "tags", "price"}
+
+_openai_clients = {}
+_openai_clients_lock = threading.Lock()
+
+
+class FormatViolation(Exception):
+    """Raised when a streamed reply clearly violates its expected output format."""
+
+    def __init__(self, reason, partial_text):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial_text = partial_text
+
+
+def apply_endpoint_override(config_list):
+    """
+    Point every config entry at LLM_BASE_URL when it is set, e.g. the local
+    stand-in server from agenticapp.utils.stub_llm_server.
+    """
+    base_url = os.getenv("LLM_BASE_URL")
+    if base_url:
+        for config in config_list:
+            config["base_url"] = base_url
+            if not config.get("api_key"):
+                config["api_key"] = "stub"
+    return config_list
+
+
+def configure_streaming(enabled):
+    """Turn streaming replies with early format validation on or off."""
+    global STREAMING_ENABLED
+    STREAMING_ENABLED = enabled
+
+
+def get_model_name(agent):
+    """Return the model(s) an agent is configured to call."""
+    config_list = (agent.llm_config or {}).get("config_list", [])
+    return ",".join(config.get("model", "") for config in config_list)
+
+
+def response_text(response):
+    """Extract the stripped reply text from a generate_oai_reply result."""
+    reply = response[1] if isinstance(response, tuple) else response
+    if isinstance(reply, dict):
+        reply = reply.get("content")
+    elif reply is not None and not isinstance(reply, str):
+        reply = getattr(reply, "content", None)  # Completion message object
+    return reply.strip() if isinstance(reply, str) else ""
+
+
+def usage_counts(usage):
+    """Return (prompt, completion, cached) token counts from an API usage object or dict."""
+    if usage is None:
+        return 0, 0, 0
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    details = usage.get("prompt_tokens_details") or {}
+    return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0, details.get("cached_tokens") or 0
+
+
+def _plain_openai_configs(agent):
+    """Return the agent's config list when every entry is plain OpenAI, else None."""
+    config_list = (agent.llm_config or {}).get("config_list", [])
+    if config_list and all(set(config) <= PLAIN_OPENAI_KEYS and config.get("api_type", "openai") == "openai"
+                           for config in config_list):
+        return config_list
+    return None
+
+
+def _complete(agent, messages, timer):
+    """Request a full completion and return its text."""
+    config_list = _plain_openai_configs(agent)
+    if config_list is None:
+        response = agent.client.create(messages=[{"role": "system", "content": agent.system_message}] + messages)
+        timer.add_usage(*usage_counts(getattr(response, "usage", None)))
+        return response_text(agent.client.extract_text_or_completion_object(response)[0])
+    response = _raw_create(agent, config_list, messages)
+    timer.add_usage(*usage_counts(getattr(response, "usage", None)))
+    return response_text(response.choices[0].message if response.choices else None)
+
+
+def _raw_create(agent, config_list, messages, **params):
+    """
+    Create a chat completion through the shared OpenAI clients, trying the config
+    entries in order as autogen does, and feed the rate limit headers of the
+    reply to the agent's limiter. Returns the parsed response (a stream when
+    stream=True is passed).
+    """
+    from openai import APIError
+
+    for i, config in enumerate(config_list):
+        try:
+            raw_response = _get_openai_client(config).chat.completions.with_raw_response.create(
+                model=config["model"],
+                messages=[{"role": "system", "content": agent.system_message}] + messages,
+                temperature=agent.llm_config.get("temperature", 0),
+                **params,
+            )
+        except APIError as e:
+            if i == len(config_list) - 1 or getattr(e, "code", None) == "content_filter":
+                raise
+            logger.warning(f"{agent.name}: config {i} ({config['model']}) failed, trying the next: {e}")
+            continue
+        limiter = get_rate_limiter(get_model_name(agent))
+        if limiter is not None:
+            limiter.update_from_headers(raw_response.headers)
+        return raw_response.parse()
+
+
+def _estimate_tokens(agent, messages):
+    """Estimate the tokens a request will use: its prompt plus a typical completion."""
+    from agenticapp.utils.chunking_utils import count_tokens
+
+    prompt = (agent.system_message or "") + "".join(str(m.get("content") or "") for m in messages)
+    return count_tokens(prompt) + DEFAULT_COMPLETION_TOKENS
+
+
+def _rate_limited(agent, messages, timer, request):
+    """
+    Run request() under the process-wide rate limiter of the agent's model,
+    retrying 429s and transient errors, and settle the token budget with the
+    usage the timer recorded.
+    """
+    limiter = get_rate_limiter(get_model_name(agent))
+    if limiter is None:
+        return request()
+    reserved = _estimate_tokens(agent, messages)
+    used_before = timer.fields["prompt_tokens"] + timer.fields["completion_tokens"]
+
+    def count_retry():
+        timer.fields["retries"] += 1
+
+    try:
+        return limiter.call(request, reserved, on_retry=count_retry)
+    finally:
+        used = timer.fields["prompt_tokens"] + timer.fields["completion_tokens"] - used_before
+        limiter.settle(reserved, used or reserved)
+
+
+def _get_openai_client(config):
+    """Return a shared OpenAI client for an agent config entry."""
+    from openai import OpenAI
+
+    key = (config.get("api_key"), config.get("base_url"))
+    with _openai_clients_lock:
+        if key not in _openai_clients:
+            # Retries are scheduled by the shared rate limiter, not per client
+            _openai_clients[key] = OpenAI(api_key=config.get("api_key"), base_url=config.get("base_url"),
+                                          max_retries=0)
+        return _openai_clients[key]
+
+
+def _stream_once(agent, messages, validator, abort_early, timer):
+    """Stream one completion, raising FormatViolation as soon as validator rejects it."""
+    stream = _raw_create(agent, _plain_openai_configs(agent), messages,
+                         stream=True, stream_options={"include_usage": True})
+    text = ""
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                timer.add_usage(*usage_counts(chunk.usage))
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            text += delta
+            if abort_early and "\n" in delta:
+                reason = validator(text.lstrip(), final=False)
+                if reason:
+                    raise FormatViolation(reason, text)
+    finally:
+        stream.close()
+
+    if abort_early:
+        reason = validator(text.strip(), final=True)
+        if reason:
+            raise FormatViolation(reason, text)
+    return text.strip()
+
+
+def stream_reply(agent, messages, output_format, max_retries=STREAM_MAX_RETRIES, timer=None):
+    """
+    Stream a reply, checking it against output_format as it arrives.
+
+    When the output clearly violates the format (markdown fences, prose, class
+    headers where bare methods are expected, ...) the stream is closed and the
+    request retried with a reminder of the format. The last attempt is never
+    aborted so the caller always gets the model's best effort.
+    """
+    timer = timer or CallTimer(agent.name)
+    validator = FORMAT_VALIDATORS[output_format]
+    attempt_messages = list(messages)
+    for attempt in range(max_retries + 1):
+        last_attempt = attempt == max_retries
+        try:
+            return _rate_limited(agent, attempt_messages, timer, lambda: _stream_once(
+                agent, attempt_messages, validator, abort_early=not last_attempt, timer=timer))
+        except FormatViolation as violation:
+            timer.fields["retries"] += 1
+            logger.warning(f"{agent.name}: aborted reply after {len(violation.partial_text)} characters "
+                           f"({violation.reason}), retrying")
+            attempt_messages = list(messages) + [{
+                "role": "user",
+                "content": f"Your previous reply was rejected: {violation.reason}. {FORMAT_REMINDERS[output_format]}",
+            }]
+    return ""
+
+
+def generate_reply(agent, messages, output_format=None, stage=None, source_file=None):
+    """
+    Ask an agent for a reply to messages and return its text.
+
+    Agents run at temperature 0, so replies are served from the disk cache when
+    the same agent already answered the same prompt with the same model.
+    Sampled replies (temperature > 0) are never cached. With
+    streaming enabled, an output_format given and plain OpenAI configs, the reply is streamed and
+    validated incrementally instead of awaited in full.
+
+    Every call is recorded in the run's LLM metrics under stage and source_file.
+    """
+    timer = CallTimer(agent.name, stage, source_file, get_model_name(agent))
+    try:
+        return _generate_reply(agent, messages, output_format, timer)
+    except Exception as e:
+        timer.fields["error"] = str(e)
+        raise
+    finally:
+        timer.finish()
+
+
+def _generate_reply(agent, messages, output_format, timer):
+    cache = get_reply_cache() if not (agent.llm_config or {}).get("temperature") else None
+    key = None
+    if cache is not None:
+        key = cache.make_key(
+            agent.name,
+            get_model_name(agent),
+            messages,
+            system_message=agent.system_message,
+            temperature=(agent.llm_config or {}).get("temperature"),
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for {agent.name}")
+            timer.fields["cache_hit"] = True
+            return cached
+
+    if STREAMING_ENABLED and output_format and _plain_openai_configs(agent) is not None:
+        content = stream_reply(agent, messages, output_format, timer=timer)
+    else:
+        content = _rate_limited(agent, messages, timer, lambda: _complete(agent, messages, timer))
+    if cache is not None and content:
+        cache.set(key, content, agent=agent.name)
+    return content
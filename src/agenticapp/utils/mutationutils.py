@@ -1,7 +1,6 @@
 import difflib
 import ast
 import inspect
-import streamlit as st
 import os
 def apply_specific_mutation(source_code: str, line_number: int, mutator_type: str) -> tuple:
     """
@@ -78,6 +77,8 @@ def apply_mutation(source_code: str) -> tuple[str, str]:
     return mutated_code, mutation_diff
 def display_mutation_results(stats, report_html_path):
     """Display mutation testing results in a formatted way"""
+    import streamlit as st
+
     st.subheader("📊 Mutation Test Results")
     
     # Create columns for layout
@@ -0,0 +1,102 @@
+import ast
+import re
+import textwrap
+
+# Output formats the agents ask the model for
+TEST_MODULE = "test_module"    # A complete, executable unittest file
+TEST_METHODS = "test_methods"  # Bare `def test_...(self)` methods to insert into a TestCase
+TEST_BATCH = "test_batch"      # Several test files wrapped in batch marker lines
+
+MODULE_LINE_STARTS = ("import ", "from ", "#", '"""', "'''", "class ", "@", "def ", "if ", "try:", "sys.", "os.",
+                      "current_dir", "source_files_root", "add_parent_directories_to_sys_path")
+METHOD_LINE_STARTS = ("def test", "async def test", "@")
+CLASS_HEADER = re.compile(r"^\s*class\s+\w+.*:\s*$")
+TOP_LEVEL_IMPORT = re.compile(r"^(import|from)\s+\S+")
+
+FORMAT_REMINDERS = {
+    TEST_MODULE: "Return only the complete Python test file, starting with its import statements, "
+                 "without markdown fences or explanations.",
+    TEST_METHODS: "Return only the test methods, each starting with `def test_...(self):`, without class headers, "
+                  "import statements, markdown fences or explanations.",
+    TEST_BATCH: "Return only the test files wrapped in their BEGIN/END marker lines, without markdown fences "
+                "or explanations.",
+}
+
+
+def strip_code_fences(text):
+    """Drop markdown code fence lines (```python, ```) that models wrap code in."""
+    return "\n".join(line for line in text.splitlines() if not line.lstrip().startswith("```")).strip()
+
+
+def _complete_lines(text, final):
+    """Return the lines of text that are complete; the last line is only complete at the end."""
+    lines = text.splitlines()
+    if not final and lines and not text.endswith("\n"):
+        lines = lines[:-1]
+    return lines
+
+
+def _first_line(lines):
+    return next((line.strip() for line in lines if line.strip()), None)
+
+
+def validate_test_module(text, final=False):
+    """Return the reason text is not a test file, or None while it still looks valid."""
+    if "```" in text:
+        return "markdown code fence in the output"
+    lines = _complete_lines(text, final)
+    first = _first_line(lines)
+    if first is not None and not first.startswith(MODULE_LINE_STARTS):
+        return f"output starts with prose instead of code: {first[:80]!r}"
+    if final:
+        if not text.strip():
+            return "empty output"
+        try:
+            ast.parse(text)
+        except SyntaxError as e:
+            return f"output is not valid Python: {e.msg} (line {e.lineno})"
+    return None
+
+
+def validate_test_methods(text, final=False):
+    """Return the reason text is not a list of test methods, or None while it still looks valid."""
+    if "```" in text:
+        return "markdown code fence in the output"
+    lines = _complete_lines(text, final)
+    first = _first_line(lines)
+    if first is not None and not first.startswith(METHOD_LINE_STARTS):
+        return f"output does not start with a test method: {first[:80]!r}"
+    for line in lines:
+        if CLASS_HEADER.match(line):
+            return "output contains a class header"
+        if TOP_LEVEL_IMPORT.match(line):
+            return "output contains an import statement"
+        if line.lstrip().startswith("if __name__"):
+            return "output contains a main block"
+    if final:
+        if not text.strip():
+            return "empty output"
+        try:
+            ast.parse(textwrap.dedent(text))
+        except SyntaxError as e:
+            return f"output is not valid Python: {e.msg} (line {e.lineno})"
+    return None
+
+
+def validate_test_batch(text, final=False):
+    """Return the reason text is not a batch of marked test files, or None while it still looks valid."""
+    if "```" in text:
+        return "markdown code fence in the output"
+    first = _first_line(_complete_lines(text, final))
+    if first is not None and not first.startswith("# ===== BEGIN TEST FILE"):
+        return f"output does not start with a test file marker: {first[:80]!r}"
+    if final and "# ===== END TEST FILE" not in text:
+        return "output has no complete test file"
+    return None
+
+
+FORMAT_VALIDATORS = {
+    TEST_MODULE: validate_test_module,
+    TEST_METHODS: validate_test_methods,
+    TEST_BATCH: validate_test_batch,
+}
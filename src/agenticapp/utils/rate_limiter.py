@@ -0,0 +1,259 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Starting budgets per model; they adapt to the x-ratelimit-* headers the endpoint sends
+DEFAULT_RPM = int(os.getenv("LLM_RPM", "500"))
+DEFAULT_TPM = int(os.getenv("LLM_TPM", "200000"))
+# Completion tokens reserved for a request until its real usage is known
+DEFAULT_COMPLETION_TOKENS = 1000
+# Set LLM_RATE_LIMIT=0 to send requests without the shared limiter
+RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT", "1").lower() not in ("0", "false", "no")
+
+MAX_RETRIES = 6
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN_SECONDS = 30.0
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+RETRYABLE_ERROR_NAMES = ("APIConnectionError", "APITimeoutError", "Timeout", "ConnectionError")
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Parse durations such as "1s", "6m0s" or "20ms" (or plain seconds) into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts) if parts else None
+
+
+def error_status(error):
+    """Return (status_code, headers) of an API error, or (None, {}) if it has none."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    return status, headers
+
+
+def is_retryable(error):
+    status, _ = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+class TokenBucket:
+    """A bucket refilled continuously up to capacity per minute; callers reserve ahead and wait their turn."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Take amount from the bucket (possibly going negative) and return the seconds to wait for it."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level * 60.0 / self.capacity
+
+    def give_back(self, amount, now):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def adapt(self, limit, remaining, now):
+        """Follow the endpoint's view of the limit and what is left of it."""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None and remaining < self.level:
+            self.level = float(remaining)
+
+
+class RateLimiter:
+    """
+    Requests/minute and tokens/minute budgets for one model, shared by every
+    agent in the process, with jittered exponential backoff and a circuit breaker.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=MAX_RETRIES,
+                 base_backoff=BASE_BACKOFF_SECONDS, max_backoff=MAX_BACKOFF_SECONDS,
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.consecutive_failures = 0
+        self.paused_until = 0.0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "errors": 0, "waited_seconds": 0.0,
+                      "breaker_opened": 0}
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens):
+        """Block until a request of about tokens tokens fits both budgets and the circuit allows it."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.open_until > now:
+                    self._condition.wait(self.open_until - now)
+                    continue
+                if self.open_until and self.probe_in_flight:
+                    # Half-open: only the probe request runs until it succeeds or fails
+                    self._condition.wait(1.0)
+                    continue
+                if self.open_until:
+                    self.probe_in_flight = True
+                wait = max(self.paused_until - now,
+                           self.requests.reserve(1, now),
+                           self.tokens.reserve(tokens, now))
+                self.stats["requests"] += 1
+                break
+        if wait > 0:
+            self.stats["waited_seconds"] = round(self.stats["waited_seconds"] + wait, 3)
+            time.sleep(wait)
+
+    def settle(self, reserved_tokens, used_tokens):
+        """Return over-reserved tokens to the budget (or take the shortfall) once usage is known."""
+        with self._condition:
+            now = time.monotonic()
+            if used_tokens < reserved_tokens:
+                self.tokens.give_back(reserved_tokens - used_tokens, now)
+            elif used_tokens > reserved_tokens:
+                self.tokens.reserve(used_tokens - reserved_tokens, now)
+
+    def update_from_headers(self, headers):
+        """Adapt both budgets to x-ratelimit-* response headers."""
+        if not headers:
+            return
+
+        def number(name):
+            try:
+                return int(float(headers.get(name)))
+            except (TypeError, ValueError):
+                return None
+
+        with self._condition:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = number(f"x-ratelimit-limit-{kind}")
+                remaining = number(f"x-ratelimit-remaining-{kind}")
+                if limit is None and remaining is None:
+                    continue
+                bucket.adapt(limit, remaining, now)
+
+    def record_success(self):
+        with self._condition:
+            if self.open_until:
+                logger.info("LLM circuit breaker closed")
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.probe_in_flight = False
+            self._condition.notify_all()
+
+    def record_failure(self, error):
+        """Count a failed request and return the seconds to back off before retrying it."""
+        status, headers = error_status(error)
+        self.update_from_headers(headers)
+        retry_after = parse_duration(headers.get("retry-after")) if headers else None
+        with self._condition:
+            now = time.monotonic()
+            self.consecutive_failures += 1
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** min(self.consecutive_failures - 1, 16))
+            # Full jitter keeps the callers that failed together from retrying together
+            delay = max(retry_after or 0.0, random.uniform(0, backoff))
+            if status == 429:
+                self.stats["rate_limited"] += 1
+                # Everyone waits out the server's retry-after instead of stampeding it
+                self.paused_until = max(self.paused_until, now + (retry_after or delay))
+            else:
+                self.stats["errors"] += 1
+            if self.probe_in_flight or self.consecutive_failures >= self.breaker_threshold:
+                if not self.probe_in_flight:
+                    self.stats["breaker_opened"] += 1
+                    logger.warning(f"LLM circuit breaker opened for {self.breaker_cooldown}s after "
+                                   f"{self.consecutive_failures} consecutive failures")
+                self.open_until = now + self.breaker_cooldown
+                self.probe_in_flight = False
+            self._condition.notify_all()
+            return delay
+
+    def call(self, request, tokens, on_retry=None):
+        """
+        Run request() within the budgets, retrying retryable API errors with
+        jittered exponential backoff. Other errors are raised immediately.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens)
+            try:
+                result = request()
+            except Exception as e:
+                if not is_retryable(e):
+                    with self._condition:
+                        self.probe_in_flight = False
+                        self._condition.notify_all()
+                    raise
+                delay = self.record_failure(e)
+                if attempt == self.max_retries:
+                    raise
+                self.stats["retries"] += 1
+                if on_retry:
+                    on_retry()
+                logger.warning(f"LLM request failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self.record_success()
+            return result
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_rate_limits(enabled=None, rpm=None, tpm=None):
+    """Turn the shared limiter on or off and reset the starting budgets of every model."""
+    global RATE_LIMIT_ENABLED, DEFAULT_RPM, DEFAULT_TPM
+    with _limiters_lock:
+        if enabled is not None:
+            RATE_LIMIT_ENABLED = enabled
+        DEFAULT_RPM = rpm or DEFAULT_RPM
+        DEFAULT_TPM = tpm or DEFAULT_TPM
+        _limiters.clear()
+
+
+def get_rate_limiter(model):
+    """Return the process-wide limiter of a model, or None when rate limiting is disabled."""
+    if not RATE_LIMIT_ENABLED:
+        return None
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(DEFAULT_RPM, DEFAULT_TPM)
+        return _limiters[model]
+
+
+def rate_limit_stats():
+    """Return {model: counters} of every limiter in use."""
+    with _limiters_lock:
+        return {model: dict(limiter.stats) for model, limiter in _limiters.items()}
@@ -0,0 +1,395 @@
+"""
+Local OpenAI-compatible stand-in for the chat completions endpoint.
+
+Serves canned or rule-generated unittest code with configurable latency,
+injected 429/500 errors, token accounting and a simulated provider prefix
+cache (cached_tokens in the usage), so the agents can be benchmarked
+and load-tested without network access or cost.
+
+Start it with:
+    python -m agenticapp.utils.stub_llm_server --port 8000 --latency lognormal:-0.5,0.6 --error-rate-429 0.05
+
+and point the agents at it:
+    LLM_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=stub streamlit run AutoGenTestEnhancer.py
+
+GET /stats returns the request, error and token counters; POST /stats/reset clears them.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agenticapp.template_prompts import PAYLOAD_MARKER
+from agenticapp.utils.chunking_utils import count_tokens
+
+logger = logging.getLogger(__name__)
+
+MODULE_IMPORT = re.compile(r"from\s+([A-Za-z_]\w*)\s+import\s+\*")
+BATCH_MODULE = re.compile(r"--- Module `([A-Za-z_]\w*)` ---")
+BROKEN_TEST = re.compile(r"def\s+(test_\w+)\s*\(")
+DEFINITION = re.compile(r"^(?:class|def)\s+([A-Za-z]\w*)", re.MULTILINE)
+
+# Like provider prompt caching: prefixes from 1024 tokens on are cached in steps
+# of about 128 tokens (512 characters)
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_STEP_CHARS = 512
+PREFIX_CACHE_MAX_ENTRIES = 200000
+
+SYS_PATH_SETUP = '''import sys
+import os
+import unittest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+source_files_root = current_dir.replace(os.path.sep + "tests", os.path.sep + "source_files")
+
+def add_parent_directories_to_sys_path(path):
+    while path not in sys.path and os.path.isdir(path):
+        sys.path.insert(0, path)
+        path = os.path.dirname(path)
+        if path == os.path.dirname(path):
+            break
+
+add_parent_directories_to_sys_path(source_files_root)
+'''
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec into a sampler returning seconds:
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MU,SIGMA.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    samplers = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: random.uniform(values[0], values[1]),
+        "normal": lambda: max(0.0, random.gauss(values[0], values[1])),
+        "lognormal": lambda: random.lognormvariate(values[0], values[1]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    return samplers[kind]
+
+
+def _module_test_file(module_name, code):
+    """Build a small runnable test module for module_name checking its definitions exist."""
+    names = sorted(set(DEFINITION.findall(code))) or [module_name]
+    tests = "\n".join(
+        f"    def test_{name.lower()}_is_defined(self):\n"
+        f"        \"\"\"Test that {name} is defined.\"\"\"\n"
+        f"        self.assertIn({name!r}, globals())\n"
+        for name in names
+    )
+    return (
+        f"{SYS_PATH_SETUP}\nfrom {module_name} import *\n\n\n"
+        f"class Test{module_name.title().replace('_', '')}(unittest.TestCase):\n{tests}\n\n"
+        "if __name__ == \"__main__\":\n    unittest.main()\n"
+    )
+
+
+def generate_stub_reply(messages, canned_response=None):
+    """Return rule-generated test code matching the kind of prompt in messages."""
+    if canned_response is not None:
+        return canned_response
+    prompt = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    code_section = prompt.rpartition(PAYLOAD_MARKER)[2]  # Skip the examples in the instructions
+
+    batch_modules = BATCH_MODULE.findall(code_section)
+    if batch_modules:
+        sections = code_section.split("--- Module `")[1:]
+        return "\n".join(
+            f"# ===== BEGIN TEST FILE FOR MODULE: {name} =====\n"
+            f"{_module_test_file(name, section)}"
+            f"# ===== END TEST FILE FOR MODULE: {name} ====="
+            for name, section in zip(batch_modules, sections)
+        )
+
+    if "Create a comprehensive" in prompt:
+        match = MODULE_IMPORT.search(code_section)
+        return _module_test_file(match.group(1) if match else "module", code_section)
+
+    # Coverage, fixing and mutation prompts expect bare test methods
+    broken = BROKEN_TEST.search(code_section) if "Broken Test Function" in prompt else None
+    name = broken.group(1) if broken else f"test_generated_{uuid.uuid4().hex[:8]}"
+    return f"def {name}(self):\n    \"\"\"Generated by the stub LLM server.\"\"\"\n    self.assertTrue(True)\n"
+
+
+class PrefixCache:
+    """Remembers the prompt prefixes seen so far and reports how much of a new prompt they cover."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = set()
+
+    def cached_tokens(self, messages, model):
+        """Return the cached prompt tokens of messages and remember their prefixes."""
+        text = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+        digest = hashlib.sha256()
+        hashes = []
+        for start in range(0, len(text) - PREFIX_CACHE_STEP_CHARS + 1, PREFIX_CACHE_STEP_CHARS):
+            digest.update(text[start:start + PREFIX_CACHE_STEP_CHARS].encode("utf-8"))
+            hashes.append(digest.copy().hexdigest())
+        with self._lock:
+            cached_steps = 0
+            for step, value in enumerate(hashes, 1):
+                if value not in self._seen:
+                    break
+                cached_steps = step
+            if len(self._seen) > PREFIX_CACHE_MAX_ENTRIES:
+                self._seen.clear()
+            self._seen.update(hashes)
+        cached = count_tokens(text[:cached_steps * PREFIX_CACHE_STEP_CHARS], model) if cached_steps else 0
+        return cached if cached >= PREFIX_CACHE_MIN_TOKENS else 0
+
+
+class StubStats:
+    """Thread-safe request, error and token counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.window_start = time.time()
+            self.window_requests = 0
+            self.requests = 0
+            self.errors = {"429": 0, "500": 0}
+            self.prompt_tokens = 0
+            self.cached_tokens = 0
+            self.completion_tokens = 0
+            self.by_model = {}
+
+    def record(self, model, prompt_tokens=0, completion_tokens=0, error=None, cached_tokens=0):
+        with self._lock:
+            self.requests += 1
+            if time.time() - self.window_start >= 60:
+                self.window_start, self.window_requests = time.time(), 0
+            self.window_requests += 1
+            if error:
+                self.errors[error] += 1
+                return
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.completion_tokens += completion_tokens
+            model_stats = self.by_model.setdefault(model, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                                                           "completion_tokens": 0})
+            model_stats["requests"] += 1
+            model_stats["prompt_tokens"] += prompt_tokens
+            model_stats["cached_tokens"] += cached_tokens
+            model_stats["completion_tokens"] += completion_tokens
+
+    def rate_limit_window(self):
+        """Return (requests in the current minute, seconds until the minute resets)."""
+        with self._lock:
+            return self.window_requests, max(0.0, 60 - (time.time() - self.window_start))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": dict(self.errors),
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "by_model": json.loads(json.dumps(self.by_model)),
+            }
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Handles the OpenAI chat completions API subset the agents use."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _rate_limit_headers(self):
+        rpm_limit = self.server.options["rpm_limit"]
+        used, reset_seconds = self.server.stats.rate_limit_window()
+        return {
+            "x-ratelimit-limit-requests": str(rpm_limit),
+            "x-ratelimit-remaining-requests": str(max(0, rpm_limit - used)),
+            "x-ratelimit-reset-requests": f"{reset_seconds:.1f}s",
+        }
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o", "object": "model"},
+                                                             {"id": "gpt-4o-mini", "object": "model"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.server.stats.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(length) if length else b"{}"
+        if self.path.rstrip("/") == "/stats/reset":
+            self.server.stats.reset()
+            self._send_json(200, {"status": "reset"})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        request = json.loads(raw_body or b"{}")
+        options = self.server.options
+        model = request.get("model", "gpt-4o")
+        time.sleep(options["latency"]())
+
+        draw = random.random()
+        if draw < options["error_rate_429"]:
+            self.server.stats.record(model, error="429")
+            headers = {"retry-after": str(options["retry_after"]), **self._rate_limit_headers()}
+            headers["x-ratelimit-remaining-requests"] = "0"
+            self._send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "requests",
+                                            "code": "rate_limit_exceeded"}}, headers)
+            return
+        if draw < options["error_rate_429"] + options["error_rate_500"]:
+            self.server.stats.record(model, error="500")
+            self._send_json(500, {"error": {"message": "Internal server error (stub)", "type": "server_error"}})
+            return
+
+        messages = request.get("messages", [])
+        content = generate_stub_reply(messages, options["canned_response"])
+        prompt_tokens = sum(count_tokens(m.get("content") or "", model) for m in messages) + 3 * len(messages)
+        completion_tokens = count_tokens(content, model)
+        prefix_cache = self.server.prefix_cache
+        cached_tokens = min(prompt_tokens, prefix_cache.cached_tokens(messages, model)) if prefix_cache else 0
+        self.server.stats.record(model, prompt_tokens, completion_tokens, cached_tokens=cached_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+
+        if request.get("stream"):
+            self._stream(completion_id, model, content, usage, request.get("stream_options") or {})
+            return
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }, self._rate_limit_headers())
+
+    def _stream(self, completion_id, model, content, usage, stream_options):
+        """Send content as server-sent events, pacing tokens at the configured rate."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for name, value in self._rate_limit_headers().items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, with_usage=False):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if with_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if with_usage:
+                payload["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        delay = 1.0 / self.server.options["tokens_per_second"] if self.server.options["tokens_per_second"] else 0
+        try:
+            event({"role": "assistant", "content": ""})
+            for piece in re.findall(r"\S+\s*|\s+", content):
+                event({"content": piece})
+                if delay:
+                    time.sleep(delay)
+            event({}, finish_reason="stop")
+            if stream_options.get("include_usage"):
+                event({}, with_usage=True)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client closed stream {completion_id} early")
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency="fixed:0", error_rate_429=0.0, error_rate_500=0.0,
+                      retry_after=1, rpm_limit=500, tokens_per_second=0, canned_response=None, prefix_cache=True):
+    """
+    Start the stub server on a background thread and return it.
+
+    Use server.base_url as the agents' LLM_BASE_URL and server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    server.stats = StubStats()
+    server.prefix_cache = PrefixCache() if prefix_cache else None
+    server.options = {
+        "latency": parse_latency(latency),
+        "error_rate_429": error_rate_429,
+        "error_rate_500": error_rate_500,
+        "retry_after": retry_after,
+        "rpm_limit": rpm_limit,
+        "tokens_per_second": tokens_per_second,
+        "canned_response": canned_response,
+    }
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, name="StubLLMServer", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server for the agents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MU,SIGMA (seconds)")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-rate-500", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rpm-limit", type=int, default=500, help="Request limit advertised in rate limit headers")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Streaming speed, 0 for no delay")
+    parser.add_argument("--canned-response", help="File whose content is returned for every request")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Always report zero cached prompt tokens")
+    args = parser.parse_args()
+
+    canned_response = None
+    if args.canned_response:
+        with open(args.canned_response, "r", encoding="utf-8") as f:
+            canned_response = f.read()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    server = start_stub_server(args.host, args.port, args.latency, args.error_rate_429, args.error_rate_500,
+                               args.retry_after, args.rpm_limit, args.tokens_per_second, canned_response,
+                               prefix_cache=not args.no_prefix_cache)
+    print(f"Stub LLM server listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
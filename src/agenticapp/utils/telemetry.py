@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_DIR = os.getenv("LLM_METRICS_DIR", "metrics")
+METRICS_FILE_NAME = "llm_calls.jsonl"
+
+# USD per million tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """Return the estimated USD cost of one call, 0.0 for unknown models."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        # Config entries may carry dated names such as gpt-4o-2024-08-06
+        prices = next((p for name, p in sorted(MODEL_PRICES.items(), key=lambda item: -len(item[0]))
+                       if model.startswith(name)), None)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    uncached_tokens = max(0, prompt_tokens - cached_tokens)
+    return (uncached_tokens * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+class MetricsRecorder:
+    """Appends one JSON line per LLM call to a run-scoped metrics file."""
+
+    def __init__(self, metrics_dir=DEFAULT_METRICS_DIR, run_id=None):
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.run_dir = os.path.join(metrics_dir, self.run_id)
+        self.path = os.path.join(self.run_dir, METRICS_FILE_NAME)
+        self._lock = threading.Lock()
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    def record(self, **fields):
+        """Write one call record, stamped with the run id and time."""
+        record = {"run_id": self.run_id, "timestamp": datetime.now().isoformat(), **fields}
+        line = json.dumps(record, default=str)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write LLM metrics to {self.path}: {e}")
+
+
+class CallTimer:
+    """Collects the measurements of one LLM call while it runs."""
+
+    def __init__(self, agent_name, stage=None, source_file=None, model=None):
+        self.fields = {
+            "agent": agent_name,
+            "stage": stage,
+            "source_file": source_file,
+            "model": model,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "retries": 0,
+            "cache_hit": False,
+            "error": None,
+        }
+        self._start = time.perf_counter()
+
+    def add_usage(self, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+        self.fields["prompt_tokens"] += prompt_tokens or 0
+        self.fields["completion_tokens"] += completion_tokens or 0
+        self.fields["cached_tokens"] += cached_tokens or 0
+
+    def finish(self, recorder=None):
+        """Stamp wall time and cost, and write the record to the current run's metrics."""
+        fields = self.fields
+        fields["wall_time"] = round(time.perf_counter() - self._start, 4)
+        fields["cost"] = 0.0 if fields["cache_hit"] else round(estimate_cost(
+            fields["model"] or "", fields["prompt_tokens"], fields["completion_tokens"], fields["cached_tokens"]), 6)
+        (recorder or get_metrics_recorder()).record(**fields)
+        return fields
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def configure_run_metrics(metrics_dir=DEFAULT_METRICS_DIR, run_id=None):
+    """Start (or keep) the metrics file of a run; calling again with the same run id is a no-op."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or run_id is None or _recorder.run_dir != os.path.join(metrics_dir, run_id):
+            _recorder = MetricsRecorder(metrics_dir, run_id)
+        return _recorder
+
+
+def get_metrics_recorder():
+    """Return the current run's metrics recorder, starting a run on first use."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder()
+        return _recorder
+
+
+def load_metrics(path):
+    """Yield the call records of a metrics file."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize_metrics(path, group_by="stage"):
+    """
+    Aggregate a metrics file into one row per stage (or agent): calls, cache hits,
+    retries, errors, wall time, tokens, the share of prompt tokens served from
+    the provider's prefix cache, and cost.
+    """
+    totals = {}
+    for record in load_metrics(path):
+        key = record.get(group_by) or "unknown"
+        row = totals.setdefault(key, {
+            group_by: key, "calls": 0, "cache_hits": 0, "retries": 0, "errors": 0, "wall_time_s": 0.0,
+            "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+        })
+        row["calls"] += 1
+        row["cache_hits"] += 1 if record.get("cache_hit") else 0
+        row["retries"] += record.get("retries", 0)
+        row["errors"] += 1 if record.get("error") else 0
+        row["wall_time_s"] = round(row["wall_time_s"] + record.get("wall_time", 0.0), 3)
+        row["prompt_tokens"] += record.get("prompt_tokens", 0)
+        row["cached_tokens"] += record.get("cached_tokens", 0)
+        row["completion_tokens"] += record.get("completion_tokens", 0)
+        row["cost_usd"] = round(row["cost_usd"] + record.get("cost", 0.0), 6)
+    for row in totals.values():
+        row["cached_share"] = round(row["cached_tokens"] / row["prompt_tokens"], 3) if row["prompt_tokens"] else 0.0
+    return list(totals.values())
@@ -0,0 +1,437 @@
+import ast
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import uuid
+
+logger = logging.getLogger(__name__)
+
+IMPACT_MAP_FILE = "impact_map.json"
+# Copies of the files the map was recorded against, named by digest, to diff later versions with
+SNAPSHOT_FOLDER = "snapshots"
+# Coverage data files the test workers of the current run write
+RUN_FOLDER = "run"
+# Seconds the worker measuring the import-time lines of changed sources may take
+IMPORT_COVERAGE_TIMEOUT = 120
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def python_files(folder):
+    """Return {absolute path: digest} of the .py files under folder."""
+    files = {}
+    for root, dirs, names in os.walk(folder):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for name in names:
+            if name.endswith(".py"):
+                path = os.path.abspath(os.path.join(root, name))
+                files[path] = file_digest(path)
+    return files
+
+
+def _is_code(line):
+    stripped = line.strip()
+    return bool(stripped) and not stripped.startswith("#")
+
+
+def code_scopes(text):
+    """
+    Return the function and class definitions of source text as
+    (header line, first body line, last line, column, qualified name, is class)
+    tuples, or None if the text does not parse.
+    """
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return None
+    scopes = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                name = prefix + child.name
+                scopes.append((child.lineno, child.body[0].lineno, child.end_lineno, child.col_offset, name,
+                               isinstance(child, ast.ClassDef)))
+                visit(child, name + ".")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+    return scopes
+
+
+def changed_scopes(old_text, new_text):
+    """
+    Return the innermost function or class bodies of old_text (as code_scopes
+    tuples) that new_text changes, or None when module-level code (including
+    def lines and decorators, which run at import) changed or old_text does
+    not parse. Changes to blank and comment lines are ignored.
+    """
+    scopes = code_scopes(old_text)
+    if scopes is None:
+        return None
+    old_lines, new_lines = old_text.splitlines(), new_text.splitlines()
+
+    def innermost(candidates):
+        return min(candidates, key=lambda scope: scope[2] - scope[1]) if candidates else None
+
+    changed = set()
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        removed = [n for n in range(i1 + 1, i2 + 1) if _is_code(old_lines[n - 1])]
+        added = [line for line in new_lines[j1:j2] if _is_code(line)]
+        for n in removed:
+            scope = innermost([s for s in scopes if s[1] <= n <= s[2]])
+            if scope is None:
+                return None
+            changed.add(scope)
+        if added and not removed:
+            # Inserted lines belong to the innermost definition around the code line before them they are indented into
+            before = next((n for n in range(i1, 0, -1) if _is_code(old_lines[n - 1])), None)
+            indent = min(len(line) - len(line.lstrip()) for line in added)
+            scope = innermost([s for s in scopes if before and s[0] <= before <= s[2] and indent > s[3]])
+            if scope is None:
+                return None
+            changed.add(scope)
+    return changed
+
+
+def line_mapping(old_text, new_text):
+    """Return {old line: new line} for the lines new_text keeps unchanged."""
+    mapping = {}
+    matcher = difflib.SequenceMatcher(None, old_text.splitlines(), new_text.splitlines(), autojunk=False)
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                mapping[i1 + offset + 1] = j1 + offset + 1
+    return mapping
+
+
+def remap_arcs(arcs, mapping):
+    """Move coverage arcs to their new line numbers, dropping arcs into changed lines."""
+    remapped = []
+    for start, end in arcs:
+        new_start, new_end = mapping.get(abs(start)), mapping.get(abs(end))
+        if new_start and new_end:
+            # Negative line numbers are code object entries and exits
+            remapped.append([new_start if start > 0 else -new_start, new_end if end > 0 else -new_end])
+    return remapped
+
+
+def start_test_coverage(coverage_target):
+    """
+    Start measuring the sources of coverage_target ((data file prefix, source
+    folder)) into a new data file; the caller switches the context to each
+    test id. Returns the Coverage object.
+    """
+    import coverage
+
+    data_prefix, source_folder = coverage_target
+    cov = coverage.Coverage(data_file=f"{data_prefix}.{os.getpid()}.{uuid.uuid4().hex}", branch=True,
+                            include=[os.path.join(source_folder, "*")])
+    cov.start()
+    return cov
+
+
+def save_test_coverage(cov, test_ids):
+    """Save what cov measured so far and note test_ids as measured in it."""
+    cov.switch_context("")
+    cov.save()
+    with open(cov.config.data_file + ".tests", "a", encoding="utf-8") as f:
+        f.write(json.dumps(list(test_ids)) + "\n")
+
+
+def _read_arcs(data_file, contexts=None):
+    """Return {path: arcs} of a coverage data file, or {context: {path: arcs}} for the given contexts."""
+    from coverage import CoverageData
+
+    data = CoverageData(basename=data_file)
+    data.read()
+    if contexts is None:
+        return {path: sorted(data.arcs(path) or []) for path in data.measured_files()}
+    arcs = {}
+    for context in contexts & data.measured_contexts():
+        data.set_query_contexts([f"^{re.escape(context)}$"])
+        for path in data.measured_files():
+            file_arcs = data.arcs(path)
+            if file_arcs:
+                arcs.setdefault(context, {})[path] = sorted(file_arcs)
+    return arcs
+
+
+def read_test_coverage(run_folder):
+    """Return {test id: {path: arcs}} of the tests whose coverage the workers saved in run_folder."""
+    measured = {}
+    for name in os.listdir(run_folder) if os.path.isdir(run_folder) else []:
+        if not name.endswith(".tests"):
+            continue
+        with open(os.path.join(run_folder, name), "r", encoding="utf-8") as f:
+            test_ids = {test_id for line in f if line.endswith("\n") for test_id in json.loads(line)}
+        try:
+            arcs = _read_arcs(os.path.join(run_folder, name[:-len(".tests")]), test_ids)
+        except Exception as e:
+            logger.warning(f"Could not read test coverage {name}: {e}")
+            continue
+        for test_id in test_ids:
+            measured[test_id] = arcs.get(test_id, {})
+    return measured
+
+
+def executed_lines(arcs):
+    """Return the line numbers coverage arcs execute."""
+    return {line for arc in arcs for line in arc if line > 0}
+
+
+def _import_coverage_worker(connection, source_folder, source_files, data_file):
+    """Worker: import source_files again under coverage and save the lines their import runs."""
+    import coverage
+    from agenticapp.utils.worker_pool import preload_sources
+
+    # A worker forked from the pre-warmed parent already holds the modules
+    for name, module in list(sys.modules.items()):
+        if os.path.abspath(getattr(module, "__file__", None) or os.devnull) in source_files:
+            del sys.modules[name]
+    cov = coverage.Coverage(data_file=data_file, branch=True, include=list(source_files))
+    cov.start()
+    preload_sources(source_folder)
+    cov.stop()
+    cov.save()
+    connection.send("done")
+
+
+class ImpactMap:
+    """
+    The test impact map of a test folder: for each test its last result and
+    the source arcs it executed (measured with one coverage context per
+    test), plus the digests of the source and test files it was recorded on.
+
+    select() picks the tests a change can affect: new tests, tests whose
+    method (or, for other changes, module) changed, and tests that executed
+    a function or class body that changed. A module-level source change
+    affects every test that executed the file or whose test file names the
+    module. A changed test helper (a non test_*.py file) affects every test.
+    The other tests keep their recorded results, and their coverage is moved
+    to the new line numbers, so the merged coverage of the whole suite stays
+    available without re-running it.
+    """
+
+    def __init__(self, impact_dir, test_root, source_folder):
+        self.impact_dir = impact_dir
+        self.test_root = os.path.abspath(test_root)
+        self.source_folder = os.path.abspath(source_folder)
+        self.path = os.path.join(impact_dir, IMPACT_MAP_FILE)
+        self.run_folder = os.path.join(impact_dir, RUN_FOLDER)
+        self.tests, self.sources, self.test_files, self.imports = {}, {}, {}, {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                if (stored["test_root"], stored["source_folder"]) == (self.test_root, self.source_folder):
+                    self.tests, self.sources = stored["tests"], stored["sources"]
+                    self.test_files, self.imports = stored["test_files"], stored["imports"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable test impact map {self.path}: {e}")
+        self.current_sources = python_files(self.source_folder)
+        self.current_test_files = python_files(self.test_root)
+
+    @property
+    def coverage_target(self):
+        """The (data file prefix, source folder) test workers record per-test coverage with."""
+        return os.path.join(self.run_folder, "tests"), self.source_folder
+
+    def is_current(self):
+        """Whether the map was recorded on the current source and test files."""
+        return bool(self.tests) and self.sources == self.current_sources and self.test_files == self.current_test_files
+
+    def _snapshot_path(self, digest):
+        return os.path.join(self.impact_dir, SNAPSHOT_FOLDER, digest + ".py")
+
+    def _read(self, path, digest=None):
+        """Return the text of path, or of its snapshot with the given digest; None if it is gone."""
+        try:
+            with open(self._snapshot_path(digest) if digest else path, "r", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def _test_file(self, module_name):
+        return os.path.join(self.test_root, *module_name.split(".")) + ".py"
+
+    def _changed_files(self, recorded, current):
+        return [path for path in set(recorded) | set(current) if recorded.get(path) != current.get(path)]
+
+    def _changed_tests(self, path, test_ids):
+        """Return the tests of test file path a change to it affects."""
+        old_text, new_text = self._read(path, self.test_files.get(path)), self._read(path)
+        scopes = changed_scopes(old_text, new_text) if old_text is not None and new_text is not None else None
+        if scopes is None:
+            return set(test_ids)
+        affected = set()
+        for _, _, _, _, name, is_class in scopes:
+            parts = name.split(".")
+            if is_class or len(parts) != 2 or not parts[1].startswith("test"):
+                # Fixtures, helpers and base classes can affect every test of the module
+                return set(test_ids)
+            affected.update(test_id for test_id in test_ids if test_id.endswith(f".{name}"))
+        return affected
+
+    def _affected_by_source(self, path, tests_by_file):
+        """Return the recorded tests a change to source file path affects."""
+        if path not in self.sources:
+            return set()  # A new file: the files importing it changed as well
+        touching = [test_id for test_id, entry in self.tests.items() if path in entry["arcs"]]
+        old_text, new_text = self._read(path, self.sources[path]), self._read(path)
+        scopes = changed_scopes(old_text, new_text) if old_text is not None and new_text is not None else None
+        if scopes is None:
+            module_name = os.path.splitext(os.path.basename(path))[0]
+            if module_name == "__init__":
+                module_name = os.path.basename(os.path.dirname(path))
+            pattern = re.compile(rf"\b{re.escape(module_name)}\b")
+            naming = {test_id for test_file, test_ids in tests_by_file.items()
+                      if pattern.search(self._read(test_file) or "") for test_id in test_ids}
+            return set(touching) | naming
+        ranges = [(first, last) for _, first, last, _, _, _ in scopes]
+        return {test_id for test_id in touching
+                if any(first <= abs(line) <= last for arc in self.tests[test_id]["arcs"][path]
+                       for line in arc for first, last in ranges)}
+
+    def select(self, test_cases):
+        """
+        Return the ids of the tests of test_cases ((test id, module) pairs) to
+        run, and the recorded results of the others, and prepare the folder
+        the workers write the run's per-test coverage to.
+        """
+        shutil.rmtree(self.run_folder, ignore_errors=True)
+        os.makedirs(self.run_folder, exist_ok=True)
+        test_ids = [test_id for test_id, _ in test_cases]
+        if not self.tests:
+            return set(test_ids), []
+        changed_tests = self._changed_files(self.test_files, self.current_test_files)
+        helpers = [path for path in changed_tests if not os.path.basename(path).startswith("test_")]
+        if helpers:
+            print(f"🔁 Test helper {os.path.relpath(helpers[0], self.test_root)} changed; running every test")
+            return set(test_ids), []
+
+        tests_by_file = {}
+        for test_id, module_name in test_cases:
+            tests_by_file.setdefault(self._test_file(module_name), []).append(test_id)
+        affected = set()
+        for path in changed_tests:
+            if path in tests_by_file:
+                affected |= self._changed_tests(path, tests_by_file[path])
+        for path in self._changed_files(self.sources, self.current_sources):
+            affected |= self._affected_by_source(path, tests_by_file)
+        run_ids = {test_id for test_id in test_ids if test_id in affected or test_id not in self.tests}
+        reused = [dict(self.tests[test_id]["record"], reused=True) for test_id in test_ids if test_id not in run_ids]
+        return run_ids, reused
+
+    def _record_imports(self, pool):
+        """Measure the lines that run when the changed sources are imported, which no test context holds."""
+        stale = {path for path, digest in self.current_sources.items()
+                 if self.imports.get(path, {}).get("digest") != digest}
+        self.imports = {path: entry for path, entry in self.imports.items()
+                        if path in self.current_sources and path not in stale}
+        if not stale:
+            return
+        data_file = os.path.join(self.run_folder, "imports")
+        worker, connection = pool.start_worker(_import_coverage_worker,
+                                               (self.source_folder, stale, data_file))
+        try:
+            finished = connection.poll(IMPORT_COVERAGE_TIMEOUT) and connection.recv() == "done"
+        except EOFError:
+            finished = False
+        finally:
+            worker.kill()
+            worker.join()
+            connection.close()
+        arcs = _read_arcs(data_file) if finished else {}
+        if not finished:
+            logger.warning("Could not measure the import-time coverage of the changed sources")
+        for path in stale:
+            self.imports[path] = {"digest": self.current_sources[path], "arcs": arcs.get(path, [])}
+
+    def update(self, test_cases, run_ids, results, pool):
+        """
+        Record the outcome and coverage of the tests of test_cases that ran
+        (run_ids; results are the run's result records), move the coverage of
+        the others to the current line numbers and save the map. Tests whose
+        coverage was not saved, e.g. because their worker was killed, are left
+        out and run again next time.
+        """
+        measured = read_test_coverage(self.run_folder)
+        records = {record["test"]: record for record in results if record["test"] in run_ids}
+        mappings = {}
+        for path in self._changed_files(self.sources, self.current_sources):
+            old_text, new_text = self._read(path, self.sources.get(path)), self._read(path)
+            mappings[path] = line_mapping(old_text, new_text) if old_text is not None and new_text is not None else {}
+
+        tests = {}
+        for test_id, module_name in test_cases:
+            if test_id in run_ids:
+                if test_id in measured and test_id in records:
+                    record = {key: value for key, value in records[test_id].items() if key != "reused"}
+                    tests[test_id] = {"module": module_name, "record": record, "arcs": measured[test_id]}
+            elif test_id in self.tests:
+                entry = self.tests[test_id]
+                arcs = {path: remap_arcs(file_arcs, mappings[path]) if path in mappings else file_arcs
+                        for path, file_arcs in entry["arcs"].items()}
+                tests[test_id] = dict(entry, arcs={path: file_arcs for path, file_arcs in arcs.items() if file_arcs})
+        self.tests = tests
+        self._record_imports(pool)
+        self.sources, self.test_files = dict(self.current_sources), dict(self.current_test_files)
+        self._save()
+
+    def _save(self):
+        snapshot_folder = os.path.join(self.impact_dir, SNAPSHOT_FOLDER)
+        os.makedirs(snapshot_folder, exist_ok=True)
+        wanted = set()
+        for path, digest in list(self.sources.items()) + list(self.test_files.items()):
+            wanted.add(digest + ".py")
+            if not os.path.exists(self._snapshot_path(digest)):
+                shutil.copyfile(path, self._snapshot_path(digest))
+        for name in os.listdir(snapshot_folder):
+            if name not in wanted:
+                os.remove(os.path.join(snapshot_folder, name))
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"test_root": self.test_root, "source_folder": self.source_folder, "tests": self.tests,
+                       "sources": self.sources, "test_files": self.test_files, "imports": self.imports}, f)
+        shutil.rmtree(self.run_folder, ignore_errors=True)
+
+    def covered_lines(self, exclude=()):
+        """Return {path: lines} the recorded tests (except those in exclude) and the source imports execute."""
+        lines = {path: executed_lines(entry["arcs"]) for path, entry in self.imports.items()}
+        for test_id, entry in self.tests.items():
+            if test_id not in exclude:
+                for path, path_arcs in entry["arcs"].items():
+                    lines.setdefault(path, set()).update(executed_lines(path_arcs))
+        return lines
+
+    def write_coverage_data(self, data_file):
+        """
+        Write the merged coverage of every recorded test and of importing the
+        sources to a coverage data file, as a coverage run of the whole suite
+        would. Returns False when the map does not match the current files.
+        """
+        from coverage import CoverageData
+
+        if not self.is_current():
+            return False
+        arcs = {path: set(map(tuple, entry["arcs"])) for path, entry in self.imports.items()}
+        for entry in self.tests.values():
+            for path, path_arcs in entry["arcs"].items():
+                arcs.setdefault(path, set()).update(map(tuple, path_arcs))
+        if os.path.exists(data_file):
+            os.remove(data_file)
+        data = CoverageData(basename=data_file)
+        data.add_arcs({path: sorted(path_arcs) for path, path_arcs in arcs.items() if path_arcs})
+        data.write()
+        return True
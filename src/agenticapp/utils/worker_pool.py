@@ -0,0 +1,287 @@
+import atexit
+import importlib
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import uuid
+from multiprocessing.connection import Client, Listener
+
+logger = logging.getLogger(__name__)
+
+# Seconds a new worker gets to connect back before it counts as failed
+WORKER_CONNECT_TIMEOUT = 30
+# Set WORKER_POOL_FORK=0 to start every worker as a fresh interpreter instead of forking it
+FORK_ENABLED = hasattr(os, "fork") and os.getenv("WORKER_POOL_FORK", "1").lower() not in ("0", "false", "no")
+# Modules every worker needs, imported once by the pre-warmed parent
+PRELOAD_MODULES = ["unittest", "unittest.mock", "faulthandler", "io", "json", "coverage"]
+# Exit codes of reaped workers the pre-warmed parent keeps until they are asked for
+MAX_EXIT_CODES = 1000
+
+
+def source_fingerprint(folder):
+    """Return a fingerprint of the .py files under folder; it changes whenever one is added, removed or edited."""
+    entries = []
+    if folder and os.path.isdir(folder):
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for file in sorted(files):
+                if file.endswith(".py"):
+                    path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, stat.st_mtime_ns, stat.st_size))
+    return hash((os.getcwd(), folder, tuple(entries)))
+
+
+def preload_sources(folder):
+    """
+    Import the modules under folder the way the generated tests do: by bare
+    module name with their directory and its parents on sys.path.
+    """
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        path = root
+        while path not in sys.path and os.path.isdir(path):
+            sys.path.insert(0, path)
+            if path == os.path.dirname(path):
+                break
+            path = os.path.dirname(path)
+        for file in sorted(files):
+            if file.endswith(".py") and file != "__init__.py" and not file.startswith("test_"):
+                try:
+                    importlib.import_module(file[:-3])
+                except BaseException as e:  # A source with import-time side effects must not kill the parent
+                    logger.debug(f"Could not preload {os.path.join(root, file)}: {e}")
+
+
+def _zygote_main(commands, address, authkey, preload_folder):
+    """The pre-warmed parent: imports the shared modules once, then forks a worker per request."""
+    exit_codes = {}
+
+    def reap(signum, frame):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            exit_codes[pid] = os.waitstatus_to_exitcode(status)
+            while len(exit_codes) > MAX_EXIT_CODES:
+                exit_codes.pop(next(iter(exit_codes)))
+
+    # Workers are reaped as soon as they exit; the supervisor asks for their exit codes
+    signal.signal(signal.SIGCHLD, reap)
+    for module_name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+    if preload_folder:
+        preload_sources(preload_folder)
+    commands.send(("ready", None))
+    while True:
+        try:
+            command, payload = commands.recv()
+        except EOFError:
+            return
+        if command == "exit":
+            return
+        if command == "exitcode":
+            commands.send(("exitcode", exit_codes.pop(payload, None)))
+            continue
+        token, target, args = payload
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                commands.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                connection = Client(address, authkey=authkey)
+                connection.send(token)
+                target(connection, *args)
+                connection.close()
+            except BaseException:
+                logger.exception("Forked worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        commands.send(("forked", pid))
+
+
+class ForkedWorker:
+    """Handle of a worker forked by the pre-warmed parent, with the Process methods the supervisor uses."""
+
+    def __init__(self, pid, pool):
+        self.pid = pid
+        self._pool = pool
+        self._exitcode = None
+
+    @property
+    def exitcode(self):
+        """The exit code (negative: the killing signal) once the worker has exited, else None."""
+        if self._exitcode is None and not self.is_alive():
+            self._exitcode = self._pool._exit_code(self.pid)
+        return self._exitcode
+
+    def is_alive(self):
+        try:
+            os.kill(self.pid, 0)
+            return True
+        except OSError:
+            return False
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def join(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+class WorkerPool:
+    """
+    Starts worker processes with clean module state for target(connection, *args).
+
+    Where fork is available a pre-warmed parent interpreter (spawned once,
+    holding PRELOAD_MODULES and the modules under preload_folder) forks each
+    worker, which connects back over a local socket. Elsewhere each worker is
+    a freshly spawned interpreter.
+    """
+
+    def __init__(self, preload_folder=None):
+        self.preload_folder = preload_folder
+        self.fingerprint = source_fingerprint(preload_folder)
+        self._lock = threading.Lock()
+        self._waiting = {}
+        self._zygote = None
+        self._commands = None
+        self._listener = None
+        if FORK_ENABLED:
+            self._start_zygote()
+
+    def _start_zygote(self):
+        authkey = os.urandom(32)
+        self._listener = Listener(authkey=authkey)
+        threading.Thread(target=self._accept_workers, name="WorkerPoolListener", daemon=True).start()
+        context = multiprocessing.get_context("spawn")
+        self._commands, zygote_commands = context.Pipe()
+        self._zygote = context.Process(target=_zygote_main, name="TestWorkerZygote", daemon=True,
+                                       args=(zygote_commands, self._listener.address, authkey, self.preload_folder))
+        self._zygote.start()
+        zygote_commands.close()
+        self._commands.recv()  # Wait until the preloading is done
+        logger.info(f"Pre-warmed test worker parent started (pid {self._zygote.pid})")
+
+    def _accept_workers(self):
+        listener = self._listener
+        while True:
+            try:
+                connection = listener.accept()
+                token = connection.recv()
+            except Exception:
+                if listener is not self._listener:
+                    return  # Closed
+                continue
+            with self._lock:
+                waiting = self._waiting.get(token)
+            if waiting is not None:
+                waiting.put(connection)
+            else:
+                connection.close()
+
+    def start_worker(self, target, args=()):
+        """Start target(connection, *args) in a new worker and return (worker, connection)."""
+        if not self._zygote:
+            context = multiprocessing.get_context("spawn")
+            receiver, sender = context.Pipe()
+            worker = context.Process(target=target, args=(sender, *args), daemon=True)
+            worker.start()
+            sender.close()
+            return worker, receiver
+
+        token = uuid.uuid4().hex
+        arrived = queue.Queue()
+        with self._lock:
+            self._waiting[token] = arrived
+            self._commands.send(("fork", (token, target, args)))
+            _, pid = self._commands.recv()
+        worker = ForkedWorker(pid, self)
+        try:
+            connection = arrived.get(timeout=WORKER_CONNECT_TIMEOUT)
+        except queue.Empty:
+            worker.kill()
+            raise RuntimeError(f"Test worker {pid} did not connect within {WORKER_CONNECT_TIMEOUT}s")
+        finally:
+            with self._lock:
+                self._waiting.pop(token, None)
+        return worker, connection
+
+    def _exit_code(self, pid):
+        """Ask the pre-warmed parent for the exit code of its reaped worker pid (None if unknown)."""
+        try:
+            with self._lock:
+                self._commands.send(("exitcode", pid))
+                _, exit_code = self._commands.recv()
+        except (OSError, EOFError, AttributeError):
+            return None
+        return exit_code
+
+    def close(self):
+        if self._zygote:
+            try:
+                with self._lock:
+                    self._commands.send(("exit", None))
+            except OSError:
+                pass
+            self._zygote.join(5)
+            if self._zygote.is_alive():
+                self._zygote.kill()
+            self._zygote = None
+        if self._listener:
+            listener, self._listener = self._listener, None
+            listener.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(preload_folder=None):
+    """
+    Return the process-wide worker pool, restarting its pre-warmed parent when
+    the sources under preload_folder (or the working directory) changed.
+    """
+    global _pool
+    preload_folder = os.path.abspath(preload_folder) if preload_folder else None
+    with _pool_lock:
+        if _pool is not None and (_pool.preload_folder != preload_folder or
+                                  _pool.fingerprint != source_fingerprint(preload_folder)):
+            logger.info("Sources changed; restarting the pre-warmed test worker parent")
+            _pool.close()
+            _pool = None
+        if _pool is None:
+            _pool = WorkerPool(preload_folder)
+        return _pool
+
+
+def shutdown_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(shutdown_worker_pool)